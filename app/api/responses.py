@@ -0,0 +1,43 @@
+"""
+Ruta rápida de serialización para listados
+
+Las filas que salen de la base de datos ya tienen los tipos correctos, así que
+en los endpoints de listas no se construye un modelo Pydantic por fila: las
+tuplas se convierten directamente en dicts y se serializan con orjson.
+
+Devolver una FastJSONResponse desde un endpoint omite la validación del
+response_model (que se mantiene solo para la documentación OpenAPI).
+"""
+
+from typing import Any, Iterable
+
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class FastJSONResponse(Response):
+    """Respuesta JSON serializada con orjson (acepta escalares de NumPy)"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=_ORJSON_OPTIONS)
+
+
+def json_line(content: Any) -> bytes:
+    """Una línea NDJSON serializada con orjson (mismas opciones que FastJSONResponse)"""
+    return orjson.dumps(content, option=_ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+
+def model_fields(model: type[BaseModel]) -> tuple[str, ...]:
+    """Nombres de los campos de un esquema en orden de declaración"""
+    return tuple(model.model_fields)
+
+
+def rows_to_dicts(rows: Iterable[tuple], fields: tuple[str, ...]) -> list[dict]:
+    """Convierte filas posicionales en dicts (las columnas siguen el orden de fields)"""
+    return [dict(zip(fields, row)) for row in rows]
@@ -0,0 +1,150 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from app.api.responses import FastJSONResponse
+from app.db import schemas
+from app.db.database import SessionLocal
+from app.db.embedding_versions import get_embedding_versions
+from app.db.jobs import job_queue
+
+router = APIRouter()
+
+# Esquema de los parámetros de cada tipo de trabajo y campos que recibe el análisis
+_JOB_PARAMS = {
+    "cluster_analysis": (
+        schemas.ClusterAnalysisRequest,
+        (
+            "entity_type",
+            "n_clusters",
+            "min_year",
+            "max_year",
+            "max_items",
+            "memory_budget_mb",
+        ),
+    ),
+    "trends": (schemas.TrendsJobParams, ("years", "top_k")),
+    "professor_similarity_matrix": (
+        schemas.ProfessorMatrixJobParams,
+        ("laboratory_id",),
+    ),
+}
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_job_or_404(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+
+@router.post(
+    "/jobs",
+    response_model=schemas.JobInfo,
+    status_code=202,
+    tags=["jobs"],
+)
+async def submit_job(request: schemas.JobSubmitRequest, db: Session = Depends(get_db)):
+    """
+    Encola un análisis largo (clustering, tendencias o matriz de profesores)
+
+    Si ya existe un trabajo igual pendiente o terminado sobre la misma versión
+    de los embeddings, se devuelve ese trabajo.
+    """
+    model, fields = _JOB_PARAMS[request.kind]
+    try:
+        validated = model.model_validate(request.params)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+    if request.kind == "cluster_analysis" and validated.entity_type not in (
+        "theses",
+        "research_products",
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail="entity_type debe ser 'theses' o 'research_products'",
+        )
+
+    params = {field: getattr(validated, field) for field in fields}
+    data_version = tuple(sorted(get_embedding_versions(db).items()))
+    job, reused = job_queue.submit(request.kind, params, data_version)
+    return {**job.info(), "reused": reused}
+
+
+@router.get(
+    "/jobs",
+    response_model=list[schemas.JobInfo],
+    tags=["jobs"],
+)
+async def list_jobs():
+    """Lista los trabajos registrados en este proceso"""
+    return [job.info() for job in job_queue.jobs()]
+
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=schemas.JobInfo,
+    tags=["jobs"],
+)
+async def read_job(job_id: str):
+    """Estado de un trabajo"""
+    return get_job_or_404(job_id).info()
+
+
+@router.get(
+    "/jobs/{job_id}/result",
+    tags=["jobs"],
+)
+async def read_job_result(job_id: str):
+    """
+    Resultado de un trabajo terminado (409 si aún no termina)
+    """
+    job = get_job_or_404(job_id)
+    status = job.status
+
+    if status in ("queued", "running", "cancelled"):
+        raise HTTPException(
+            status_code=409, detail=f"El trabajo está en estado '{status}'"
+        )
+    if status == "failed":
+        raise HTTPException(
+            status_code=500,
+            detail=f"El trabajo falló: {job.future.exception()}",
+        )
+    return FastJSONResponse(job.future.result())
+
+
+@router.delete(
+    "/jobs/{job_id}",
+    response_model=schemas.JobInfo,
+    tags=["jobs"],
+)
+async def cancel_job(job_id: str):
+    """
+    Cancela un trabajo en cola
+
+    Un trabajo en ejecución no se puede interrumpir (el proceso de trabajo no
+    admite cancelación): responde 409 y el trabajo sigue hasta terminar. Lo
+    mismo para un trabajo ya terminado, fallido o cancelado.
+    """
+    job = get_job_or_404(job_id)
+    if job.status == "running":
+        raise HTTPException(
+            status_code=409,
+            detail="El trabajo ya está en ejecución y no se puede cancelar",
+        )
+    if not job_queue.cancel(job_id):
+        raise HTTPException(
+            status_code=409,
+            detail=f"No se puede cancelar un trabajo en estado '{job.status}'",
+        )
+    return job.info()
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
+from app.api.responses import FastJSONResponse, model_fields, rows_to_dicts
 from app.db import crud, schemas
 from app.db.database import SessionLocal
 
 router = APIRouter()
 
+# Orden de columnas de crud.get_professors_with_laboratory
+PROFESSOR_FIELDS = model_fields(schemas.ProfessorWithLaboratory)
+
 
 def get_db():
     db = SessionLocal()
@@ -24,21 +28,8 @@ async def read_professors(db: Session = Depends(get_db)):
     """Obtiene todos los profesores con información de su laboratorio"""
     professors = crud.get_professors_with_laboratory(db)
 
-    # Convertir las filas de la consulta a esquemas
-    result = []
-    for prof in professors:
-        result.append(
-            schemas.ProfessorWithLaboratory(
-                id=prof[0],  # prof.id
-                name=prof[1],  # prof.name
-                email=prof[2],  # prof.email
-                profile_url=prof[3],  # prof.profile_url
-                laboratory_id=prof[4],  # prof.laboratory_id
-                laboratory_name=prof[5],  # prof.laboratory_name
-            )
-        )
-
-    return result
+    # Filas de la base de datos: se serializan sin validar modelo por fila
+    return FastJSONResponse(rows_to_dicts(professors, PROFESSOR_FIELDS))
 
 
 @router.get(
@@ -1,21 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Literal
 
+from app.api.responses import (
+    FastJSONResponse,
+    json_line,
+    model_fields,
+    rows_to_dicts,
+)
 from app.db import schemas
 from app.db.database import SessionLocal
 from app.db.crud_recommendations import (
-    generate_query_embedding,
-    search_similar_theses_by_embedding,
-    search_similar_research_products_by_embedding,
+    RECOMMENDATION_MAX_BATCH,
+    clamp_k,
+    generate_query_embedding_async,
+    generate_query_embeddings_async,
+    search_similar_items_by_embedding,
+    search_similar_items_batch,
+    search_similar_items_by_text,
+    search_similar_items_hybrid,
+    search_advisors_by_embedding,
     find_similar_items_by_id,
+    find_similar_items_by_ids,
+    iter_cluster_analysis,
     perform_cluster_analysis,
     get_trending_research_topics,
     get_professor_research_similarity,
+    get_professor_similarity_matrix,
+    get_topic_overview,
+    get_topic_items,
+    summarize_trends,
+    get_embedding_projection,
 )
+from app.db.embedding_cache import query_embedding_cache
+from app.db.jobs import job_queue
+from app.db.result_cache import analysis_cache
+from app.db.search_cursor import decode_search_cursor, encode_search_cursor
+from app.db.vector_store import VECTOR_SEARCH_BACKEND
 
 router = APIRouter()
 
+# Orden de columnas de las filas de búsqueda (el score siempre va al final)
+THESIS_FIELDS = model_fields(schemas.ThesisRecommendation)
+RESEARCH_PRODUCT_FIELDS = model_fields(schemas.ResearchProductRecommendation)
+
 
 def get_db():
     db = SessionLocal()
@@ -25,6 +57,126 @@ def get_db():
         db.close()
 
 
+def build_recommendation_response(query: str, results: dict) -> dict:
+    """
+    Convierte las filas de búsqueda en el cuerpo de una RecommendationResponse
+
+    Las filas salen de nuestras propias consultas, así que se mapean
+    directamente a dicts sin construir un modelo Pydantic por fila.
+    """
+    theses = rows_to_dicts(results["theses"], THESIS_FIELDS)
+    research_products = rows_to_dicts(
+        results["research_products"], RESEARCH_PRODUCT_FIELDS
+    )
+    return {
+        "query": query,
+        "theses": theses,
+        "research_products": research_products,
+        "total_results": len(theses) + len(research_products),
+        "next_cursor": None,
+    }
+
+
+def format_center(center, center_format: str) -> dict:
+    """Centro de un cluster en el formato pedido (vacío con "none")"""
+    if center_format == "full":
+        return {"cluster_center": np.asarray(center).tolist()}
+    if center_format == "float16":
+        center = np.asarray(center, dtype="<f2")
+        return {
+            "cluster_center_float16": base64.b64encode(center.tobytes()).decode("ascii")
+        }
+    return {}
+
+
+def format_cluster(cluster: dict, center_format: str, ids_only: bool) -> dict:
+    """Arma un cluster con el formato de centro e items pedido"""
+    formatted = {
+        "cluster_id": cluster["cluster_id"],
+        "items": (
+            [item["id"] for item in cluster["items"]] if ids_only else cluster["items"]
+        ),
+        "cluster_size": cluster["cluster_size"],
+    }
+    formatted.update(format_center(cluster["cluster_center"], center_format))
+    return formatted
+
+
+def stream_cluster_lines(
+    header: dict, batches, db: Session, center_format: str, ids_only: bool
+):
+    """
+    Genera la respuesta NDJSON de un análisis de clustering a medida que se asigna
+
+    Líneas: un encabezado (entidad, total, número de clusters y muestreo), una
+    línea por centro (salvo center_format="none"), una línea por elemento con
+    su cluster_id y, al final, el tamaño de cada cluster. Cada lote de
+    iter_cluster_analysis se serializa con orjson y se envía en cuanto se
+    asigna, así que en memoria solo vive un lote. Cierra la sesión al terminar.
+    """
+    try:
+        centers = header["centers"]
+        yield json_line(
+            {
+                "entity_type": header["entity_type"],
+                "total_items": header["total_items"],
+                "n_clusters": len(centers),
+                "sampling": header["sampling"],
+            }
+        )
+        if center_format != "none":
+            yield b"".join(
+                json_line(
+                    {"cluster_id": cluster_id, **format_center(center, center_format)}
+                )
+                for cluster_id, center in enumerate(centers)
+            )
+
+        sizes = np.zeros(len(centers), dtype=np.int64)
+        for items, labels in batches:
+            sizes += np.bincount(labels, minlength=len(centers))
+            if ids_only:
+                lines = (
+                    json_line({"cluster_id": label, "id": item["id"]})
+                    for item, label in zip(items, labels.tolist())
+                )
+            else:
+                lines = (
+                    json_line({"cluster_id": label, "item": item})
+                    for item, label in zip(items, labels.tolist())
+                )
+            yield b"".join(lines)
+
+        yield json_line({"cluster_sizes": sizes})
+    finally:
+        batches.close()
+        db.close()
+
+
+def format_projection_points(points: dict, coordinate_format: str) -> dict:
+    """Coordenadas de una entidad como listas paralelas o float32 en base64"""
+    if coordinate_format == "float32":
+        xy = np.column_stack([points["x"], points["y"]]).astype("<f4")
+        return {
+            "ids": points["ids"],
+            "xy": base64.b64encode(xy.tobytes()).decode("ascii"),
+        }
+    return points
+
+
+def format_similar_results(
+    reference_type: str, reference_id: int, results: dict
+) -> dict:
+    """Formatea el resultado de una búsqueda por ID"""
+    return {
+        "reference_item": {"type": reference_type, "id": reference_id},
+        "similar_theses": rows_to_dicts(results["theses"], THESIS_FIELDS),
+        "similar_research_products": rows_to_dicts(
+            results["research_products"], RESEARCH_PRODUCT_FIELDS
+        ),
+    }
+
+
 @router.post(
     "/recommend",
     response_model=schemas.RecommendationResponse,
@@ -36,60 +188,117 @@ async def get_recommendations(
     """
     Obtiene recomendaciones de tesis y productos de investigación basadas en una consulta de texto
     """
-    # Generar embedding para la consulta
-    query_embedding = generate_query_embedding(request.query)
+    after = None
+    if request.cursor:
+        if request.search_mode != "vector":
+            raise HTTPException(
+                status_code=400,
+                detail="La paginación con cursor solo está disponible en search_mode 'vector'",
+            )
+        try:
+            after = decode_search_cursor(request.cursor, request.query)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Búsqueda léxica: se responde sin generar embedding
+    if request.search_mode == "lexical":
+        results = search_similar_items_by_text(
+            db,
+            request.query,
+            request.k,
+            include_theses=request.include_theses,
+            include_research_products=request.include_research_products,
+            filters=request.filters,
+        )
+        return FastJSONResponse(build_recommendation_response(request.query, results))
+
+    # Generar embedding para la consulta (en páginas siguientes sale de la caché)
+    query_embedding = await generate_query_embedding_async(request.query)
 
     if not query_embedding:
         raise HTTPException(
             status_code=500, detail="Error al generar embedding para la consulta"
         )
 
-    response = schemas.RecommendationResponse(
-        query=request.query, theses=[], research_products=[], total_results=0
-    )
+    search_options = {
+        "include_theses": request.include_theses,
+        "include_research_products": request.include_research_products,
+        "ef_search": request.ef_search,
+        "probes": request.probes,
+        "quantization": request.quantization,
+        "rerank": request.rerank,
+        "candidate_multiplier": request.candidate_multiplier,
+        "filters": request.filters,
+    }
 
-    # Buscar tesis similares
-    if request.include_theses:
-        thesis_results = search_similar_theses_by_embedding(
-            db, query_embedding, request.k
+    if request.search_mode == "hybrid":
+        results = search_similar_items_hybrid(
+            db, request.query, query_embedding, request.k, **search_options
         )
+        return FastJSONResponse(build_recommendation_response(request.query, results))
 
-        for result in thesis_results:
-            response.theses.append(
-                schemas.ThesisRecommendation(
-                    id=result[0],
-                    title=result[1],
-                    student_id=result[2],
-                    student_name=result[3],
-                    advisor1_name=result[4],
-                    advisor2_name=result[5],
-                    similarity_score=float(result[6]),
-                )
-            )
+    # Buscar tesis y productos similares (una sola consulta si se piden ambos)
+    results = search_similar_items_by_embedding(
+        db, query_embedding, request.k, after=after, **search_options
+    )
+
+    response = build_recommendation_response(request.query, results)
+    response["next_cursor"] = encode_search_cursor(
+        request.query,
+        clamp_k(request.k),
+        results,
+        {
+            "theses": request.include_theses,
+            "research_products": request.include_research_products,
+        },
+    )
+    return FastJSONResponse(response)
+
+
+@router.post(
+    "/recommend/advisors",
+    response_model=schemas.AdvisorRecommendationResponse,
+    tags=["recommendations"],
+)
+async def recommend_advisors(
+    request: schemas.AdvisorRecommendationRequest, db: Session = Depends(get_db)
+):
+    """
+    Ordena a los profesores (posibles directores de tesis) por afinidad con un tema
+    """
+    query_embedding = await generate_query_embedding_async(request.query)
 
-    # Buscar productos de investigación similares
-    if request.include_research_products:
-        product_results = search_similar_research_products_by_embedding(
-            db, query_embedding, request.k
+    if not query_embedding:
+        raise HTTPException(
+            status_code=500, detail="Error al generar embedding para la consulta"
         )
 
-        for result in product_results:
-            response.research_products.append(
-                schemas.ResearchProductRecommendation(
-                    id=result[0],
-                    title=result[1],
-                    site=result[2],
-                    year=result[3],
-                    professor_id=result[4],
-                    professor_name=result[5],
-                    laboratory_name=result[6],
-                    similarity_score=float(result[7]),
-                )
-            )
+    rows = search_advisors_by_embedding(
+        db,
+        query_embedding,
+        request.k,
+        laboratory_id=request.laboratory_id,
+        ef_search=request.ef_search,
+        probes=request.probes,
+    )
 
-    response.total_results = len(response.theses) + len(response.research_products)
+    advisors = [
+        schemas.AdvisorRecommendation(
+            id=row[0],
+            name=row[1],
+            email=row[2],
+            laboratory_id=row[3],
+            laboratory_name=row[4],
+            research_product_count=row[5],
+            thesis_count=row[6],
+            similarity_score=float(row[7]),
+        )
+        for row in rows
+    ]
 
-    return response
+    return schemas.AdvisorRecommendationResponse(
+        query=request.query, advisors=advisors, total_results=len(advisors)
+    )
 
 
 @router.post(
@@ -121,46 +330,108 @@ async def find_similar_items(
         search_type=request.search_type,
     )
 
-    # Formatear respuesta
-    formatted_results = {
-        "reference_item": {
-            "type": "thesis" if request.thesis_id else "research_product",
-            "id": request.thesis_id or request.research_product_id,
-        },
-        "similar_theses": [],
-        "similar_research_products": [],
-    }
+    return FastJSONResponse(
+        format_similar_results(
+            "thesis" if request.thesis_id else "research_product",
+            request.thesis_id or request.research_product_id,
+            results,
+        )
+    )
 
-    # Formatear tesis similares
-    for result in results["theses"]:
-        formatted_results["similar_theses"].append(
-            {
-                "id": result[0],
-                "title": result[1],
-                "student_id": result[2],
-                "student_name": result[3],
-                "advisor1_name": result[4],
-                "advisor2_name": result[5],
-                "similarity_score": float(result[6]),
-            }
+
+@router.post(
+    "/recommend/batch",
+    response_model=schemas.BatchRecommendationResponse,
+    tags=["recommendations"],
+)
+async def get_batch_recommendations(
+    request: schemas.BatchRecommendationRequest, db: Session = Depends(get_db)
+):
+    """
+    Obtiene recomendaciones para varias consultas de texto en una sola petición
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="Debe proporcionar queries")
+
+    if len(request.queries) > RECOMMENDATION_MAX_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {RECOMMENDATION_MAX_BATCH} consultas por petición",
         )
 
-    # Formatear productos de investigación similares
-    for result in results["research_products"]:
-        formatted_results["similar_research_products"].append(
-            {
-                "id": result[0],
-                "title": result[1],
-                "site": result[2],
-                "year": result[3],
-                "professor_id": result[4],
-                "professor_name": result[5],
-                "laboratory_name": result[6],
-                "similarity_score": float(result[7]),
-            }
+    # Generar todos los embeddings (caché + llamadas por lotes a Dashscope)
+    query_embeddings = await generate_query_embeddings_async(request.queries)
+
+    if any(embedding is None for embedding in query_embeddings):
+        raise HTTPException(
+            status_code=500, detail="Error al generar embedding para la consulta"
         )
 
-    return formatted_results
+    batch_results = search_similar_items_batch(
+        db,
+        query_embeddings,
+        request.k,
+        include_theses=request.include_theses,
+        include_research_products=request.include_research_products,
+        ef_search=request.ef_search,
+        probes=request.probes,
+        quantization=request.quantization,
+        rerank=request.rerank,
+        candidate_multiplier=request.candidate_multiplier,
+        filters=request.filters,
+    )
+
+    return FastJSONResponse(
+        {
+            "results": [
+                build_recommendation_response(query, results)
+                for query, results in zip(request.queries, batch_results)
+            ],
+            "total_queries": len(request.queries),
+        }
+    )
+
+
+@router.post(
+    "/similar/batch",
+    tags=["recommendations"],
+)
+async def find_similar_items_batch(
+    request: schemas.BatchSimilaritySearchRequest, db: Session = Depends(get_db)
+):
+    """
+    Encuentra elementos similares para varias tesis y/o productos de investigación
+    """
+    n_items = len(request.thesis_ids) + len(request.research_product_ids)
+    if not n_items:
+        raise HTTPException(
+            status_code=400,
+            detail="Debe proporcionar thesis_ids o research_product_ids",
+        )
+
+    if n_items > RECOMMENDATION_MAX_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {RECOMMENDATION_MAX_BATCH} elementos por petición",
+        )
+
+    batch_results = find_similar_items_by_ids(
+        db=db,
+        thesis_ids=request.thesis_ids,
+        research_product_ids=request.research_product_ids,
+        k=request.k,
+        search_type=request.search_type,
+    )
+
+    return FastJSONResponse(
+        {
+            "results": [
+                format_similar_results(result["type"], result["id"], result)
+                for result in batch_results
+            ],
+            "total_items": n_items,
+        }
+    )
 
 
 @router.post(
@@ -168,12 +439,46 @@ async def find_similar_items(
     response_model=schemas.ClusterAnalysisResponse,
     tags=["recommendations"],
 )
-async def cluster_analysis(
+def cluster_analysis(
     request: schemas.ClusterAnalysisRequest, db: Session = Depends(get_db)
 ):
     """
     Realiza análisis de clustering en tesis o productos de investigación para identificar grupos temáticos
+
+    Handler síncrono (threadpool de FastAPI): la carga, el ajuste y la
+    asignación no bloquean el event loop.
     """
+    if request.stream:
+        # Sesión propia: debe seguir abierta mientras se envía la respuesta
+        stream_db = SessionLocal()
+        batches = iter_cluster_analysis(
+            stream_db,
+            request.entity_type,
+            request.n_clusters,
+            request.min_year,
+            request.max_year,
+            request.max_items,
+            request.memory_budget_mb,
+        )
+        # El encabezado se calcula antes de responder para reportar errores
+        # con su código de estado
+        try:
+            header = next(batches)
+        except ValueError as e:
+            stream_db.close()
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            stream_db.close()
+            raise HTTPException(
+                status_code=500, detail=f"Error en análisis de clustering: {str(e)}"
+            )
+        return StreamingResponse(
+            stream_cluster_lines(
+                header, batches, stream_db, request.center_format, request.ids_only
+            ),
+            media_type="application/x-ndjson",
+        )
+
     try:
         result = perform_cluster_analysis(
             db=db,
@@ -181,62 +486,165 @@ async def cluster_analysis(
             n_clusters=request.n_clusters,
             min_year=request.min_year,
             max_year=request.max_year,
+            max_items=request.max_items,
+            memory_budget_mb=request.memory_budget_mb,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error en análisis de clustering: {str(e)}"
         )
 
-        # Convertir a esquema de respuesta
-        clusters = []
-        for cluster in result["clusters"]:
-            clusters.append(
-                schemas.ClusterResult(
-                    cluster_id=cluster["cluster_id"],
-                    items=cluster["items"],
-                    cluster_center=cluster["cluster_center"],
-                    cluster_size=cluster["cluster_size"],
-                )
-            )
+    # Convertir a esquema de respuesta
+    clusters = [
+        schemas.ClusterResult(
+            **format_cluster(cluster, request.center_format, request.ids_only)
+        )
+        for cluster in result["clusters"]
+    ]
+
+    return schemas.ClusterAnalysisResponse(
+        entity_type=result["entity_type"],
+        clusters=clusters,
+        total_items=result["total_items"],
+        sampling=result.get("sampling"),
+    )
+
 
-        return schemas.ClusterAnalysisResponse(
-            entity_type=result["entity_type"],
-            clusters=clusters,
-            total_items=result["total_items"],
+@router.get(
+    "/topics/{entity_type}",
+    response_model=schemas.TopicModelResponse,
+    tags=["recommendations"],
+)
+async def read_topic_model(entity_type: str, db: Session = Depends(get_db)):
+    """
+    Modelo de temas persistido de una entidad y el tamaño de cada tema
+    """
+    try:
+        overview = get_topic_overview(db, entity_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if overview is None:
+        raise HTTPException(
+            status_code=404, detail="No hay un modelo de temas para esta entidad"
         )
+    return overview
+
 
+@router.get(
+    "/topics/{entity_type}/{cluster_id}",
+    response_model=schemas.TopicItemsResponse,
+    tags=["recommendations"],
+)
+async def read_topic_items(
+    entity_type: str,
+    cluster_id: int,
+    limit: int = Query(default=50, ge=1, le=500),
+    offset: int = Query(default=0, ge=0),
+    db: Session = Depends(get_db),
+):
+    """
+    Elementos asignados a un tema del modelo persistido
+    """
+    try:
+        result = get_topic_items(db, entity_type, cluster_id, limit, offset)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+    if result is None:
+        raise HTTPException(
+            status_code=404, detail="No hay un modelo de temas para esta entidad"
+        )
+    return FastJSONResponse(result)
+
+
+@router.get(
+    "/projection",
+    response_model=schemas.ProjectionResponse,
+    tags=["recommendations"],
+)
+def get_projection(
+    include_theses: bool = True,
+    include_research_products: bool = True,
+    coordinate_format: Literal["list", "float32"] = "list",
+    db: Session = Depends(get_db),
+):
+    """
+    Coordenadas 2-D (PCA) de tesis y productos de investigación para un mapa
+    de temas, sin descargar los embeddings
+
+    Handler síncrono (threadpool de FastAPI): la carga y el PCA de un fallo
+    de caché no bloquean el event loop.
+    """
+    try:
+        projection = get_embedding_projection(db)
     except Exception as e:
         raise HTTPException(
-            status_code=500, detail=f"Error en análisis de clustering: {str(e)}"
+            status_code=500, detail=f"Error calculando la proyección: {str(e)}"
         )
 
+    response = {
+        "versions": projection["versions"],
+        "explained_variance_ratio": projection["explained_variance_ratio"],
+    }
+    for entity_type, included in (
+        ("theses", include_theses),
+        ("research_products", include_research_products),
+    ):
+        if included:
+            response[entity_type] = format_projection_points(
+                projection[entity_type], coordinate_format
+            )
+    return FastJSONResponse(response)
+
 
 @router.get(
     "/trends",
     tags=["recommendations"],
 )
-async def get_research_trends(
+def get_research_trends(
     years: List[int] | None = None, top_k: int = 10, db: Session = Depends(get_db)
 ):
     """
     Analiza tendencias en temas de investigación por año
+
+    Handler síncrono: FastAPI lo ejecuta en su threadpool, así la espera de
+    los años agrupados en el pool de procesos no bloquea el event loop.
     """
     try:
         trends = get_trending_research_topics(db, years, top_k)
-        return {
-            "years_analyzed": list(trends.keys()),
-            "trends": trends,
-            "summary": {
-                "total_years": len(trends),
-                "total_products": sum(
-                    trend["total_products"] for trend in trends.values()
-                ),
-            },
-        }
+        return summarize_trends(trends)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error analizando tendencias: {str(e)}"
         )
 
 
+@router.get(
+    "/professor-similarity/matrix",
+    tags=["recommendations"],
+)
+def professor_similarity_matrix(
+    laboratory_id: int | None = None, db: Session = Depends(get_db)
+):
+    """
+    Matriz de similitud de investigación entre todos los profesores,
+    opcionalmente limitada a un laboratorio
+
+    Handler síncrono (threadpool de FastAPI): el cálculo no bloquea el event
+    loop.
+    """
+    try:
+        return get_professor_similarity_matrix(db, laboratory_id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error calculando la matriz de similitud: {str(e)}",
+        )
+
+
 @router.get(
     "/professor-similarity/{professor1_id}/{professor2_id}",
     tags=["recommendations"],
@@ -326,12 +734,22 @@ async def recommendation_health_check():
     return {
         "status": "healthy",
         "dashscope_configured": bool(os.getenv("DASHSCOPE_API_KEY")),
+        "search_backend": VECTOR_SEARCH_BACKEND,
+        "query_embedding_cache": query_embedding_cache.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "job_queue": job_queue.stats(),
         "version": "1.0.0",
         "features": [
             "text_based_recommendations",
+            "batch_recommendations",
+            "hybrid_search",
+            "advisor_recommendations",
             "similarity_search",
             "cluster_analysis",
             "trend_analysis",
             "professor_comparison",
+            "topic_models",
+            "background_jobs",
+            "projection",
         ],
     }
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
+from app.api.responses import FastJSONResponse, model_fields, rows_to_dicts
 from app.db import crud, schemas
 from app.db.database import SessionLocal
 
 router = APIRouter()
 
+# Orden de columnas de las consultas de estudiantes con información académica
+STUDENT_FIELDS = model_fields(schemas.StudentWithAcademicInfo)
+
 
 def get_db():
     db = SessionLocal()
@@ -24,23 +28,8 @@ async def read_students(db: Session = Depends(get_db)):
     """Obtiene todos los estudiantes con información académica y de tesis"""
     students = crud.get_students_with_academic_info(db)
 
-    # Convertir las filas de la consulta a esquemas
-    result = []
-    for student in students:
-        result.append(
-            schemas.StudentWithAcademicInfo(
-                id=student[0],  # student.id
-                name=student[1],  # student.name
-                email=student[2],  # student.email
-                profile_url=student[3],  # student.profile_url
-                program=student[4],  # academic_program.program
-                status=student[5],  # academic_program.status
-                thesis_title=student[6],  # academic_program.thesis_title
-                thesis_url=student[7],  # academic_program.thesis_url
-            )
-        )
-
-    return result
+    # Filas de la base de datos: se serializan sin validar modelo por fila
+    return FastJSONResponse(rows_to_dicts(students, STUDENT_FIELDS))
 
 
 @router.get(
@@ -149,23 +138,8 @@ async def read_students_by_program(program: str, db: Session = Depends(get_db)):
     """Obtiene estudiantes por programa académico específico"""
     students = crud.get_students_by_program(db, program)
 
-    # Convertir las filas de la consulta a esquemas
-    result = []
-    for student in students:
-        result.append(
-            schemas.StudentWithAcademicInfo(
-                id=student[0],  # student.id
-                name=student[1],  # student.name
-                email=student[2],  # student.email
-                profile_url=student[3],  # student.profile_url
-                program=student[4],  # academic_program.program
-                status=student[5],  # academic_program.status
-                thesis_title=student[6],  # academic_program.thesis_title
-                thesis_url=student[7],  # academic_program.thesis_url
-            )
-        )
-
-    return result
+    # Filas de la base de datos: se serializan sin validar modelo por fila
+    return FastJSONResponse(rows_to_dicts(students, STUDENT_FIELDS))
 
 
 @router.get(
@@ -177,20 +151,5 @@ async def read_students_by_status(status: str, db: Session = Depends(get_db)):
     """Obtiene estudiantes por estatus académico específico"""
     students = crud.get_students_by_status(db, status)
 
-    # Convertir las filas de la consulta a esquemas
-    result = []
-    for student in students:
-        result.append(
-            schemas.StudentWithAcademicInfo(
-                id=student[0],  # student.id
-                name=student[1],  # student.name
-                email=student[2],  # student.email
-                profile_url=student[3],  # student.profile_url
-                program=student[4],  # academic_program.program
-                status=student[5],  # academic_program.status
-                thesis_title=student[6],  # academic_program.thesis_title
-                thesis_url=student[7],  # academic_program.thesis_url
-            )
-        )
-
-    return result
+    # Filas de la base de datos: se serializan sin validar modelo por fila
+    return FastJSONResponse(rows_to_dicts(students, STUDENT_FIELDS))
@@ -0,0 +1,189 @@
+"""
+Clustering de embeddings como funciones puras (ejecutables en otros procesos)
+
+KMeans es intensivo en CPU y retiene el GIL en parte del ajuste, así que el
+cálculo de tendencias reparte los años entre procesos. Este módulo solo
+depende de NumPy y scikit-learn para que los workers arranquen rápido.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+# Procesos para el clustering en paralelo (por defecto, núcleos disponibles)
+ANALYSIS_MAX_WORKERS = int(
+    os.getenv("ANALYSIS_MAX_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+
+# Hilos BLAS/OpenMP por proceso del pool (por defecto, los núcleos repartidos
+# entre los procesos para no sobresuscribir la máquina)
+ANALYSIS_BLAS_THREADS = int(
+    os.getenv(
+        "ANALYSIS_BLAS_THREADS",
+        str(max(1, (os.cpu_count() or 1) // ANALYSIS_MAX_WORKERS)),
+    )
+)
+
+# Máximo de elementos cargados a la vez para ajustar un clustering y memoria
+# de su matriz de embeddings; con más elementos se ajusta sobre una muestra
+CLUSTER_MAX_ITEMS = int(os.getenv("CLUSTER_MAX_ITEMS", "20000"))
+CLUSTER_MEMORY_BUDGET_MB = float(os.getenv("CLUSTER_MEMORY_BUDGET_MB", "256"))
+
+# Tamaño de lote de MiniBatchKMeans
+CLUSTER_MINIBATCH_SIZE = 1024
+
+_executor: Executor | None = None
+_executor_lock = threading.Lock()
+
+
+def cluster_embeddings(
+    embeddings: np.ndarray, n_clusters: int, random_state: int = 42
+) -> tuple[np.ndarray, np.ndarray]:
+    """Ajusta KMeans y devuelve (etiquetas por fila, centros de los clusters)"""
+    kmeans = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=10)
+    labels = kmeans.fit_predict(embeddings)
+    return labels, kmeans.cluster_centers_
+
+
+def cluster_sample_limit(
+    max_items: int | None, memory_budget_mb: float | None, dimension: int
+) -> int:
+    """Elementos que caben en el ajuste según max_items y el presupuesto de memoria"""
+    max_items = max_items or CLUSTER_MAX_ITEMS
+    memory_budget_mb = memory_budget_mb or CLUSTER_MEMORY_BUDGET_MB
+    budget_items = int(memory_budget_mb * 1024 * 1024) // (dimension * 4)
+    return max(1, min(max_items, budget_items))
+
+
+def sample_percent(limit: int, total: int) -> float:
+    """Porcentaje de TABLESAMPLE BERNOULLI para obtener en promedio limit filas"""
+    return min(100.0, 100.0 * limit / max(total, 1))
+
+
+def trim_sample(sample: np.ndarray, limit: int, random_state: int = 42) -> np.ndarray:
+    """
+    Recorta una muestra a limit filas elegidas al azar (semilla fija)
+
+    BERNOULLI devuelve un número aleatorio de filas alrededor del esperado; el
+    excedente se descarta uniformemente, no por posición, para no sesgar la
+    muestra hacia un extremo de la tabla. Las filas se compactan en el mismo
+    arreglo por tramos, sin duplicar la matriz.
+    """
+    if len(sample) <= limit:
+        return sample
+
+    rng = np.random.default_rng(random_state)
+    keep = np.sort(rng.choice(len(sample), size=limit, replace=False))
+    # keep es creciente, así que keep[i] >= i: cada tramo solo lee filas que
+    # aún no se sobrescribieron
+    for start in range(0, limit, CLUSTER_MINIBATCH_SIZE):
+        positions = keep[start : start + CLUSTER_MINIBATCH_SIZE]
+        sample[start : start + len(positions)] = sample[positions]
+    return sample[:limit]
+
+
+def fit_minibatch_centers(
+    sample: np.ndarray, n_clusters: int, random_state: int = 42
+) -> np.ndarray:
+    """Ajusta MiniBatchKMeans sobre una muestra y devuelve los centros"""
+    kmeans = MiniBatchKMeans(
+        n_clusters=n_clusters,
+        random_state=random_state,
+        batch_size=CLUSTER_MINIBATCH_SIZE,
+        n_init=3,
+    )
+    kmeans.fit(sample)
+    return kmeans.cluster_centers_
+
+
+def assign_clusters(embeddings: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Etiqueta de cada fila: el centro más cercano en distancia euclidiana"""
+    # argmin ||x - c||^2 = argmax (2 x·c - ||c||^2)
+    scores = 2 * (embeddings @ centers.T) - (centers * centers).sum(axis=1)
+    return scores.argmax(axis=1)
+
+
+def group_clusters(
+    labels: np.ndarray, centers: np.ndarray, items: list[dict]
+) -> list[dict]:
+    """Agrupa la información de cada elemento según su etiqueta de cluster"""
+    clusters = []
+    for cluster_id in range(len(centers)):
+        cluster_items = [items[i] for i in np.flatnonzero(labels == cluster_id)]
+        clusters.append(
+            {
+                "cluster_id": cluster_id,
+                "items": cluster_items,
+                "cluster_center": centers[cluster_id].tolist(),
+                "cluster_size": len(cluster_items),
+            }
+        )
+    return clusters
+
+
+def get_analysis_executor() -> Executor:
+    """
+    Pool de procesos compartido, creado en el primer uso
+
+    Se usa "spawn" porque hacer fork de un proceso que ya inicializó OpenMP
+    (KMeans) o tiene conexiones abiertas puede bloquear a los hijos. Cada
+    proceso limita sus hilos BLAS/OpenMP con el mismo inicializador que la
+    cola de trabajos.
+    """
+    # Import diferido: jobs importa este módulo dentro de sus procesos
+    from .jobs import _init_job_worker
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=ANALYSIS_MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_job_worker,
+                initargs=(ANALYSIS_BLAS_THREADS,),
+            )
+    return _executor
+
+
+def set_analysis_executor(executor: Executor) -> None:
+    """Reemplaza el pool de análisis (p. ej. por uno en hilo dentro de un trabajo)"""
+    global _executor
+    with _executor_lock:
+        _executor = executor
+
+
+def _discard_executor(executor: Executor) -> None:
+    """Olvida un pool roto para que el siguiente uso cree uno nuevo"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+
+
+def _discard_if_broken(executor: Executor, future: Future) -> None:
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        _discard_executor(executor)
+
+
+def submit_analysis(function, *args) -> Future:
+    """
+    Envía una tarea al pool de análisis
+
+    Si un proceso del pool muere (BrokenProcessPool), el pool queda
+    inutilizable: se descarta para que las tareas siguientes usen uno nuevo,
+    y si ya estaba roto al enviar se reintenta una vez con otro pool.
+    """
+    executor = get_analysis_executor()
+    try:
+        future = executor.submit(function, *args)
+    except BrokenProcessPool:
+        _discard_executor(executor)
+        executor = get_analysis_executor()
+        future = executor.submit(function, *args)
+    future.add_done_callback(lambda done: _discard_if_broken(executor, done))
+    return future
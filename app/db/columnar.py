@@ -0,0 +1,139 @@
+"""
+Cargador columnar de embeddings y metadatos
+
+Lee ids, campos de presentación (ya unidos en SQL, sin cargas perezosas del
+ORM) y vectores desde un cursor del lado del servidor, por lotes. Los vectores
+se piden en binario con vector_send y se decodifican directamente en una
+matriz float32 reservada de antemano con el número de filas, sin pasar por
+listas de Python.
+
+Formato de vector_send: dimensión (int16), reservado (int16) y la dimensión
+en float4 big-endian. Los 4 bytes de encabezado ocupan lo mismo que un float,
+así que un lote de registros concatenados se ve como una matriz
+(n, dimensión + 1) cuya primera columna se descarta.
+"""
+
+import os
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Filas por lote leídas del cursor del servidor
+COLUMNAR_BATCH_SIZE = int(os.getenv("COLUMNAR_BATCH_SIZE", "2000"))
+
+_HEADER_BYTES = 4
+
+
+def _decode_vectors(buffers: list, dimension: int) -> np.ndarray:
+    """
+    Decodifica un lote de valores vector_send en una matriz float32
+
+    La vista big-endian se copia a float32 nativo y contiguo: así la reciben
+    BLAS y scikit-learn sin conversiones implícitas por cada operación.
+    """
+    records = np.frombuffer(b"".join(buffers), dtype=">f4")
+    return records.reshape(len(buffers), dimension + 1)[:, 1:].astype(np.float32)
+
+
+def _vector_dimension(buffer) -> int:
+    return int.from_bytes(bytes(buffer[:2]), "big")
+
+
+def _object_column(values: list) -> np.ndarray:
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def _to_columns(values: list[list]) -> list[np.ndarray]:
+    """Listas de valores por campo a arreglos (int64 la primera, object el resto)"""
+    return [np.array(values[0], dtype=np.int64)] + [
+        _object_column(column_values) for column_values in values[1:]
+    ]
+
+
+def count_rows(db: Session, from_sql: str, params: dict | None = None) -> int:
+    """Número de filas de una cláusula FROM ... WHERE ..."""
+    return db.execute(text(f"SELECT COUNT(*) {from_sql}"), params or {}).scalar()
+
+
+def iter_columnar(
+    db: Session,
+    fields: list[str],
+    from_sql: str,
+    order_by: str,
+    params: dict | None = None,
+    vector_sql: str = "embedding",
+    dimension: int = 1024,
+    batch_size: int = COLUMNAR_BATCH_SIZE,
+    limit: int | None = None,
+):
+    """
+    Recorre una consulta por lotes de a lo más batch_size filas
+
+    Genera (columnas, matriz float32) por lote; solo un lote de vectores vive
+    en memoria a la vez.
+    """
+    sql = (
+        f"SELECT {', '.join(fields)}, vector_send({vector_sql}) {from_sql} "
+        f"ORDER BY {order_by}"
+    )
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    statement = text(sql).execution_options(stream_results=True, yield_per=batch_size)
+
+    n_fields = len(fields)
+    for batch in db.execute(statement, params or {}).partitions():
+        buffers = [row[n_fields] for row in batch]
+        if _vector_dimension(buffers[0]) != dimension:
+            raise ValueError(
+                f"Dimensión de embedding {_vector_dimension(buffers[0])}, "
+                f"se esperaba {dimension}"
+            )
+        values = [[row[field] for row in batch] for field in range(n_fields)]
+        yield _to_columns(values), _decode_vectors(buffers, dimension)
+
+
+def load_columnar(
+    db: Session,
+    fields: list[str],
+    from_sql: str,
+    order_by: str,
+    params: dict | None = None,
+    vector_sql: str = "embedding",
+    dimension: int = 1024,
+    batch_size: int = COLUMNAR_BATCH_SIZE,
+    limit: int | None = None,
+) -> tuple[list[np.ndarray], np.ndarray]:
+    """
+    Carga columnas y embeddings de una consulta
+
+    fields son las expresiones SQL de las columnas (la primera debe ser un id
+    entero); from_sql es la cláusula FROM ... WHERE ... compartida por el
+    conteo y la lectura. Devuelve las columnas como arreglos (int64 la
+    primera, object el resto) y la matriz float32 (n, dimensión) sin
+    normalizar. Con limit se leen a lo más esas filas.
+    """
+    total = count_rows(db, from_sql, params)
+    if limit is not None:
+        total = min(total, limit)
+    matrix = np.empty((total, dimension), dtype=np.float32)
+    values = [[] for _ in fields]
+    n_rows = 0
+    for columns, vectors in iter_columnar(
+        db, fields, from_sql, order_by, params, vector_sql, dimension, batch_size, limit
+    ):
+        # Filas insertadas entre el conteo y la lectura
+        if n_rows + len(vectors) > len(matrix):
+            capacity = max(2 * len(matrix), n_rows + len(vectors))
+            grown = np.empty((capacity, dimension), dtype=np.float32)
+            grown[:n_rows] = matrix[:n_rows]
+            matrix = grown
+
+        matrix[n_rows : n_rows + len(vectors)] = vectors
+        for column_values, column in zip(values, columns):
+            column_values.extend(column.tolist())
+        n_rows += len(vectors)
+
+    return _to_columns(values), matrix[:n_rows]
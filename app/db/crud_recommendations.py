@@ -2,25 +2,86 @@
 Funciones CRUD específicas para el sistema de recomendaciones
 """
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
 import os
+from functools import lru_cache
 from time import sleep
 import numpy as np
-from sklearn.cluster import KMeans
 from sklearn.decomposition import PCA
 
 import dashscope
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
 
 from . import models, schemas
+from .clustering import (
+    assign_clusters,
+    cluster_embeddings,
+    cluster_sample_limit,
+    fit_minibatch_centers,
+    group_clusters,
+    sample_percent,
+    submit_analysis,
+    trim_sample,
+)
+from .columnar import COLUMNAR_BATCH_SIZE, count_rows, iter_columnar, load_columnar
+from .embedding_cache import query_embedding_cache
+from .embedding_versions import get_embedding_version, get_embedding_versions
+from .knn_table import KNN_TABLE_ENABLED, lookup_similar_items
+from .result_cache import analysis_cache
+from .text_search import reciprocal_rank_fusion, tsquery_sql, tsvector_sql
+from .topic_model import get_topic_model
+from .vector_index import (
+    QUANTIZATION_MODES,
+    VECTOR_QUANTIZATION,
+    VECTOR_RERANK,
+    apply_search_params,
+    distance_operator,
+    prepare_query_vector,
+    quantized_distance_sql,
+    rerank_candidates,
+    similarity_sql,
+    vector_param,
+)
+from .vector_store import (
+    VECTOR_SEARCH_BACKEND,
+    normalize_rows,
+    top_k_indices,
+    vector_store,
+)
 
 load_dotenv()
 
 dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
 dashscope.base_http_api_url = "https://dashscope-intl.aliyuncs.com/api/v1"
 
+EMBEDDING_MODEL = dashscope.TextEmbedding.Models.text_embedding_v4
+EMBEDDING_DIMENSION = 1024
+
+# Límite de llamadas simultáneas a Dashscope y timeout por llamada (segundos)
+DASHSCOPE_MAX_CONCURRENCY = int(os.getenv("DASHSCOPE_MAX_CONCURRENCY", "4"))
+DASHSCOPE_TIMEOUT = float(os.getenv("DASHSCOPE_TIMEOUT", "10"))
+
+# Máximo de resultados por búsqueda, para acotar el costo de cada consulta
+RECOMMENDATION_MAX_K = int(os.getenv("RECOMMENDATION_MAX_K", "100"))
+
+# Máximo de consultas o ids por petición en los endpoints batch
+RECOMMENDATION_MAX_BATCH = int(os.getenv("RECOMMENDATION_MAX_BATCH", "50"))
+
+# Máximo de textos por llamada que acepta text_embedding_v4
+DASHSCOPE_BATCH_SIZE = 10
+
+# El SDK de Dashscope es síncrono: las llamadas desde endpoints async se
+# ejecutan en este pool acotado para no bloquear el event loop de uvicorn
+_embedding_executor = ThreadPoolExecutor(
+    max_workers=DASHSCOPE_MAX_CONCURRENCY, thread_name_prefix="dashscope"
+)
+_embedding_semaphore = asyncio.Semaphore(DASHSCOPE_MAX_CONCURRENCY)
+
 
 def clean_text(text: str) -> str:
     """Limpia y normaliza texto para generar embeddings"""
@@ -33,75 +94,208 @@ def clean_text(text: str) -> str:
     return text
 
 
+def _query_cache_key(cleaned_query: str) -> str:
+    return query_embedding_cache.key(
+        EMBEDDING_MODEL, EMBEDDING_DIMENSION, "query", cleaned_query
+    )
+
+
+def _request_query_embeddings(
+    cleaned_queries: list[str],
+) -> list[list[float] | None]:
+    """Llama a Dashscope por lotes y guarda los resultados en la caché"""
+    embeddings = [None] * len(cleaned_queries)
+
+    for start in range(0, len(cleaned_queries), DASHSCOPE_BATCH_SIZE):
+        batch = cleaned_queries[start : start + DASHSCOPE_BATCH_SIZE]
+        try:
+            resp = dashscope.TextEmbedding.call(
+                model=EMBEDDING_MODEL,
+                input=batch,
+                text_type="query",  # Indicamos que es una consulta
+                dimension=EMBEDDING_DIMENSION,
+            )
+
+            if resp.status_code == HTTPStatus.OK:
+                for embedding_data in resp.output["embeddings"]:
+                    index = start + embedding_data["text_index"]
+                    embeddings[index] = embedding_data["embedding"]
+                    query_embedding_cache.set(
+                        _query_cache_key(cleaned_queries[index]), embeddings[index]
+                    )
+            else:
+                print(f"Error generating embedding for query: {resp.text}")
+
+        except Exception as e:
+            print(f"Exception during embedding generation: {e}")
+
+    return embeddings
+
+
+def _request_query_embedding(cleaned_query: str) -> list[float] | None:
+    return _request_query_embeddings([cleaned_query])[0]
+
+
 def generate_query_embedding(query: str) -> list[float] | None:
     """
     Genera embedding para una consulta de texto usando Dashscope
     """
-    try:
-        cleaned_query = clean_text(query)
+    cleaned_query = clean_text(query)
 
-        resp = dashscope.TextEmbedding.call(
-            model=dashscope.TextEmbedding.Models.text_embedding_v4,
-            input=[cleaned_query],
-            text_type="query",  # Indicamos que es una consulta
-            dimension=1024,
-        )
+    cached_embedding = query_embedding_cache.get(_query_cache_key(cleaned_query))
+    if cached_embedding is not None:
+        return cached_embedding
+
+    return _request_query_embedding(cleaned_query)
 
-        if resp.status_code == HTTPStatus.OK:
-            return resp.output["embeddings"][0]["embedding"]
-        else:
-            print(f"Error generating embedding for query: {resp.text}")
-            return None
 
-    except Exception as e:
-        print(f"Exception during embedding generation: {e}")
+async def generate_query_embedding_async(query: str) -> list[float] | None:
+    """
+    Versión asíncrona de generate_query_embedding
+
+    Los aciertos de caché se resuelven sin salir del event loop; los fallos se
+    envían al pool de Dashscope con límite de concurrencia y timeout por llamada.
+    """
+    cleaned_query = clean_text(query)
+
+    cached_embedding = query_embedding_cache.get(_query_cache_key(cleaned_query))
+    if cached_embedding is not None:
+        return cached_embedding
+
+    loop = asyncio.get_running_loop()
+    try:
+        async with _embedding_semaphore:
+            return await asyncio.wait_for(
+                loop.run_in_executor(
+                    _embedding_executor, _request_query_embedding, cleaned_query
+                ),
+                timeout=DASHSCOPE_TIMEOUT,
+            )
+    except asyncio.TimeoutError:
+        print(f"Timeout ({DASHSCOPE_TIMEOUT}s) generating embedding for query")
         return None
 
 
-def search_similar_theses_by_embedding(
-    db: Session, embedding: list[float], k: int = 10
-) -> list:
+def _pending_queries(queries: list[str]) -> tuple[list, list[str]]:
+    """Resuelve desde la caché y devuelve las consultas únicas que faltan"""
+    cleaned_queries = [clean_text(query) for query in queries]
+    embeddings = [
+        query_embedding_cache.get(_query_cache_key(cleaned))
+        for cleaned in cleaned_queries
+    ]
+    pending = {}
+    for cleaned, embedding in zip(cleaned_queries, embeddings):
+        if embedding is None:
+            pending.setdefault(_query_cache_key(cleaned), cleaned)
+    return embeddings, list(pending.values())
+
+
+def _merge_embeddings(
+    queries: list[str], embeddings: list, pending: list[str], fetched: list
+) -> list[list[float] | None]:
+    by_key = {_query_cache_key(cleaned): e for cleaned, e in zip(pending, fetched)}
+    return [
+        (
+            embedding
+            if embedding is not None
+            else by_key.get(_query_cache_key(clean_text(query)))
+        )
+        for query, embedding in zip(queries, embeddings)
+    ]
+
+
+def generate_query_embeddings(queries: list[str]) -> list[list[float] | None]:
     """
-    Busca las k tesis más similares usando similitud de coseno con pgvector
+    Genera embeddings para varias consultas (caché + llamadas por lotes a Dashscope)
     """
-    # Convertir el embedding a string para la consulta SQL
-    embedding_str = f"[{','.join(map(str, embedding))}]"
+    embeddings, pending = _pending_queries(queries)
+    if not pending:
+        return embeddings
 
-    query = text(
-        f"""
-        SELECT 
+    fetched = _request_query_embeddings(pending)
+    return _merge_embeddings(queries, embeddings, pending, fetched)
+
+
+async def generate_query_embeddings_async(
+    queries: list[str],
+) -> list[list[float] | None]:
+    """Versión asíncrona de generate_query_embeddings"""
+    embeddings, pending = _pending_queries(queries)
+    if not pending:
+        return embeddings
+
+    n_calls = -(-len(pending) // DASHSCOPE_BATCH_SIZE)
+    loop = asyncio.get_running_loop()
+    try:
+        async with _embedding_semaphore:
+            fetched = await asyncio.wait_for(
+                loop.run_in_executor(
+                    _embedding_executor, _request_query_embeddings, pending
+                ),
+                timeout=DASHSCOPE_TIMEOUT * n_calls,
+            )
+    except asyncio.TimeoutError:
+        print(f"Timeout ({DASHSCOPE_TIMEOUT}s per call) generating query embeddings")
+        fetched = [None] * len(pending)
+
+    return _merge_embeddings(queries, embeddings, pending, fetched)
+
+
+# Tipo de referencia de /similar -> tipo de entidad (nombre de tabla)
+_ENTITY_TYPES = {"thesis": "theses", "research_product": "research_products"}
+
+
+def clamp_k(k: int) -> int:
+    """Limita k al rango [1, RECOMMENDATION_MAX_K]"""
+    return max(1, min(int(k), RECOMMENDATION_MAX_K))
+
+
+# El vector de consulta se enlaza una sola vez como parámetro y la distancia se
+# calcula en la subconsulta; la consulta externa solo la convierte en score.
+_THESIS_SEARCH_QUERY = text(
+    f"""
+    SELECT
+        ranked.id,
+        ranked.title,
+        ranked.student_id,
+        ranked.student_name,
+        ranked.advisor1_name,
+        ranked.advisor2_name,
+        {similarity_sql("ranked.distance")} as similarity_score
+    FROM (
+        SELECT
             t.id,
             t.title,
             t.student_id,
             s.name as student_name,
             p1.name as advisor1_name,
             p2.name as advisor2_name,
-            1 - (t.embedding <=> '{embedding_str}') as similarity_score
+            t.embedding {distance_operator()} CAST(:query_vector AS vector) as distance
         FROM theses t
         JOIN students s ON t.student_id = s.id
         JOIN professors p1 ON t.advisor1_id = p1.id
         LEFT JOIN professors p2 ON t.advisor2_id = p2.id
         WHERE t.embedding IS NOT NULL
-        ORDER BY t.embedding <=> '{embedding_str}'
-        LIMIT {k}
-    """
-    )
-
-    return db.execute(query).fetchall()
-
-
-def search_similar_research_products_by_embedding(
-    db: Session, embedding: list[float], k: int = 10
-) -> list:
-    """
-    Busca los k productos de investigación más similares usando similitud de coseno con pgvector
-    """
-    # Convertir el embedding a string para la consulta SQL
-    embedding_str = f"[{','.join(map(str, embedding))}]"
-
-    query = text(
-        f"""
-        SELECT 
+        ORDER BY distance, t.id
+        LIMIT :k
+    ) ranked
+    ORDER BY ranked.distance, ranked.id
+"""
+)
+
+_RESEARCH_PRODUCT_SEARCH_QUERY = text(
+    f"""
+    SELECT
+        ranked.id,
+        ranked.title,
+        ranked.site,
+        ranked.year,
+        ranked.professor_id,
+        ranked.professor_name,
+        ranked.laboratory_name,
+        {similarity_sql("ranked.distance")} as similarity_score
+    FROM (
+        SELECT
             rp.id,
             rp.title,
             rp.site,
@@ -109,17 +303,815 @@ def search_similar_research_products_by_embedding(
             rp.professor_id,
             p.name as professor_name,
             l.name as laboratory_name,
-            1 - (rp.embedding <=> '{embedding_str}') as similarity_score
+            rp.embedding {distance_operator()} CAST(:query_vector AS vector) as distance
         FROM research_products rp
         JOIN professors p ON rp.professor_id = p.id
         JOIN laboratories l ON p.laboratory_id = l.id
         WHERE rp.embedding IS NOT NULL
-        ORDER BY rp.embedding <=> '{embedding_str}'
-        LIMIT {k}
+        ORDER BY distance, rp.id
+        LIMIT :k
+    ) ranked
+    ORDER BY ranked.distance, ranked.id
+"""
+)
+
+
+def search_similar_theses_by_embedding(
+    db: Session,
+    embedding: list[float],
+    k: int = 10,
+    ef_search: int | None = None,
+    probes: int | None = None,
+    quantization: str | None = None,
+    rerank: bool | None = None,
+    candidate_multiplier: int | None = None,
+) -> list:
+    """
+    Busca las k tesis más similares usando similitud de coseno con pgvector
+    """
+    k = clamp_k(k)
+
+    if VECTOR_SEARCH_BACKEND == "memory":
+        return vector_store.search(db, "theses", embedding, k)
+
+    if (quantization or VECTOR_QUANTIZATION) != "none":
+        return search_similar_items_by_embedding(
+            db,
+            embedding,
+            k,
+            include_research_products=False,
+            ef_search=ef_search,
+            probes=probes,
+            quantization=quantization,
+            rerank=rerank,
+            candidate_multiplier=candidate_multiplier,
+        )["theses"]
+
+    apply_search_params(db, ef_search, probes)
+
+    params = {"query_vector": vector_param(prepare_query_vector(embedding)), "k": k}
+    return db.execute(_THESIS_SEARCH_QUERY, params).fetchall()
+
+
+def search_similar_research_products_by_embedding(
+    db: Session,
+    embedding: list[float],
+    k: int = 10,
+    ef_search: int | None = None,
+    probes: int | None = None,
+    quantization: str | None = None,
+    rerank: bool | None = None,
+    candidate_multiplier: int | None = None,
+) -> list:
+    """
+    Busca los k productos de investigación más similares usando similitud de coseno con pgvector
+    """
+    k = clamp_k(k)
+
+    if VECTOR_SEARCH_BACKEND == "memory":
+        return vector_store.search(db, "research_products", embedding, k)
+
+    if (quantization or VECTOR_QUANTIZATION) != "none":
+        return search_similar_items_by_embedding(
+            db,
+            embedding,
+            k,
+            include_theses=False,
+            ef_search=ef_search,
+            probes=probes,
+            quantization=quantization,
+            rerank=rerank,
+            candidate_multiplier=candidate_multiplier,
+        )["research_products"]
+
+    apply_search_params(db, ef_search, probes)
+
+    params = {"query_vector": vector_param(prepare_query_vector(embedding)), "k": k}
+    return db.execute(_RESEARCH_PRODUCT_SEARCH_QUERY, params).fetchall()
+
+
+# Subconsultas top-k con un esquema de columnas común (kind + campos de ambas
+# entidades), para combinarlas con UNION ALL. {distance} es la distancia que se
+# devuelve, {order} la expresión por la que se recorre el índice, {limit} el
+# número de filas y {where}, condiciones adicionales (" AND ..."). El id
+# desempata distancias iguales, así el orden es total y estable entre páginas
+# (sobre el recorrido del índice basta un Incremental Sort de los empates).
+_THESIS_RANKED_SQL = """
+            SELECT
+                'theses' as kind,
+                t.id,
+                t.title,
+                t.student_id,
+                s.name as student_name,
+                p1.name as advisor1_name,
+                p2.name as advisor2_name,
+                CAST(NULL AS varchar) as site,
+                CAST(NULL AS integer) as year,
+                CAST(NULL AS integer) as professor_id,
+                CAST(NULL AS varchar) as professor_name,
+                CAST(NULL AS varchar) as laboratory_name,
+                {distance} as distance
+            FROM theses t
+            JOIN students s ON t.student_id = s.id
+            JOIN professors p1 ON t.advisor1_id = p1.id
+            LEFT JOIN professors p2 ON t.advisor2_id = p2.id
+            WHERE t.embedding IS NOT NULL{where}
+            ORDER BY {order}, t.id
+            LIMIT {limit}
+"""
+
+_RESEARCH_PRODUCT_RANKED_SQL = """
+            SELECT
+                'research_products' as kind,
+                rp.id,
+                rp.title,
+                CAST(NULL AS integer) as student_id,
+                CAST(NULL AS varchar) as student_name,
+                CAST(NULL AS varchar) as advisor1_name,
+                CAST(NULL AS varchar) as advisor2_name,
+                rp.site,
+                rp.year,
+                rp.professor_id,
+                p.name as professor_name,
+                l.name as laboratory_name,
+                {distance} as distance
+            FROM research_products rp
+            JOIN professors p ON rp.professor_id = p.id
+            JOIN laboratories l ON p.laboratory_id = l.id
+            WHERE rp.embedding IS NOT NULL{where}
+            ORDER BY {order}, rp.id
+            LIMIT {limit}
+"""
+
+_RANKED_FIELDS = """
+        ranked.kind,
+        ranked.id,
+        ranked.title,
+        ranked.student_id,
+        ranked.student_name,
+        ranked.advisor1_name,
+        ranked.advisor2_name,
+        ranked.site,
+        ranked.year,
+        ranked.professor_id,
+        ranked.professor_name,
+        ranked.laboratory_name"""
+
+_RANKED_COLUMNS = f"""{_RANKED_FIELDS},
+        {similarity_sql("ranked.distance")} as similarity_score"""
+
+
+def _result_distance_sql(
+    alias: str, vector_sql: str, quantization: str = "none", rerank: bool = False
+) -> str:
+    """
+    Distancia que devuelve el ranking: la cuantizada sin rerank y la exacta
+    sobre embedding (float32) con rerank
+    """
+    if rerank:
+        quantization = "none"
+    return quantized_distance_sql(alias, vector_sql, quantization)
+
+
+def _ranked_sql(
+    template: str,
+    alias: str,
+    vector_sql: str,
+    where: str,
+    quantization: str = "none",
+    rerank: bool = False,
+) -> str:
+    """
+    Subconsulta top-k de una entidad para la cuantización indicada
+
+    Con rerank, el índice de la columna cuantizada aporta :candidates filas y
+    se ordenan de nuevo por la distancia exacta sobre embedding (float32).
+    """
+    approximate = quantized_distance_sql(alias, vector_sql, quantization)
+    if quantization == "none" or not rerank:
+        return template.format(
+            distance=approximate, order="distance", limit=":k", where=where
+        )
+
+    candidates = template.format(
+        distance=_result_distance_sql(alias, vector_sql, quantization, rerank),
+        order=approximate,
+        limit=":candidates",
+        where=where,
+    )
+    return f"SELECT * FROM ({candidates}) candidates ORDER BY distance, id LIMIT :k"
+
+
+def _ranked_union(
+    vector_sql: str,
+    include_theses: bool,
+    include_products: bool,
+    thesis_where: str = "",
+    product_where: str = "",
+    quantization: str = "none",
+    rerank: bool = False,
+) -> str:
+    parts = []
+    if include_theses:
+        parts.append(
+            f"({_ranked_sql(_THESIS_RANKED_SQL, 't', vector_sql, thesis_where, quantization, rerank)})"
+        )
+    if include_products:
+        parts.append(
+            f"({_ranked_sql(_RESEARCH_PRODUCT_RANKED_SQL, 'rp', vector_sql, product_where, quantization, rerank)})"
+        )
+    return "\n        UNION ALL\n        ".join(parts)
+
+
+def _keyset_sql(
+    alias: str,
+    vector_sql: str,
+    prefix: str,
+    quantization: str = "none",
+    rerank: bool = False,
+) -> str:
+    """
+    Condición para continuar el ranking tras la fila (score, id) de un cursor
+
+    Se compara con la misma expresión de similitud que devuelve la consulta
+    (incluida la cuantización sin rerank), así el score recibido del cursor
+    coincide exactamente con el calculado.
+    """
+    score = similarity_sql(
+        _result_distance_sql(alias, vector_sql, quantization, rerank)
+    )
+    return (
+        f" AND ({score} < :{prefix}_after_score"
+        f" OR ({score} = :{prefix}_after_score AND {alias}.id > :{prefix}_after_id))"
+    )
+
+
+@lru_cache(maxsize=64)
+def _combined_search_query(
+    include_theses: bool,
+    include_products: bool,
+    quantization: str = "none",
+    rerank: bool = False,
+    thesis_where: str = "",
+    product_where: str = "",
+    paginate: bool = False,
+) -> TextClause:
+    """
+    Búsqueda de uno o ambos tipos en una sola sentencia
+
+    El vector se enlaza una vez en el CTE y se lee con una subconsulta escalar
+    (InitPlan), que sí permite usar el índice ANN. Con paginate, cada tipo
+    continúa después de la posición :<tipo>_after_score / :<tipo>_after_id.
+    """
+    if paginate:
+        thesis_where += _keyset_sql(
+            "t", "(SELECT v FROM q)", "theses", quantization, rerank
+        )
+        product_where += _keyset_sql(
+            "rp", "(SELECT v FROM q)", "research_products", quantization, rerank
+        )
+
+    return text(
+        f"""
+    WITH q AS (SELECT CAST(:query_vector AS vector) AS v)
+    SELECT {_RANKED_COLUMNS}
+    FROM (
+        {_ranked_union(
+            "(SELECT v FROM q)",
+            include_theses,
+            include_products,
+            thesis_where=thesis_where,
+            product_where=product_where,
+            quantization=quantization,
+            rerank=rerank,
+        )}
+    ) ranked
+    ORDER BY ranked.kind, ranked.distance, ranked.id
+"""
+    )
+
+
+def filtered_entities(
+    filters: schemas.SearchFilters | None,
+    include_theses: bool,
+    include_products: bool,
+) -> tuple[bool, bool]:
+    """
+    Tipos que pueden cumplir los filtros dados
+
+    Una entidad sin el dato filtrado no puede cumplir el filtro, así que se
+    excluye en lugar de devolverse sin filtrar: con min_year/max_year no hay
+    tesis (no tienen año) y con program no hay productos.
+    """
+    if filters is None:
+        return include_theses, include_products
+    if filters.min_year is not None or filters.max_year is not None:
+        include_theses = False
+    if filters.program is not None:
+        include_products = False
+    return include_theses, include_products
+
+
+def _filter_clauses(filters: schemas.SearchFilters | None) -> tuple[str, str, dict]:
+    """
+    Condiciones WHERE (" AND ...") de tesis y productos para los filtros dados
+
+    Los filtros se aplican dentro de las subconsultas top-k, de modo que el
+    índice ANN devuelve k filas que ya los cumplen. Cada condición se agrega
+    solo a la entidad que tiene ese dato; las entidades que no lo tienen se
+    excluyen antes con filtered_entities.
+    """
+    if filters is None:
+        return "", "", {}
+
+    thesis, product, params = [], [], {}
+    if filters.min_year is not None:
+        product.append("rp.year >= :min_year")
+        params["min_year"] = filters.min_year
+    if filters.max_year is not None:
+        product.append("rp.year <= :max_year")
+        params["max_year"] = filters.max_year
+    if filters.laboratory_id is not None:
+        thesis.append(
+            "(p1.laboratory_id = :laboratory_id OR p2.laboratory_id = :laboratory_id)"
+        )
+        product.append("p.laboratory_id = :laboratory_id")
+        params["laboratory_id"] = filters.laboratory_id
+    if filters.professor_id is not None:
+        thesis.append(
+            "(t.advisor1_id = :professor_id OR t.advisor2_id = :professor_id)"
+        )
+        product.append("rp.professor_id = :professor_id")
+        params["professor_id"] = filters.professor_id
+    if filters.program is not None:
+        thesis.append(
+            "EXISTS (SELECT 1 FROM academic_programs ap "
+            "WHERE ap.student_id = t.student_id AND ap.program = :program)"
+        )
+        params["program"] = filters.program
+
+    return (
+        "".join(f" AND {clause}" for clause in thesis),
+        "".join(f" AND {clause}" for clause in product),
+        params,
+    )
+
+
+def _search_options(
+    k: int,
+    quantization: str | None,
+    rerank: bool | None,
+    candidate_multiplier: int | None = None,
+    ef_search: int | None = None,
+) -> tuple[str, bool, dict, int | None]:
+    """
+    Resuelve cuantización y rerank por defecto y los parámetros que requieren
+
+    Devuelve también el ef_search a aplicar: HNSW entrega como máximo
+    ef_search filas, así que se eleva hasta el número de candidatos.
+    """
+    quantization = quantization or VECTOR_QUANTIZATION
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(
+            f"Cuantización no soportada: {quantization}. Opciones: {QUANTIZATION_MODES}"
+        )
+    rerank = VECTOR_RERANK if rerank is None else rerank
+    if quantization == "binary":
+        # La distancia de Hamming no es comparable con la similitud coseno
+        rerank = True
+
+    params = {"k": k}
+    if quantization != "none" and rerank:
+        candidates = rerank_candidates(k, quantization, candidate_multiplier)
+        params["candidates"] = candidates
+        ef_search = max(ef_search or 0, candidates)
+    return quantization, rerank, params, ef_search
+
+
+@lru_cache(maxsize=64)
+def _batch_search_query(
+    n_queries: int,
+    include_theses: bool,
+    include_products: bool,
+    quantization: str = "none",
+    rerank: bool = False,
+    thesis_where: str = "",
+    product_where: str = "",
+) -> TextClause:
+    """Consulta para n vectores: cada uno ejecuta sus top-k mediante LATERAL"""
+    values = ", ".join(
+        f"({i}, CAST(:query_vector_{i} AS vector))" for i in range(n_queries)
+    )
+    return text(
+        f"""
+    WITH q(idx, v) AS (VALUES {values})
+    SELECT q.idx, {_RANKED_COLUMNS}
+    FROM q
+    CROSS JOIN LATERAL (
+        {_ranked_union(
+            "q.v",
+            include_theses,
+            include_products,
+            thesis_where=thesis_where,
+            product_where=product_where,
+            quantization=quantization,
+            rerank=rerank,
+        )}
+    ) ranked
+    ORDER BY q.idx, ranked.kind, ranked.distance, ranked.id
+"""
+    )
+
+
+@lru_cache(maxsize=4)
+def _reference_search_query(include_theses: bool, include_products: bool) -> TextClause:
+    """
+    Búsqueda por id de referencia resuelta por completo en el servidor
+
+    Cada referencia (tesis o producto) aporta su propio embedding desde la tabla,
+    se excluye a sí misma en el WHERE y obtiene exactamente k vecinos.
+    """
+    return text(
+        f"""
+    WITH refs AS (
+        SELECT *
+        FROM unnest(
+            CAST(:thesis_ids AS integer[]), CAST(:research_product_ids AS integer[])
+        ) WITH ORDINALITY AS r(thesis_id, research_product_id, idx)
+    ),
+    q AS (
+        SELECT
+            refs.idx,
+            refs.thesis_id,
+            refs.research_product_id,
+            COALESCE(rt.embedding, rrp.embedding) AS v
+        FROM refs
+        LEFT JOIN theses rt ON rt.id = refs.thesis_id
+        LEFT JOIN research_products rrp ON rrp.id = refs.research_product_id
+        WHERE COALESCE(rt.embedding, rrp.embedding) IS NOT NULL
+    )
+    SELECT q.idx - 1, {_RANKED_COLUMNS}
+    FROM q
+    CROSS JOIN LATERAL (
+        {_ranked_union(
+            "q.v",
+            include_theses,
+            include_products,
+            thesis_where=" AND t.id IS DISTINCT FROM q.thesis_id",
+            product_where=" AND rp.id IS DISTINCT FROM q.research_product_id",
+        )}
+    ) ranked
+    ORDER BY q.idx, ranked.kind, ranked.distance, ranked.id
+"""
+    )
+
+
+def split_combined_results(rows: list) -> dict:
+    """Separa las filas combinadas en las formas de fila de cada búsqueda"""
+    results = {"theses": [], "research_products": []}
+    for row in rows:
+        if row[0] == "theses":
+            results["theses"].append(tuple(row[1:7]) + (row[12],))
+        else:
+            results["research_products"].append(
+                (row[1], row[2]) + tuple(row[7:12]) + (row[12],)
+            )
+    return results
+
+
+def search_similar_items_by_embedding(
+    db: Session,
+    embedding: list[float],
+    k: int = 10,
+    include_theses: bool = True,
+    include_research_products: bool = True,
+    ef_search: int | None = None,
+    probes: int | None = None,
+    quantization: str | None = None,
+    rerank: bool | None = None,
+    candidate_multiplier: int | None = None,
+    filters: schemas.SearchFilters | None = None,
+    after: dict[str, tuple[float, int]] | None = None,
+) -> dict:
+    """
+    Busca tesis y productos de investigación similares
+
+    Si se piden ambos tipos con pgvector, se resuelven en una sola consulta
+    (un solo viaje a la base de datos y un mismo snapshot). quantization="half"
+    recorre el índice halfvec y "binary" el de Hamming sobre códigos de signo;
+    con rerank, se piden k * candidate_multiplier candidatos y se reordenan con
+    los vectores float32. Las búsquedas con filtros siempre se resuelven en SQL.
+
+    after ({tipo: (score, id)}, de un cursor) continúa el ranking de cada tipo
+    después de la última fila entregada; los tipos sin posición se omiten.
+    """
+    results = {"theses": [], "research_products": []}
+    include_theses, include_research_products = filtered_entities(
+        filters, include_theses, include_research_products
+    )
+    if after is not None:
+        include_theses = include_theses and "theses" in after
+        include_research_products = (
+            include_research_products and "research_products" in after
+        )
+    if not (include_theses or include_research_products):
+        return results
+
+    quantization, rerank, params, ef_search = _search_options(
+        clamp_k(k), quantization, rerank, candidate_multiplier, ef_search
+    )
+    thesis_where, product_where, filter_params = _filter_clauses(filters)
+
+    if VECTOR_SEARCH_BACKEND == "memory" and not filter_params and after:
+        for entity_type, included in (
+            ("theses", include_theses),
+            ("research_products", include_research_products),
+        ):
+            if included:
+                results[entity_type] = vector_store.search(
+                    db, entity_type, embedding, clamp_k(k), after=after[entity_type]
+                )
+        return results
+
+    if (
+        not filter_params
+        and not after
+        and (
+            VECTOR_SEARCH_BACKEND == "memory"
+            or (
+                quantization == "none"
+                and not (include_theses and include_research_products)
+            )
+        )
+    ):
+        if include_theses:
+            results["theses"] = search_similar_theses_by_embedding(
+                db, embedding, k, ef_search=ef_search, probes=probes
+            )
+        if include_research_products:
+            results["research_products"] = (
+                search_similar_research_products_by_embedding(
+                    db, embedding, k, ef_search=ef_search, probes=probes
+                )
+            )
+        return results
+
+    # Tanto los filtros como el keyset descartan filas que el índice recorre
+    apply_search_params(
+        db, ef_search, probes, iterative_scan=bool(filter_params or after)
+    )
+
+    params.update(filter_params)
+    for entity_type, (score, item_id) in (after or {}).items():
+        params[f"{entity_type}_after_score"] = score
+        params[f"{entity_type}_after_id"] = item_id
+    params["query_vector"] = vector_param(prepare_query_vector(embedding))
+    query = _combined_search_query(
+        include_theses,
+        include_research_products,
+        quantization,
+        rerank,
+        thesis_where,
+        product_where,
+        bool(after),
+    )
+    rows = db.execute(query, params).fetchall()
+    return split_combined_results(rows)
+
+
+def search_similar_items_batch(
+    db: Session,
+    embeddings: list[list[float]],
+    k: int = 10,
+    include_theses: bool = True,
+    include_research_products: bool = True,
+    ef_search: int | None = None,
+    probes: int | None = None,
+    quantization: str | None = None,
+    rerank: bool | None = None,
+    candidate_multiplier: int | None = None,
+    filters: schemas.SearchFilters | None = None,
+) -> list[dict]:
+    """
+    Busca tesis y productos similares para varios vectores a la vez
+
+    Con pgvector todos los vectores se resuelven en una sola consulta (LATERAL
+    por vector); en memoria, con un único producto matriz-matriz.
+    """
+    include_theses, include_research_products = filtered_entities(
+        filters, include_theses, include_research_products
+    )
+    if not embeddings or not (include_theses or include_research_products):
+        return [{"theses": [], "research_products": []} for _ in embeddings]
+
+    k = clamp_k(k)
+    quantization, rerank, params, ef_search = _search_options(
+        k, quantization, rerank, candidate_multiplier, ef_search
+    )
+    thesis_where, product_where, filter_params = _filter_clauses(filters)
+
+    if VECTOR_SEARCH_BACKEND == "memory" and not filter_params:
+        results = [{"theses": [], "research_products": []} for _ in embeddings]
+        for entity_type, included in (
+            ("theses", include_theses),
+            ("research_products", include_research_products),
+        ):
+            if included:
+                batch = vector_store.search_batch(db, entity_type, embeddings, k)
+                for result, rows in zip(results, batch):
+                    result[entity_type] = rows
+        return results
+
+    apply_search_params(db, ef_search, probes, iterative_scan=bool(filter_params))
+
+    params.update(filter_params)
+    for i, embedding in enumerate(embeddings):
+        params[f"query_vector_{i}"] = vector_param(prepare_query_vector(embedding))
+
+    query = _batch_search_query(
+        len(embeddings),
+        include_theses,
+        include_research_products,
+        quantization,
+        rerank,
+        thesis_where,
+        product_where,
+    )
+    grouped = [[] for _ in embeddings]
+    for row in db.execute(query, params).fetchall():
+        grouped[row[0]].append(row[1:])
+
+    return [split_combined_results(rows) for rows in grouped]
+
+
+@lru_cache(maxsize=64)
+def _lexical_search_query(
+    include_theses: bool,
+    include_products: bool,
+    thesis_where: str = "",
+    product_where: str = "",
+) -> TextClause:
+    """
+    Búsqueda full-text sobre los títulos con el mismo esquema de columnas
+
+    La distancia es el ts_rank_cd normalizado (0-1) con signo negativo, de
+    modo que el orden ascendente de las plantillas sigue siendo el correcto.
+    """
+    parts = []
+    for template, alias, included, where in (
+        (_THESIS_RANKED_SQL, "t", include_theses, thesis_where),
+        (_RESEARCH_PRODUCT_RANKED_SQL, "rp", include_products, product_where),
+    ):
+        if included:
+            document = tsvector_sql(f"{alias}.title")
+            parts.append(
+                "("
+                + template.format(
+                    distance=f"-ts_rank_cd({document}, (SELECT tsq FROM q), 32)",
+                    order="distance",
+                    limit=":k",
+                    where=f" AND {document} @@ (SELECT tsq FROM q){where}",
+                )
+                + ")"
+            )
+
+    union = "\n        UNION ALL\n        ".join(parts)
+    return text(
+        f"""
+    WITH q AS (SELECT {tsquery_sql(":query")} AS tsq)
+    SELECT {_RANKED_FIELDS},
+        -ranked.distance as similarity_score
+    FROM (
+        {union}
+    ) ranked
+    ORDER BY ranked.kind, ranked.distance, ranked.id
+"""
+    )
+
+
+def search_similar_items_by_text(
+    db: Session,
+    query: str,
+    k: int = 10,
+    include_theses: bool = True,
+    include_research_products: bool = True,
+    filters: schemas.SearchFilters | None = None,
+) -> dict:
+    """
+    Busca tesis y productos por coincidencia léxica en el título
+
+    No requiere embedding de la consulta; similarity_score es el ts_rank_cd.
+    """
+    include_theses, include_research_products = filtered_entities(
+        filters, include_theses, include_research_products
+    )
+    if not (include_theses or include_research_products):
+        return {"theses": [], "research_products": []}
+
+    thesis_where, product_where, params = _filter_clauses(filters)
+    params.update({"query": query, "k": clamp_k(k)})
+    rows = db.execute(
+        _lexical_search_query(
+            include_theses, include_research_products, thesis_where, product_where
+        ),
+        params,
+    ).fetchall()
+    return split_combined_results(rows)
+
+
+def search_similar_items_hybrid(
+    db: Session,
+    query: str,
+    embedding: list[float],
+    k: int = 10,
+    include_theses: bool = True,
+    include_research_products: bool = True,
+    filters: schemas.SearchFilters | None = None,
+    **search_options,
+) -> dict:
+    """
+    Combina los rankings vectorial y léxico con Reciprocal Rank Fusion
+
+    Cada modalidad aporta hasta 2k candidatos; similarity_score es el score
+    RRF (suma de 1 / (60 + rango) en cada ranking donde aparece).
     """
+    candidates = clamp_k(2 * k)
+    vector_results = search_similar_items_by_embedding(
+        db,
+        embedding,
+        candidates,
+        include_theses=include_theses,
+        include_research_products=include_research_products,
+        filters=filters,
+        **search_options,
+    )
+    lexical_results = search_similar_items_by_text(
+        db, query, candidates, include_theses, include_research_products, filters
     )
 
-    return db.execute(query).fetchall()
+    return {
+        entity_type: reciprocal_rank_fusion(
+            [vector_results[entity_type], lexical_results[entity_type]], clamp_k(k)
+        )
+        for entity_type in ("theses", "research_products")
+    }
+
+
+_ADVISOR_SEARCH_QUERY = text(
+    f"""
+    SELECT
+        p.id,
+        p.name,
+        p.email,
+        p.laboratory_id,
+        l.name as laboratory_name,
+        ranked.research_product_count,
+        ranked.thesis_count,
+        {similarity_sql("ranked.distance")} as similarity_score
+    FROM (
+        SELECT
+            pe.professor_id,
+            pe.research_product_count,
+            pe.thesis_count,
+            pe.embedding {distance_operator()} CAST(:query_vector AS vector) as distance
+        FROM professor_embeddings pe
+        JOIN professors fp ON fp.id = pe.professor_id
+        WHERE CAST(:laboratory_id AS integer) IS NULL
+           OR fp.laboratory_id = :laboratory_id
+        ORDER BY distance, pe.professor_id
+        LIMIT :k
+    ) ranked
+    JOIN professors p ON p.id = ranked.professor_id
+    JOIN laboratories l ON l.id = p.laboratory_id
+    ORDER BY ranked.distance, p.id
+"""
+)
+
+
+def search_advisors_by_embedding(
+    db: Session,
+    embedding: list[float],
+    k: int = 10,
+    laboratory_id: int | None = None,
+    ef_search: int | None = None,
+    probes: int | None = None,
+) -> list:
+    """
+    Ordena a los profesores por similitud entre su embedding centroide y la consulta
+
+    Recorre solo professor_embeddings (una fila por profesor) en lugar de
+    agregar sus productos y tesis en cada petición. El filtro por laboratorio
+    se evalúa sobre los candidatos del índice, así que activa el recorrido
+    iterativo para no devolver menos de k profesores.
+    """
+    apply_search_params(db, ef_search, probes, iterative_scan=laboratory_id is not None)
+
+    params = {
+        "query_vector": vector_param(prepare_query_vector(embedding)),
+        "laboratory_id": laboratory_id,
+        "k": clamp_k(k),
+    }
+    return db.execute(_ADVISOR_SEARCH_QUERY, params).fetchall()
 
 
 def get_thesis_by_id_with_embedding(db: Session, thesis_id: int):
@@ -143,6 +1135,140 @@ def get_research_product_by_id_with_embedding(db: Session, product_id: int):
     )
 
 
+def _find_similar_in_memory(
+    db: Session,
+    references: list[tuple[str, int]],
+    k: int,
+    include_theses: bool,
+    include_products: bool,
+) -> list[dict]:
+    """Equivalente en memoria de _reference_search_query"""
+    results = [{"theses": [], "research_products": []} for _ in references]
+
+    vectors = [
+        vector_store.reference_vector(
+            db, "theses" if item_type == "thesis" else "research_products", item_id
+        )
+        for item_type, item_id in references
+    ]
+    searchable = [i for i, vector in enumerate(vectors) if vector is not None]
+    if not searchable:
+        return results
+
+    for entity_type, item_type, included in (
+        ("theses", "thesis", include_theses),
+        ("research_products", "research_product", include_products),
+    ):
+        if not included:
+            continue
+        exclude_ids = [
+            references[i][1] if references[i][0] == item_type else None
+            for i in searchable
+        ]
+        batch = vector_store.search_batch(
+            db,
+            entity_type,
+            [vectors[i] for i in searchable],
+            k,
+            exclude_ids=exclude_ids,
+        )
+        for i, rows in zip(searchable, batch):
+            results[i][entity_type] = rows
+
+    return results
+
+
+def _find_similar_live(
+    db: Session,
+    references: list[tuple[str, int]],
+    k: int,
+    include_theses: bool,
+    include_products: bool,
+) -> list[dict]:
+    """Búsqueda vectorial en vivo para una lista de referencias"""
+    if VECTOR_SEARCH_BACKEND == "memory":
+        return _find_similar_in_memory(
+            db, references, k, include_theses, include_products
+        )
+
+    params = {
+        "thesis_ids": [
+            item_id if item_type == "thesis" else None
+            for item_type, item_id in references
+        ],
+        "research_product_ids": [
+            item_id if item_type == "research_product" else None
+            for item_type, item_id in references
+        ],
+        "k": k,
+    }
+    rows_by_reference = [[] for _ in references]
+    query = _reference_search_query(include_theses, include_products)
+    for row in db.execute(query, params).fetchall():
+        rows_by_reference[row[0]].append(row[1:])
+    return [split_combined_results(rows) for rows in rows_by_reference]
+
+
+def find_similar_items_by_ids(
+    db: Session,
+    thesis_ids: list[int] | None = None,
+    research_product_ids: list[int] | None = None,
+    k: int = 10,
+    search_type: str = "both",
+) -> list[dict]:
+    """
+    Encuentra elementos similares para varias tesis y/o productos de investigación
+
+    Primero se consulta la tabla de vecinos precalculados (similar_items); las
+    referencias que no estén ahí se resuelven con búsqueda en vivo, leyendo el
+    embedding de referencia dentro de la propia consulta y excluyéndola en SQL.
+    """
+    references = [("thesis", item_id) for item_id in thesis_ids or []] + [
+        ("research_product", item_id) for item_id in research_product_ids or []
+    ]
+    k = clamp_k(k)
+    target_types = [
+        entity_type
+        for entity_type in ("theses", "research_products")
+        if search_type in [entity_type, "both"]
+    ]
+
+    grouped = [None] * len(references)
+    if not references or not target_types:
+        grouped = [{"theses": [], "research_products": []} for _ in references]
+    elif KNN_TABLE_ENABLED:
+        precomputed = lookup_similar_items(
+            db,
+            [(_ENTITY_TYPES[item_type], item_id) for item_type, item_id in references],
+            target_types,
+            k,
+        )
+        for i, (item_type, item_id) in enumerate(references):
+            rows = precomputed.get((_ENTITY_TYPES[item_type], item_id), {})
+            # Solo se sirve desde la tabla si tiene k vecinos de cada tipo pedido
+            if all(len(rows.get(entity_type, [])) >= k for entity_type in target_types):
+                grouped[i] = split_combined_results(
+                    [row for entity_type in target_types for row in rows[entity_type]]
+                )
+
+    missing = [i for i, result in enumerate(grouped) if result is None]
+    if missing:
+        live = _find_similar_live(
+            db,
+            [references[i] for i in missing],
+            k,
+            "theses" in target_types,
+            "research_products" in target_types,
+        )
+        for i, result in zip(missing, live):
+            grouped[i] = result
+
+    return [
+        {"type": item_type, "id": item_id, **result}
+        for (item_type, item_id), result in zip(references, grouped)
+    ]
+
+
 def find_similar_items_by_id(
     db: Session,
     thesis_id: int | None = None,
@@ -153,64 +1279,241 @@ def find_similar_items_by_id(
     """
     Encuentra elementos similares basándose en el ID de una tesis o producto de investigación
     """
-    results = {"theses": [], "research_products": []}
-
-    # Obtener el embedding del elemento de referencia
-    reference_embedding = None
-
     if thesis_id:
-        thesis = get_thesis_by_id_with_embedding(db, thesis_id)
-        if thesis and thesis.embedding:
-            reference_embedding = thesis.embedding
+        result = find_similar_items_by_ids(db, [thesis_id], None, k, search_type)
     elif research_product_id:
-        product = get_research_product_by_id_with_embedding(db, research_product_id)
-        if product and product.embedding:
-            reference_embedding = product.embedding
+        result = find_similar_items_by_ids(
+            db, None, [research_product_id], k, search_type
+        )
+    else:
+        return {"theses": [], "research_products": []}
 
-    if not reference_embedding:
-        return results
+    return {
+        "theses": result[0]["theses"],
+        "research_products": result[0]["research_products"],
+    }
 
-    # Buscar elementos similares
-    if search_type in ["theses", "both"]:
-        similar_theses = search_similar_theses_by_embedding(db, reference_embedding, k)
-        # Filtrar el elemento de referencia si es una tesis
-        if thesis_id:
-            similar_theses = [t for t in similar_theses if t[0] != thesis_id]
-        results["theses"] = similar_theses
-
-    if search_type in ["research_products", "both"]:
-        similar_products = search_similar_research_products_by_embedding(
-            db, reference_embedding, k
-        )
-        # Filtrar el elemento de referencia si es un producto de investigación
-        if research_product_id:
-            similar_products = [
-                p for p in similar_products if p[0] != research_product_id
-            ]
-        results["research_products"] = similar_products
 
-    return results
+# Campos de presentación de los elementos agrupados (alias SQL = clave)
+_CLUSTER_SOURCES = {
+    "theses": (
+        [
+            "t.id",
+            "t.title",
+            "s.name AS student_name",
+            "p1.name AS advisor1_name",
+            "p2.name AS advisor2_name",
+        ],
+        """
+        FROM theses t {sample}
+        LEFT JOIN students s ON s.id = t.student_id
+        LEFT JOIN professors p1 ON p1.id = t.advisor1_id
+        LEFT JOIN professors p2 ON p2.id = t.advisor2_id
+        WHERE t.embedding IS NOT NULL {where}
+        """,
+        "t",
+    ),
+    "research_products": (
+        [
+            "rp.id",
+            "rp.title",
+            "rp.site",
+            "rp.year",
+            "p.name AS professor_name",
+            "l.name AS laboratory_name",
+        ],
+        """
+        FROM research_products rp {sample}
+        LEFT JOIN professors p ON p.id = rp.professor_id
+        LEFT JOIN laboratories l ON l.id = p.laboratory_id
+        WHERE rp.embedding IS NOT NULL {where}
+        """,
+        "rp",
+    ),
+}
+
+
+def _field_keys(fields: list[str]) -> list[str]:
+    """Clave de cada campo en los dicts de elementos (alias o nombre de columna)"""
+    return [field.split(" AS ")[-1].split(".")[-1] for field in fields]
+
+
+def _column_items(keys: list[str], columns: list[np.ndarray]) -> list[dict]:
+    """Convierte columnas cargadas en dicts de presentación, uno por elemento"""
+    ids = columns[0].tolist()
+    return [dict(zip(keys, values)) for values in zip(ids, *columns[1:])]
+
+
+def _cluster_source(
+    entity_type: str,
+    min_year: int | None = None,
+    max_year: int | None = None,
+    sample_percent: float | None = None,
+) -> tuple[list[str], str, str, dict]:
+    """
+    Campos, cláusula FROM ... WHERE ..., alias y parámetros de un clustering
+
+    Con sample_percent la tabla principal se muestrea con TABLESAMPLE
+    BERNOULLI (semilla fija, así que la muestra es reproducible).
+    """
+    fields, from_sql, alias = _CLUSTER_SOURCES[entity_type]
+    conditions = []
+    params = {}
+    if entity_type == "research_products":
+        if min_year:
+            conditions.append("AND rp.year >= :min_year")
+            params["min_year"] = min_year
+        if max_year:
+            conditions.append("AND rp.year <= :max_year")
+            params["max_year"] = max_year
+
+    sample = ""
+    if sample_percent is not None:
+        sample = "TABLESAMPLE BERNOULLI (:sample_percent) REPEATABLE (42)"
+        params["sample_percent"] = sample_percent
+
+    from_sql = from_sql.format(sample=sample, where=" ".join(conditions))
+    return fields, from_sql, alias, params
+
+
+def load_cluster_items(
+    db: Session,
+    entity_type: str,
+    min_year: int | None = None,
+    max_year: int | None = None,
+) -> tuple[list[dict], np.ndarray]:
+    """
+    Carga los elementos embebidos de una entidad con su matriz float32
 
+    Los nombres relacionados se resuelven con JOIN en la misma consulta y los
+    vectores se leen en binario (ver columnar.load_columnar).
+    """
+    fields, from_sql, alias, params = _cluster_source(entity_type, min_year, max_year)
+    columns, matrix = load_columnar(
+        db,
+        fields,
+        from_sql,
+        f"{alias}.id",
+        params,
+        vector_sql=f"{alias}.embedding",
+        dimension=EMBEDDING_DIMENSION,
+    )
+    return _column_items(_field_keys(fields), columns), matrix
 
-def get_all_theses_with_embeddings(db: Session):
-    """Obtiene todas las tesis que tienen embeddings para análisis de clusters"""
-    return db.query(models.Thesis).filter(models.Thesis.embedding.is_not(None)).all()
 
+def _fit_sampled_centers(
+    db: Session,
+    entity_type: str,
+    n_clusters: int,
+    min_year: int | None,
+    max_year: int | None,
+    total: int,
+    limit: int,
+) -> tuple[np.ndarray, int]:
+    """
+    Ajusta MiniBatchKMeans sobre una muestra TABLESAMPLE de a lo más limit filas
 
-def get_all_research_products_with_embeddings(
-    db: Session, min_year: int | None = None, max_year: int | None = None
-):
-    """Obtiene todos los productos de investigación que tienen embeddings para análisis de clusters"""
-    query = db.query(models.ResearchProduct).filter(
-        models.ResearchProduct.embedding.is_not(None)
+    La muestra se lee completa, sin LIMIT: cortarla en SQL por id la
+    sesgaría hacia los ids bajos. El excedente de BERNOULLI sobre limit se
+    descarta al azar (trim_sample). Devuelve (centros, tamaño de la muestra).
+    """
+    _, from_sql, alias, params = _cluster_source(
+        entity_type, min_year, max_year, sample_percent=sample_percent(limit, total)
+    )
+    _, sample = load_columnar(
+        db,
+        [f"{alias}.id"],
+        from_sql,
+        f"{alias}.id",
+        params,
+        vector_sql=f"{alias}.embedding",
+        dimension=EMBEDDING_DIMENSION,
     )
+    sample = trim_sample(sample, limit)
+    if len(sample) < n_clusters:
+        raise ValueError(
+            f"La muestra ({len(sample)} elementos) no alcanza para crear "
+            f"{n_clusters} clusters; aumente max_items"
+        )
+    return fit_minibatch_centers(sample, n_clusters), len(sample)
+
+
+def iter_cluster_analysis(
+    db: Session,
+    entity_type: str,
+    n_clusters: int = 5,
+    min_year: int | None = None,
+    max_year: int | None = None,
+    max_items: int | None = None,
+    memory_budget_mb: float | None = None,
+):
+    """
+    Clustering por partes: primero un encabezado y luego lotes asignados
 
-    if min_year:
-        query = query.filter(models.ResearchProduct.year >= min_year)
-    if max_year:
-        query = query.filter(models.ResearchProduct.year <= max_year)
+    El primer elemento generado es un dict con entity_type, total_items
+    (conteo previo), centers y sampling; los siguientes son pares (items,
+    etiquetas). Hasta el límite de elementos (max_items y memory_budget_mb)
+    se ajusta KMeans sobre todos y hay un solo lote; por encima se ajusta
+    MiniBatchKMeans sobre una muestra y cada lote leído de la tabla se asigna
+    al centro más cercano y se entrega sin acumular los anteriores.
 
-    return query.all()
+    Los errores de validación se lanzan al pedir el encabezado.
+    """
+    if entity_type not in ("theses", "research_products"):
+        raise ValueError("entity_type debe ser 'theses' o 'research_products'")
+
+    limit = cluster_sample_limit(max_items, memory_budget_mb, EMBEDDING_DIMENSION)
+    if limit < n_clusters:
+        raise ValueError(
+            f"El límite de elementos ({limit}) es menor que el número de clusters"
+        )
+
+    fields, from_sql, alias, params = _cluster_source(entity_type, min_year, max_year)
+    total = count_rows(db, from_sql, params)
+    if total < n_clusters:
+        raise ValueError(
+            f"No hay suficientes elementos ({total}) para crear {n_clusters} clusters"
+        )
+
+    header = {"entity_type": entity_type, "total_items": total}
+    if total <= limit:
+        items, embeddings = load_cluster_items(db, entity_type, min_year, max_year)
+        labels, centers = cluster_embeddings(embeddings, n_clusters)
+        del embeddings
+        sampling = {"mode": "full", "algorithm": "kmeans", "sample_size": len(items)}
+        header["total_items"] = len(items)
+    else:
+        centers, sample_size = _fit_sampled_centers(
+            db, entity_type, n_clusters, min_year, max_year, total, limit
+        )
+        sampling = {
+            "mode": "sample",
+            "algorithm": "minibatch_kmeans",
+            "method": "tablesample_bernoulli",
+            "sample_size": sample_size,
+        }
+    sampling["max_items"] = limit
+    sampling["sample_fraction"] = (
+        sampling["sample_size"] / header["total_items"] if header["total_items"] else 0
+    )
+    yield {**header, "centers": centers, "sampling": sampling}
+
+    if total <= limit:
+        yield items, labels
+        return
+
+    keys = _field_keys(fields)
+    for columns, vectors in iter_columnar(
+        db,
+        fields,
+        from_sql,
+        f"{alias}.id",
+        params,
+        vector_sql=f"{alias}.embedding",
+        dimension=EMBEDDING_DIMENSION,
+        batch_size=min(COLUMNAR_BATCH_SIZE, limit),
+    ):
+        yield _column_items(keys, columns), assign_clusters(vectors, centers)
 
 
 def perform_cluster_analysis(
@@ -219,68 +1522,160 @@ def perform_cluster_analysis(
     n_clusters: int = 5,
     min_year: int | None = None,
     max_year: int | None = None,
+    max_items: int | None = None,
+    memory_budget_mb: float | None = None,
 ) -> dict:
     """
     Realiza análisis de clustering en tesis o productos de investigación
+
+    Reúne los lotes de iter_cluster_analysis y agrupa los elementos por
+    cluster. El campo "sampling" del resultado indica si se ajustó KMeans
+    sobre todos o MiniBatchKMeans sobre una muestra.
+
+    El resultado se cachea por (entidad, clusters, rango de años, límite,
+    versión de los embeddings); el diccionario devuelto es compartido y no
+    debe mutarse.
     """
-    if entity_type == "theses":
-        items = get_all_theses_with_embeddings(db)
-        get_item_info = lambda item: {
-            "id": item.id,
-            "title": item.title,
-            "student_name": item.student.name if item.student else None,
-            "advisor1_name": item.advisor1.name if item.advisor1 else None,
-            "advisor2_name": item.advisor2.name if item.advisor2 else None,
-        }
-    elif entity_type == "research_products":
-        items = get_all_research_products_with_embeddings(db, min_year, max_year)
-        get_item_info = lambda item: {
-            "id": item.id,
-            "title": item.title,
-            "site": item.site,
-            "year": item.year,
-            "professor_name": item.professor.name if item.professor else None,
-            "laboratory_name": (
-                item.professor.laboratory.name
-                if item.professor and item.professor.laboratory
-                else None
-            ),
-        }
-    else:
-        raise ValueError("entity_type debe ser 'theses' o 'research_products'")
+    limit = cluster_sample_limit(max_items, memory_budget_mb, EMBEDDING_DIMENSION)
+    cache_key = (
+        "cluster",
+        entity_type,
+        n_clusters,
+        min_year,
+        max_year,
+        limit,
+        get_embedding_version(db, entity_type),
+    )
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    parts = iter_cluster_analysis(
+        db, entity_type, n_clusters, min_year, max_year, max_items, memory_budget_mb
+    )
+    header = next(parts)
+    items = []
+    labels = []
+    for batch_items, batch_labels in parts:
+        items.extend(batch_items)
+        labels.append(batch_labels)
+
+    sampling = header["sampling"]
+    sampling["sample_fraction"] = sampling["sample_size"] / len(items) if items else 0
+
+    # Organizar resultados por cluster
+    clusters = group_clusters(np.concatenate(labels), header["centers"], items)
+
+    result = {
+        "entity_type": entity_type,
+        "clusters": clusters,
+        "total_items": len(items),
+        "sampling": sampling,
+    }
+    analysis_cache.set(cache_key, result)
+    return result
+
+
+def get_topic_overview(db: Session, entity_type: str) -> dict | None:
+    """
+    Modelo de temas activo de una entidad con el tamaño de cada tema
+
+    Devuelve None si aún no se ha ajustado ningún modelo.
+    """
+    topic_model = get_topic_model(db, entity_type)
+    if topic_model is None:
+        return None
+
+    sizes = dict(
+        db.execute(
+            text(
+                f"SELECT cluster_id, COUNT(*) FROM {entity_type} "
+                "WHERE cluster_id IS NOT NULL GROUP BY cluster_id"
+            )
+        ).fetchall()
+    )
+    return {
+        "entity_type": entity_type,
+        "version": topic_model.version,
+        "n_clusters": topic_model.n_clusters,
+        "algorithm": topic_model.algorithm,
+        "sample_size": topic_model.sample_size,
+        "total_items": topic_model.total_items,
+        "created_at": topic_model.created_at,
+        "clusters": [
+            {"cluster_id": cluster_id, "size": sizes.get(cluster_id, 0)}
+            for cluster_id in range(topic_model.n_clusters)
+        ],
+    }
 
-    if len(items) < n_clusters:
+
+def get_topic_items(
+    db: Session, entity_type: str, cluster_id: int, limit: int = 50, offset: int = 0
+) -> dict | None:
+    """Elementos de un tema del modelo activo (consulta por el índice de cluster_id)"""
+    topic_model = get_topic_model(db, entity_type)
+    if topic_model is None:
+        return None
+    if not 0 <= cluster_id < topic_model.n_clusters:
         raise ValueError(
-            f"No hay suficientes elementos ({len(items)}) para crear {n_clusters} clusters"
+            f"cluster_id debe estar entre 0 y {topic_model.n_clusters - 1}"
         )
 
-    # Extraer embeddings
-    embeddings = [item.embedding for item in items]
-    embeddings_array = np.array(embeddings)
+    fields, from_sql, alias = _CLUSTER_SOURCES[entity_type]
+    from_sql = from_sql.format(sample="", where=f"AND {alias}.cluster_id = :cluster_id")
+    params = {"cluster_id": cluster_id, "limit": limit, "offset": offset}
+    rows = db.execute(
+        text(
+            f"SELECT {', '.join(fields)} {from_sql} "
+            f"ORDER BY {alias}.id LIMIT :limit OFFSET :offset"
+        ),
+        params,
+    ).fetchall()
 
-    # Realizar clustering
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    cluster_labels = kmeans.fit_predict(embeddings_array)
+    return {
+        "entity_type": entity_type,
+        "cluster_id": cluster_id,
+        "version": topic_model.version,
+        "total": count_rows(db, from_sql, params),
+        "items": [dict(zip(_field_keys(fields), row)) for row in rows],
+    }
 
-    # Organizar resultados por cluster
-    clusters = []
-    for cluster_id in range(n_clusters):
-        cluster_items = [
-            get_item_info(items[i])
-            for i in range(len(items))
-            if cluster_labels[i] == cluster_id
-        ]
 
-        clusters.append(
-            {
-                "cluster_id": cluster_id,
-                "items": cluster_items,
-                "cluster_center": kmeans.cluster_centers_[cluster_id].tolist(),
-                "cluster_size": len(cluster_items),
-            }
-        )
+def _load_research_products_by_year(db: Session, years: list[int]) -> dict:
+    """
+    Carga en una sola consulta los productos con embedding de los años dados
+
+    Devuelve, por año, la información de presentación de cada producto y su
+    matriz de embeddings float32.
+    """
+    fields, from_sql, _ = _CLUSTER_SOURCES["research_products"]
+    columns, matrix = load_columnar(
+        db,
+        fields,
+        from_sql.format(sample="", where="AND rp.year = ANY(:years)"),
+        "rp.year, rp.id",
+        {"years": list(years)},
+        vector_sql="rp.embedding",
+        dimension=EMBEDDING_DIMENSION,
+    )
+    items = _column_items(_field_keys(fields), columns)
+
+    # Las filas vienen ordenadas por año: cada año es un bloque contiguo
+    year_values = np.array([item["year"] for item in items], dtype=np.int64)
+    unique_years, starts = np.unique(year_values, return_index=True)
+    ends = list(starts[1:]) + [len(items)]
 
-    return {"entity_type": entity_type, "clusters": clusters, "total_items": len(items)}
+    return {
+        int(year): (items[start:end], matrix[start:end])
+        for year, start, end in zip(unique_years, starts, ends)
+    }
+
+
+def get_latest_research_year(db: Session) -> int | None:
+    """Año más reciente con productos de investigación embebidos"""
+    return db.execute(
+        text("SELECT MAX(year) FROM research_products WHERE embedding IS NOT NULL")
+    ).scalar()
 
 
 def get_trending_research_topics(
@@ -288,37 +1683,125 @@ def get_trending_research_topics(
 ) -> dict:
     """
     Analiza tendencias en temas de investigación por año
+
+    Todos los años se leen en una sola consulta y cada año se agrupa en un
+    proceso del pool de análisis.
     """
     if not years:
-        # Por defecto, últimos 5 años
-        current_year = 2024  # Puedes ajustar esto dinámicamente
+        # Por defecto, los últimos 5 años con datos
+        current_year = get_latest_research_year(db)
+        if current_year is None:
+            return {}
         years = list(range(current_year - 4, current_year + 1))
 
-    trends = {}
+    cache_key = (
+        "trends",
+        tuple(years),
+        top_k,
+        get_embedding_version(db, "research_products"),
+    )
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
+    partitions = _load_research_products_by_year(db, years)
+
+    futures = {}
+    for year, (items, embeddings) in partitions.items():
+        if len(items) >= 3:  # Mínimo para clustering
+            n_clusters = min(5, len(items) // 2)  # Ajustar número de clusters
+            futures[year] = submit_analysis(cluster_embeddings, embeddings, n_clusters)
+
+    trends = {}
     for year in years:
-        products = get_all_research_products_with_embeddings(
-            db, min_year=year, max_year=year
-        )
+        items = partitions[year][0] if year in partitions else []
+        trends[year] = {"total_products": len(items), "clusters": []}
+        if year not in futures:
+            continue
+        try:
+            cluster_labels, cluster_centers = futures[year].result()
+            clusters = group_clusters(cluster_labels, cluster_centers, items)
+            trends[year]["clusters"] = clusters[:top_k]  # Top clusters
+        except Exception as e:
+            print(f"Error clustering for year {year}: {e}")
+
+    analysis_cache.set(cache_key, trends)
+    return trends
 
-        if len(products) >= 3:  # Mínimo para clustering
-            try:
-                n_clusters = min(5, len(products) // 2)  # Ajustar número de clusters
-                cluster_result = perform_cluster_analysis(
-                    db, "research_products", n_clusters, year, year
-                )
 
-                trends[year] = {
-                    "total_products": len(products),
-                    "clusters": cluster_result["clusters"][:top_k],  # Top clusters
-                }
-            except Exception as e:
-                print(f"Error clustering for year {year}: {e}")
-                trends[year] = {"total_products": len(products), "clusters": []}
-        else:
-            trends[year] = {"total_products": len(products), "clusters": []}
+def summarize_trends(trends: dict) -> dict:
+    """Respuesta de /trends: tendencias por año y totales"""
+    return {
+        "years_analyzed": list(trends.keys()),
+        "trends": trends,
+        "summary": {
+            "total_years": len(trends),
+            "total_products": sum(trend["total_products"] for trend in trends.values()),
+        },
+    }
 
-    return trends
+
+def _load_professor_products(
+    db: Session,
+    professor_ids: list[int] | None = None,
+    laboratory_id: int | None = None,
+) -> tuple[list[np.ndarray], np.ndarray]:
+    """
+    Carga en una consulta los productos embebidos de varios profesores
+
+    Devuelve las columnas (professor_id, id, title, year) ordenadas por
+    profesor y la matriz de embeddings correspondiente, normalizada por filas.
+    """
+    from_sql = "FROM research_products rp"
+    conditions = ["rp.embedding IS NOT NULL"]
+    params = {}
+    if laboratory_id is not None:
+        from_sql += " JOIN professors p ON p.id = rp.professor_id"
+        conditions.append("p.laboratory_id = :laboratory_id")
+        params["laboratory_id"] = laboratory_id
+    if professor_ids is not None:
+        conditions.append("rp.professor_id = ANY(:professor_ids)")
+        params["professor_ids"] = list(professor_ids)
+
+    columns, matrix = load_columnar(
+        db,
+        ["rp.professor_id", "rp.id", "rp.title", "rp.year"],
+        f"{from_sql} WHERE {' AND '.join(conditions)}",
+        "rp.professor_id, rp.id",
+        params,
+        vector_sql="rp.embedding",
+        dimension=EMBEDDING_DIMENSION,
+    )
+    return columns, normalize_rows(matrix)
+
+
+def _professor_centroids(
+    professor_ids: np.ndarray, matrix: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Embedding promedio normalizado de cada profesor
+
+    professor_ids debe venir ordenado (una fila por producto). Devuelve los ids
+    únicos, el número de productos de cada uno y la matriz de centroides.
+    """
+    unique_ids, starts, counts = np.unique(
+        professor_ids, return_index=True, return_counts=True
+    )
+    sums = np.add.reduceat(matrix, starts, axis=0)
+    return unique_ids, counts, normalize_rows(sums / counts[:, None])
+
+
+def _top_pairs(
+    scores: np.ndarray, threshold: float, top: int
+) -> list[tuple[int, int, float]]:
+    """Las top parejas (fila, columna, score) con score mayor al umbral"""
+    rows, columns = np.nonzero(scores > threshold)
+    if not len(rows):
+        return []
+
+    pair_scores = scores[rows, columns]
+    best = top_k_indices(pair_scores, top)
+    return [(int(rows[i]), int(columns[i]), float(pair_scores[i])) for i in best]
 
 
 def get_professor_research_similarity(
@@ -327,70 +1810,157 @@ def get_professor_research_similarity(
     """
     Calcula la similitud entre la investigación de dos profesores
     """
-    # Obtener productos de investigación de ambos profesores
-    products1 = (
-        db.query(models.ResearchProduct)
-        .filter(
-            models.ResearchProduct.professor_id == professor1_id,
-            models.ResearchProduct.embedding.is_not(None),
-        )
-        .all()
-    )
-
-    products2 = (
-        db.query(models.ResearchProduct)
-        .filter(
-            models.ResearchProduct.professor_id == professor2_id,
-            models.ResearchProduct.embedding.is_not(None),
-        )
-        .all()
-    )
+    # Obtener productos de investigación de ambos profesores en una consulta
+    columns, matrix = _load_professor_products(db, [professor1_id, professor2_id])
+    owners = columns[0]
+    positions1 = np.flatnonzero(owners == professor1_id)
+    positions2 = np.flatnonzero(owners == professor2_id)
 
-    if not products1 or not products2:
+    if not len(positions1) or not len(positions2):
         return {
             "similarity_score": 0.0,
             "common_topics": [],
             "message": "Uno o ambos profesores no tienen productos con embeddings",
         }
 
-    # Calcular embedding promedio para cada profesor
-    embeddings1 = np.array([p.embedding for p in products1])
-    embeddings2 = np.array([p.embedding for p in products2])
+    embeddings1 = matrix[positions1]
+    embeddings2 = matrix[positions2]
 
-    avg_embedding1 = np.mean(embeddings1, axis=0)
-    avg_embedding2 = np.mean(embeddings2, axis=0)
+    # Similitud coseno entre los embeddings promedio de cada profesor
+    centroids = normalize_rows(
+        np.vstack([embeddings1.mean(axis=0), embeddings2.mean(axis=0)])
+    )
+    similarity = float(centroids[0] @ centroids[1])
 
-    # Calcular similitud coseno
-    dot_product = np.dot(avg_embedding1, avg_embedding2)
-    norm1 = np.linalg.norm(avg_embedding1)
-    norm2 = np.linalg.norm(avg_embedding2)
+    # Productos más similares entre ambos profesores: un solo producto
+    # matricial y selección de las 5 parejas sobre el umbral de alta similitud
+    scores = embeddings1 @ embeddings2.T
+    common_topics = []
+    for i, j, topic_similarity in _top_pairs(scores, 0.8, 5):
+        p1 = positions1[i]
+        p2 = positions2[j]
+        common_topics.append(
+            {
+                "product1": {
+                    "id": columns[1][p1],
+                    "title": columns[2][p1],
+                    "year": columns[3][p1],
+                },
+                "product2": {
+                    "id": columns[1][p2],
+                    "title": columns[2][p2],
+                    "year": columns[3][p2],
+                },
+                "similarity": topic_similarity,
+            }
+        )
 
-    similarity = dot_product / (norm1 * norm2)
+    return {
+        "similarity_score": similarity,
+        "common_topics": common_topics,
+        "total_products": {
+            "professor1": len(positions1),
+            "professor2": len(positions2),
+        },
+    }
 
-    # Encontrar productos más similares entre ambos profesores
-    common_topics = []
-    for p1 in products1:
-        for p2 in products2:
-            p1_emb = np.array(p1.embedding)
-            p2_emb = np.array(p2.embedding)
 
-            topic_similarity = np.dot(p1_emb, p2_emb) / (
-                np.linalg.norm(p1_emb) * np.linalg.norm(p2_emb)
-            )
+def get_professor_similarity_matrix(
+    db: Session, laboratory_id: int | None = None
+) -> dict:
+    """
+    Matriz de similitud entre todos los profesores (o los de un laboratorio)
 
-            if topic_similarity > 0.8:  # Umbral de alta similitud
-                common_topics.append(
-                    {
-                        "product1": {"id": p1.id, "title": p1.title, "year": p1.year},
-                        "product2": {"id": p2.id, "title": p2.title, "year": p2.year},
-                        "similarity": float(topic_similarity),
-                    }
-                )
+    Cada profesor se representa por el promedio normalizado de los embeddings
+    de sus productos; la matriz completa es un único producto C @ C.T.
+    """
+    cache_key = (
+        "professor_matrix",
+        laboratory_id,
+        get_embedding_version(db, "research_products"),
+    )
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-    return {
-        "similarity_score": float(similarity),
-        "common_topics": sorted(
-            common_topics, key=lambda x: x["similarity"], reverse=True
-        )[:5],
-        "total_products": {"professor1": len(products1), "professor2": len(products2)},
+    columns, matrix = _load_professor_products(db, laboratory_id=laboratory_id)
+    owners = columns[0]
+    if not len(owners):
+        return {"laboratory_id": laboratory_id, "professors": [], "matrix": []}
+
+    professor_ids, counts, centroids = _professor_centroids(owners, matrix)
+    similarity = centroids @ centroids.T
+
+    names = dict(
+        db.query(models.Professor.id, models.Professor.name)
+        .filter(models.Professor.id.in_(professor_ids.tolist()))
+        .all()
+    )
+
+    result = {
+        "laboratory_id": laboratory_id,
+        "professors": [
+            {
+                "id": int(professor_id),
+                "name": names.get(int(professor_id)),
+                "total_products": int(count),
+            }
+            for professor_id, count in zip(professor_ids, counts)
+        ],
+        "matrix": similarity.tolist(),
     }
+    analysis_cache.set(cache_key, result)
+    return result
+
+
+def get_embedding_projection(db: Session) -> dict:
+    """
+    Coordenadas 2-D de todas las tesis y productos para el mapa de temas
+
+    Ambas entidades se proyectan juntas (mismo espacio) con PCA aleatorizado
+    sobre la matriz float32 normalizada. Se cachea por la versión de los
+    embeddings de ambas entidades; el diccionario devuelto es compartido y no
+    debe mutarse.
+    """
+    versions = get_embedding_versions(db)
+    cache_key = ("projection", tuple(sorted(versions.items())))
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    ids = {}
+    matrices = []
+    for entity_type in ("theses", "research_products"):
+        columns, matrix = load_columnar(
+            db,
+            ["id"],
+            f"FROM {entity_type} WHERE embedding IS NOT NULL",
+            "id",
+            dimension=EMBEDDING_DIMENSION,
+        )
+        ids[entity_type] = columns[0]
+        matrices.append(matrix)
+
+    matrix = normalize_rows(np.concatenate(matrices))
+    del matrices
+    if len(matrix) >= 2:
+        pca = PCA(n_components=2, svd_solver="randomized", random_state=42)
+        coordinates = pca.fit_transform(matrix).astype(np.float32)
+        explained = pca.explained_variance_ratio_.tolist()
+    else:
+        coordinates = np.zeros((len(matrix), 2), dtype=np.float32)
+        explained = [0.0, 0.0]
+
+    result = {"versions": versions, "explained_variance_ratio": explained}
+    start = 0
+    for entity_type, entity_ids in ids.items():
+        end = start + len(entity_ids)
+        result[entity_type] = {
+            "ids": entity_ids,
+            "x": np.ascontiguousarray(coordinates[start:end, 0]),
+            "y": np.ascontiguousarray(coordinates[start:end, 1]),
+        }
+        start = end
+
+    analysis_cache.set(cache_key, result)
+    return result
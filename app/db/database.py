@@ -1,13 +1,35 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 
 # Usar localhost cuando no estamos en Docker, database cuando estamos en Docker
 host = os.getenv("DB_HOST", "localhost")
-SQL_ALCHEMY_DATABASE_URL = f"postgresql://user:password@{host}:5432/thesis_match_db"
 
-engine = create_engine(SQL_ALCHEMY_DATABASE_URL)
+# Driver de PostgreSQL: "psycopg2" (por defecto) o "psycopg" (psycopg 3).
+# Con psycopg 3 los vectores se envían como parámetros binarios y las consultas
+# repetidas se preparan en el servidor (prepare_threshold).
+DB_DRIVER = os.getenv("DB_DRIVER", "psycopg2")
+DB_PREPARE_THRESHOLD = int(os.getenv("DB_PREPARE_THRESHOLD", "1"))
+
+if DB_DRIVER == "psycopg":
+    SQL_ALCHEMY_DATABASE_URL = (
+        f"postgresql+psycopg://user:password@{host}:5432/thesis_match_db"
+    )
+    engine = create_engine(
+        SQL_ALCHEMY_DATABASE_URL,
+        connect_args={"prepare_threshold": DB_PREPARE_THRESHOLD},
+    )
+
+    @event.listens_for(engine, "connect")
+    def register_vector_types(dbapi_connection, connection_record):
+        from pgvector.psycopg import register_vector
+
+        register_vector(dbapi_connection)
+
+else:
+    SQL_ALCHEMY_DATABASE_URL = f"postgresql://user:password@{host}:5432/thesis_match_db"
+    engine = create_engine(SQL_ALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
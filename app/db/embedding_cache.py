@@ -0,0 +1,153 @@
+"""
+Caché de embeddings de consultas (LRU en memoria + TTL + nivel persistente opcional)
+
+Evita llamar a Dashscope para consultas repetidas ("machine learning",
+"redes neuronales", ...). La clave incluye modelo, dimensión, tipo de texto y
+la consulta normalizada, de modo que cambiar cualquiera de ellos no reutiliza
+vectores incompatibles.
+
+El nivel persistente es un archivo SQLite (EMBEDDING_CACHE_PATH) que sobrevive
+a reinicios de la API; si no se configura, la caché vive solo en memoria.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH") or None
+
+
+def normalize_query_text(query: str) -> str:
+    """Normaliza una consulta para la clave de caché (unicode, mayúsculas, espacios)"""
+    query = unicodedata.normalize("NFKC", query)
+    return " ".join(query.lower().split())
+
+
+class QueryEmbeddingCache:
+    """Caché LRU con TTL para embeddings de consultas"""
+
+    def __init__(
+        self,
+        max_size: int = EMBEDDING_CACHE_SIZE,
+        ttl: float = EMBEDDING_CACHE_TTL,
+        path: str | None = EMBEDDING_CACHE_PATH,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self._entries: OrderedDict[str, tuple[float, np.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS query_embeddings (
+                    key TEXT PRIMARY KEY,
+                    embedding BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def key(model: str, dimension: int, text_type: str, query: str) -> str:
+        return f"{model}|{dimension}|{text_type}|{normalize_query_text(query)}"
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, created_at: float, vector: np.ndarray) -> None:
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load_persistent(self, key: str) -> tuple[float, np.ndarray] | None:
+        row = self._conn.execute(
+            "SELECT embedding, created_at FROM query_embeddings WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if self._expired(row[1]):
+            self._conn.execute("DELETE FROM query_embeddings WHERE key = ?", (key,))
+            self._conn.commit()
+            return None
+        return row[1], np.frombuffer(row[0], dtype=np.float32)
+
+    def get(self, key: str) -> list[float] | None:
+        """Devuelve el embedding cacheado o None si no existe o expiró"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._entries[key]
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1].tolist()
+
+            if self._conn is not None:
+                entry = self._load_persistent(key)
+                if entry is not None:
+                    self._remember(key, *entry)
+                    self.hits += 1
+                    self.persistent_hits += 1
+                    return entry[1].tolist()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, embedding: list[float]) -> None:
+        """Guarda un embedding en memoria y, si está configurado, en disco"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, vector)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, embedding, created_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, vector.tobytes(), created_at),
+                )
+                self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM query_embeddings")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        """Contadores de aciertos/fallos para el health check"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "persistent": self._conn is not None,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+query_embedding_cache = QueryEmbeddingCache()
@@ -0,0 +1,64 @@
+"""
+Versión de los datos de embeddings por tipo de entidad
+"""
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+ENTITY_TYPES = ("theses", "research_products")
+
+# Misma definición que models.EmbeddingVersion, para bases creadas antes de
+# que existiera la tabla (create_all solo corre desde el scraper)
+_CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS embedding_versions (
+        entity_type varchar PRIMARY KEY,
+        version integer NOT NULL DEFAULT 0,
+        updated_at timestamp DEFAULT now()
+    )
+"""
+
+
+def ensure_embedding_versions_table(db: Session) -> None:
+    """Crea la tabla embedding_versions si aún no existe"""
+    db.execute(text(_CREATE_TABLE_SQL))
+    db.commit()
+
+
+def get_embedding_version(db: Session, entity_type: str) -> int:
+    """Obtiene la versión actual de los embeddings (0 si nunca se ha registrado)"""
+    version = db.execute(
+        text("SELECT version FROM embedding_versions WHERE entity_type = :entity_type"),
+        {"entity_type": entity_type},
+    ).scalar()
+    return version or 0
+
+
+def get_embedding_versions(db: Session) -> dict[str, int]:
+    """Obtiene la versión de cada tipo de entidad"""
+    rows = db.execute(
+        text("SELECT entity_type, version FROM embedding_versions")
+    ).fetchall()
+    versions = {entity_type: 0 for entity_type in ENTITY_TYPES}
+    versions.update({row[0]: row[1] for row in rows})
+    return versions
+
+
+def bump_embedding_version(db: Session, entity_type: str) -> int:
+    """Incrementa la versión tras escribir embeddings nuevos o modificados"""
+    if entity_type not in ENTITY_TYPES:
+        raise ValueError(f"entity_type no soportado: {entity_type}")
+
+    version = db.execute(
+        text(
+            """
+            INSERT INTO embedding_versions (entity_type, version, updated_at)
+            VALUES (:entity_type, 1, now())
+            ON CONFLICT (entity_type)
+            DO UPDATE SET version = embedding_versions.version + 1, updated_at = now()
+            RETURNING version
+        """
+        ),
+        {"entity_type": entity_type},
+    ).scalar()
+    db.commit()
+    return version
@@ -0,0 +1,220 @@
+"""
+Cola local de trabajos para análisis largos (clustering, tendencias, matriz
+de similitud de profesores)
+
+Los análisis se ejecutan en un pool de procesos dedicado, fuera del ciclo de
+la petición, con el número de hilos BLAS/OpenMP de cada proceso limitado para
+no competir por los núcleos de los workers de la API. La API solo encola el
+trabajo y devuelve su id; el estado y el resultado se consultan después.
+
+Los trabajos y sus resultados viven en memoria del proceso de la API. Un
+trabajo terminado se reutiliza si se vuelve a pedir el mismo análisis con los
+mismos parámetros y la misma versión de los embeddings.
+"""
+
+import multiprocessing
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Procesos del pool de trabajos
+JOB_MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", "2"))
+
+# Hilos BLAS/OpenMP por proceso de trabajo (por defecto, la mitad de los
+# núcleos repartida entre los procesos)
+JOB_BLAS_THREADS = int(
+    os.getenv(
+        "JOB_BLAS_THREADS", str(max(1, (os.cpu_count() or 1) // (2 * JOB_MAX_WORKERS)))
+    )
+)
+
+# Trabajos terminados que se conservan (los más antiguos se descartan)
+JOB_MAX_STORED = int(os.getenv("JOB_MAX_STORED", "100"))
+
+JOB_KINDS = ("cluster_analysis", "trends", "professor_similarity_matrix")
+
+
+def _init_job_worker(blas_threads: int) -> None:
+    """Inicializa un proceso de trabajo: límites de hilos y pool de análisis"""
+    for variable in (
+        "OMP_NUM_THREADS",
+        "OPENBLAS_NUM_THREADS",
+        "MKL_NUM_THREADS",
+        "BLIS_NUM_THREADS",
+    ):
+        os.environ[variable] = str(blas_threads)
+
+    # Las bibliotecas ya cargadas (NumPy al deserializar la tarea) no releen
+    # las variables de entorno
+    from threadpoolctl import threadpool_limits
+
+    threadpool_limits(limits=blas_threads)
+
+    # Dentro de un trabajo los años de /trends se agrupan en secuencia en
+    # lugar de abrir otro pool de procesos
+    from .clustering import set_analysis_executor
+
+    set_analysis_executor(ThreadPoolExecutor(max_workers=1))
+
+
+def run_job(kind: str, params: dict) -> dict:
+    """Ejecuta un análisis en el proceso de trabajo con su propia sesión"""
+    from . import crud_recommendations
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if kind == "cluster_analysis":
+            return crud_recommendations.perform_cluster_analysis(db, **params)
+        if kind == "trends":
+            trends = crud_recommendations.get_trending_research_topics(db, **params)
+            return crud_recommendations.summarize_trends(trends)
+        if kind == "professor_similarity_matrix":
+            return crud_recommendations.get_professor_similarity_matrix(db, **params)
+        raise ValueError(f"Tipo de trabajo no soportado: {kind}")
+    finally:
+        db.close()
+
+
+def _job_key(kind: str, params: dict, data_version: tuple) -> tuple:
+    """Clave de reutilización: tipo, parámetros (hashables) y versión de datos"""
+    frozen = tuple(
+        sorted(
+            (name, tuple(value) if isinstance(value, list) else value)
+            for name, value in params.items()
+        )
+    )
+    return kind, frozen, data_version
+
+
+class Job:
+    """Un análisis encolado y su future"""
+
+    def __init__(self, kind: str, params: dict, key: tuple, future: Future):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.key = key
+        self.future = future
+        self.submitted_at = datetime.now(timezone.utc)
+        self.finished_at: datetime | None = None
+
+    @property
+    def status(self) -> str:
+        if self.future.cancelled():
+            return "cancelled"
+        if self.future.done():
+            return "failed" if self.future.exception() is not None else "done"
+        if self.future.running():
+            return "running"
+        return "queued"
+
+    def info(self) -> dict:
+        error = None
+        if self.status == "failed":
+            error = str(self.future.exception())
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+            "error": error,
+        }
+
+
+class JobQueue:
+    """Registro de trabajos sobre un pool de procesos creado en el primer uso"""
+
+    def __init__(
+        self,
+        max_workers: int = JOB_MAX_WORKERS,
+        blas_threads: int = JOB_BLAS_THREADS,
+        max_stored: int = JOB_MAX_STORED,
+    ):
+        self.max_workers = max_workers
+        self.blas_threads = blas_threads
+        self.max_stored = max_stored
+        self._executor: ProcessPoolExecutor | None = None
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._by_key: dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # "spawn": los procesos no heredan conexiones ni el estado de OpenMP
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_job_worker,
+                initargs=(self.blas_threads,),
+            )
+        return self._executor
+
+    def _finished(self, job: Job) -> None:
+        job.finished_at = datetime.now(timezone.utc)
+
+    def _prune(self) -> None:
+        """Descarta los trabajos terminados más antiguos por encima del límite"""
+        finished = [job for job in self._jobs.values() if job.future.done()]
+        for job in finished[: max(0, len(finished) - self.max_stored)]:
+            del self._jobs[job.id]
+            if self._by_key.get(job.key) == job.id:
+                del self._by_key[job.key]
+
+    def submit(self, kind: str, params: dict, data_version: tuple) -> tuple[Job, bool]:
+        """
+        Encola un análisis, o reutiliza uno igual pendiente o terminado
+
+        Devuelve el trabajo y si se reutilizó. Los trabajos fallidos o
+        cancelados no se reutilizan.
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"kind debe ser uno de {', '.join(JOB_KINDS)}")
+
+        key = _job_key(kind, params, data_version)
+        with self._lock:
+            existing = self._jobs.get(self._by_key.get(key))
+            if existing is not None and existing.status not in ("failed", "cancelled"):
+                return existing, True
+
+            future = self._get_executor().submit(run_job, kind, params)
+            job = Job(kind, params, key, future)
+            self._jobs[job.id] = job
+            self._by_key[key] = job.id
+            self._prune()
+
+        future.add_done_callback(lambda _: self._finished(job))
+        return job, False
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> bool | None:
+        """Cancela un trabajo en cola (None si no existe, False si ya empezó)"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        return job.future.cancel()
+
+    def stats(self) -> dict:
+        counts = {}
+        for job in self.jobs():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "max_workers": self.max_workers,
+            "blas_threads": self.blas_threads,
+            "jobs": counts,
+        }
+
+
+job_queue = JobQueue()
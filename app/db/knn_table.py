@@ -0,0 +1,281 @@
+"""
+Tabla materializada de k vecinos más cercanos (similar_items)
+
+Los vecinos de una tesis o producto existente solo cambian cuando cambian los
+embeddings, así que /similar puede servirlos desde una tabla precalculada en
+lugar de ejecutar una búsqueda vectorial por petición.
+
+Uso desde línea de comandos:
+    python -m app.db.knn_table rebuild
+"""
+
+import argparse
+import os
+
+import numpy as np
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .embedding_versions import ENTITY_TYPES, get_embedding_version
+from .vector_store import EmbeddingMatrix, load_embedding_matrix
+
+# Vecinos almacenados por (elemento, tipo de destino)
+KNN_TABLE_K = int(os.getenv("KNN_TABLE_K", "20"))
+
+# Si está desactivada, /similar siempre usa búsqueda en vivo
+KNN_TABLE_ENABLED = os.getenv("KNN_TABLE_ENABLED", "true").lower() == "true"
+
+# Filas fuente por producto matricial (acota la memoria: chunk x n_destino)
+KNN_CHUNK_SIZE = 512
+
+_INSERT_BATCH_SIZE = 5000
+
+
+def ensure_knn_table(db: Session) -> None:
+    """Crea la tabla similar_items si aún no existe (bases anteriores a ella)"""
+    models.SimilarItem.__table__.create(db.connection(), checkfirst=True)
+    db.commit()
+
+
+def _load_matrices(db: Session) -> dict[str, EmbeddingMatrix]:
+    return {
+        entity_type: load_embedding_matrix(
+            db, entity_type, get_embedding_version(db, entity_type)
+        )
+        for entity_type in ENTITY_TYPES
+    }
+
+
+def _neighbour_rows(
+    source_type: str,
+    source: EmbeddingMatrix,
+    positions: np.ndarray,
+    target_type: str,
+    target: EmbeddingMatrix,
+    k: int,
+) -> list[dict]:
+    """Calcula los k vecinos en target de las filas indicadas de source"""
+    same_type = source_type == target_type
+    k = min(k, len(target) - (1 if same_type else 0))
+    if k <= 0 or not len(positions):
+        return []
+
+    rows = []
+    for start in range(0, len(positions), KNN_CHUNK_SIZE):
+        chunk = positions[start : start + KNN_CHUNK_SIZE]
+        scores = source.matrix[chunk] @ target.matrix.T
+        if same_type:
+            # Un elemento no es vecino de sí mismo
+            scores[np.arange(len(chunk)), chunk] = -np.inf
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        for i, position in enumerate(chunk):
+            source_id = int(source.ids[position])
+            for rank in range(k):
+                rows.append(
+                    {
+                        "source_type": source_type,
+                        "source_id": source_id,
+                        "target_type": target_type,
+                        "rank": rank + 1,
+                        "target_id": int(target.ids[top[i, rank]]),
+                        "score": float(top_scores[i, rank]),
+                    }
+                )
+    return rows
+
+
+def _insert_rows(db: Session, rows: list[dict]) -> None:
+    for start in range(0, len(rows), _INSERT_BATCH_SIZE):
+        db.execute(insert(models.SimilarItem), rows[start : start + _INSERT_BATCH_SIZE])
+
+
+def rebuild_knn_table(db: Session, k: int = KNN_TABLE_K) -> int:
+    """Recalcula la tabla completa (en una transacción; los lectores ven la anterior)"""
+    matrices = _load_matrices(db)
+
+    db.execute(text("DELETE FROM similar_items"))
+    total = 0
+    for source_type, source in matrices.items():
+        positions = np.arange(len(source))
+        for target_type, target in matrices.items():
+            rows = _neighbour_rows(
+                source_type, source, positions, target_type, target, k
+            )
+            _insert_rows(db, rows)
+            total += len(rows)
+    db.commit()
+    return total
+
+
+def update_knn_table(
+    db: Session, new_ids: dict[str, list[int]], k: int = KNN_TABLE_K
+) -> int:
+    """
+    Actualiza la tabla tras embeber elementos nuevos
+
+    Se recalculan las listas de los elementos nuevos y las de los existentes
+    en cuyo top-k entra alguno de ellos (o que aún tienen menos de k vecinos).
+    Si la tabla está vacía se construye completa.
+    """
+    if not any(new_ids.values()):
+        return 0
+
+    if db.execute(text("SELECT 1 FROM similar_items LIMIT 1")).first() is None:
+        return rebuild_knn_table(db, k)
+
+    matrices = _load_matrices(db)
+
+    # Umbral actual (peor score y número de vecinos) de cada lista existente
+    thresholds = {}
+    for source_type, source_id, target_type, min_score, count in db.execute(
+        text(
+            """
+            SELECT source_type, source_id, target_type, MIN(score), COUNT(*)
+            FROM similar_items
+            GROUP BY source_type, source_id, target_type
+        """
+        )
+    ):
+        thresholds[(source_type, source_id, target_type)] = (min_score, count)
+
+    affected = {entity_type: set() for entity_type in ENTITY_TYPES}
+    for target_type, ids in new_ids.items():
+        target = matrices[target_type]
+        new_positions = [
+            target.positions[item_id] for item_id in ids if item_id in target.positions
+        ]
+        if not new_positions:
+            continue
+        affected[target_type].update(new_positions)
+        new_vectors = target.matrix[new_positions]
+
+        for source_type, source in matrices.items():
+            if not len(source):
+                continue
+            best_new = (source.matrix @ new_vectors.T).max(axis=1)
+            for position, source_id in enumerate(source.ids):
+                entry = thresholds.get((source_type, int(source_id), target_type))
+                if entry is None or entry[1] < k or best_new[position] > entry[0]:
+                    affected[source_type].add(position)
+
+    total = 0
+    for source_type, positions in affected.items():
+        if not positions:
+            continue
+        source = matrices[source_type]
+        positions = np.array(sorted(positions))
+        db.execute(
+            text(
+                "DELETE FROM similar_items "
+                "WHERE source_type = :source_type AND source_id = ANY(:source_ids)"
+            ),
+            {
+                "source_type": source_type,
+                "source_ids": [int(source.ids[p]) for p in positions],
+            },
+        )
+        for target_type, target in matrices.items():
+            rows = _neighbour_rows(
+                source_type, source, positions, target_type, target, k
+            )
+            _insert_rows(db, rows)
+            total += len(rows)
+    db.commit()
+    return total
+
+
+_LOOKUP_QUERY = text(
+    """
+    SELECT
+        si.source_type,
+        si.source_id,
+        si.target_type as kind,
+        COALESCE(t.id, rp.id) as id,
+        COALESCE(t.title, rp.title) as title,
+        t.student_id,
+        s.name as student_name,
+        p1.name as advisor1_name,
+        p2.name as advisor2_name,
+        rp.site,
+        rp.year,
+        rp.professor_id,
+        p.name as professor_name,
+        l.name as laboratory_name,
+        si.score as similarity_score
+    FROM unnest(CAST(:source_types AS varchar[]), CAST(:source_ids AS integer[]))
+        AS refs(source_type, source_id)
+    JOIN similar_items si
+        ON si.source_type = refs.source_type AND si.source_id = refs.source_id
+    LEFT JOIN theses t ON si.target_type = 'theses' AND t.id = si.target_id
+    LEFT JOIN students s ON s.id = t.student_id
+    LEFT JOIN professors p1 ON p1.id = t.advisor1_id
+    LEFT JOIN professors p2 ON p2.id = t.advisor2_id
+    LEFT JOIN research_products rp
+        ON si.target_type = 'research_products' AND rp.id = si.target_id
+    LEFT JOIN professors p ON p.id = rp.professor_id
+    LEFT JOIN laboratories l ON l.id = p.laboratory_id
+    WHERE si.target_type = ANY(CAST(:target_types AS varchar[]))
+      AND si.rank <= :k
+      AND COALESCE(t.id, rp.id) IS NOT NULL
+    ORDER BY si.source_type, si.source_id, si.target_type, si.rank
+"""
+)
+
+
+def lookup_similar_items(
+    db: Session,
+    references: list[tuple[str, int]],
+    target_types: list[str],
+    k: int,
+) -> dict[tuple[str, int], dict[str, list]]:
+    """
+    Lee los vecinos precalculados de varias referencias (entity_type, id)
+
+    Devuelve, por referencia, las filas de cada tipo de destino con el mismo
+    esquema de columnas que las búsquedas combinadas (kind, id, ..., score).
+    Las referencias sin filas no aparecen en el resultado.
+    """
+    if not references or not target_types or k > KNN_TABLE_K:
+        return {}
+
+    rows = db.execute(
+        _LOOKUP_QUERY,
+        {
+            "source_types": [entity_type for entity_type, _ in references],
+            "source_ids": [item_id for _, item_id in references],
+            "target_types": target_types,
+            "k": k,
+        },
+    ).fetchall()
+
+    found = {}
+    for row in rows:
+        by_type = found.setdefault((row[0], row[1]), {})
+        by_type.setdefault(row[2], []).append(tuple(row[2:]))
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tabla de vecinos precalculados")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--k", type=int, default=KNN_TABLE_K)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        total = rebuild_knn_table(db, args.k)
+        print(f"Tabla similar_items reconstruida: {total} filas")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,15 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Table
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    LargeBinary,
+    String,
+    ForeignKey,
+    Table,
+    UniqueConstraint,
+    func,
+)
 from pgvector.sqlalchemy import Vector
 from sqlalchemy.orm import relationship
 
@@ -42,7 +53,9 @@ class BasePerson(Base):
 class Professor(BasePerson):
     __tablename__ = "professors"
 
-    laboratory_id = Column(Integer, ForeignKey("laboratories.id"), nullable=False)
+    laboratory_id = Column(
+        Integer, ForeignKey("laboratories.id"), nullable=False, index=True
+    )
 
     # Cada profesor pertenece a un laboratorio
     laboratory = relationship("Laboratory", back_populates="professors")
@@ -75,12 +88,18 @@ class ResearchProduct(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     title = Column(String, nullable=False)
     site = Column(String, nullable=False)
-    year = Column(Integer, nullable=False)
+    year = Column(Integer, nullable=False, index=True)
 
+    # Columnas cuantizadas opcionales (embedding_half, ...) generadas por
+    # PostgreSQL a partir de esta; ver python -m app.db.vector_index add-column.
+    # La columna cluster_id (tema del modelo persistido) la crea y llena
+    # python -m app.db.topic_model fit
     embedding = Column(Vector(1024), nullable=True)
 
     # Cada producto de investigación pertenece a un profesor
-    professor_id = Column(Integer, ForeignKey("professors.id"), nullable=False)
+    professor_id = Column(
+        Integer, ForeignKey("professors.id"), nullable=False, index=True
+    )
     professor = relationship("Professor", back_populates="research_products")
 
 
@@ -116,7 +135,7 @@ class AcademicProgram(Base):
     thesis_url = Column(String, nullable=True)
 
     # Cada registro de programa pertenece a un solo estudiante.
-    student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False, index=True)
 
     # Permite acceder al objeto Student desde un AcademicProgram (ej: my_program.student)
     student = relationship("Student", back_populates="academic_programs")
@@ -134,15 +153,21 @@ class Thesis(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=False)
     title = Column(String, nullable=False)
 
+    # Columnas cuantizadas opcionales (embedding_half, ...) generadas por
+    # PostgreSQL a partir de esta; ver python -m app.db.vector_index add-column.
+    # La columna cluster_id (tema del modelo persistido) la crea y llena
+    # python -m app.db.topic_model fit
     embedding = Column(Vector(1024), nullable=True)
 
     # Foreign key to student
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
 
     # Foreign keys to advisors (professors)
-    advisor1_id = Column(Integer, ForeignKey("professors.id"), nullable=False)
+    advisor1_id = Column(
+        Integer, ForeignKey("professors.id"), nullable=False, index=True
+    )
     advisor2_id = Column(
-        Integer, ForeignKey("professors.id"), nullable=True
+        Integer, ForeignKey("professors.id"), nullable=True, index=True
     )  # Optional second advisor
 
     # Relationships
@@ -155,3 +180,81 @@ class Thesis(Base):
         foreign_keys=[advisor2_id],
         back_populates="advised_theses_secondary",
     )
+
+
+class EmbeddingVersion(Base):
+    """
+    Versión de los embeddings por tipo de entidad ("theses", "research_products")
+
+    Se incrementa cada vez que se escriben vectores nuevos, para que las
+    cachés en memoria detecten cambios sin releer los embeddings.
+    """
+
+    __tablename__ = "embedding_versions"
+
+    entity_type = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class SimilarItem(Base):
+    """
+    Vecinos más cercanos precalculados para /similar
+
+    Se construye en bloque tras generar embeddings y se actualiza de forma
+    incremental (ver app/db/knn_table.py). La clave primaria permite resolver
+    los vecinos de un elemento con un solo acceso por índice.
+    """
+
+    __tablename__ = "similar_items"
+
+    source_type = Column(String, primary_key=True)  # "theses" o "research_products"
+    source_id = Column(Integer, primary_key=True)
+    target_type = Column(String, primary_key=True)
+    rank = Column(Integer, primary_key=True)  # 1 = más similar
+    target_id = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)
+
+
+class ProfessorEmbedding(Base):
+    """
+    Embedding centroide de cada profesor
+
+    Promedio normalizado de los embeddings de sus productos de investigación
+    y de las tesis que ha dirigido (ver app/db/professor_embeddings.py). Es la
+    tabla que consulta /recommend/advisors.
+    """
+
+    __tablename__ = "professor_embeddings"
+
+    professor_id = Column(Integer, ForeignKey("professors.id"), primary_key=True)
+    embedding = Column(Vector(1024), nullable=False)
+    research_product_count = Column(Integer, nullable=False, default=0)
+    thesis_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class TopicModel(Base):
+    """
+    Modelo de temas persistido por tipo de entidad
+
+    Guarda la matriz de centroides de cada ajuste (float32 little-endian,
+    n_clusters x dimension) con una versión creciente por entidad; la versión
+    más alta es la activa. La columna cluster_id de theses/research_products
+    se refiere siempre a ella (ver app/db/topic_model.py).
+    """
+
+    __tablename__ = "topic_models"
+    __table_args__ = (UniqueConstraint("entity_type", "version"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entity_type = Column(String, nullable=False, index=True)
+    version = Column(Integer, nullable=False)
+    n_clusters = Column(Integer, nullable=False)
+    dimension = Column(Integer, nullable=False)
+    centers = Column(LargeBinary, nullable=False)
+    algorithm = Column(String, nullable=False)  # "kmeans" o "minibatch_kmeans"
+    sample_size = Column(Integer, nullable=False)
+    total_items = Column(Integer, nullable=False)
+    embedding_version = Column(Integer, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
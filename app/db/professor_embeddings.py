@@ -0,0 +1,98 @@
+"""
+Embeddings centroide por profesor (professor_embeddings)
+
+Cada profesor se representa con el promedio normalizado de los embeddings de
+sus productos de investigación y de las tesis que dirigió (como director o
+codirector). El promedio se calcula en PostgreSQL con AVG(vector), así que
+refrescar la tabla no transfiere embeddings a Python.
+
+Uso desde línea de comandos:
+    python -m app.db.professor_embeddings refresh
+"""
+
+import argparse
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+_REFRESH_QUERY = text(
+    """
+    INSERT INTO professor_embeddings
+        (professor_id, embedding, research_product_count, thesis_count, updated_at)
+    SELECT
+        professor_id,
+        l2_normalize(AVG(embedding)),
+        COUNT(*) FILTER (WHERE kind = 'research_product'),
+        COUNT(*) FILTER (WHERE kind = 'thesis'),
+        now()
+    FROM (
+        SELECT professor_id, embedding, 'research_product' as kind
+        FROM research_products
+        WHERE embedding IS NOT NULL
+        UNION ALL
+        SELECT advisor1_id, embedding, 'thesis'
+        FROM theses
+        WHERE embedding IS NOT NULL
+        UNION ALL
+        SELECT advisor2_id, embedding, 'thesis'
+        FROM theses
+        WHERE embedding IS NOT NULL AND advisor2_id IS NOT NULL
+    ) professor_items
+    GROUP BY professor_id
+    ON CONFLICT (professor_id) DO UPDATE SET
+        embedding = EXCLUDED.embedding,
+        research_product_count = EXCLUDED.research_product_count,
+        thesis_count = EXCLUDED.thesis_count,
+        updated_at = EXCLUDED.updated_at
+"""
+)
+
+# Profesores que ya no tienen ningún elemento embebido
+_PRUNE_QUERY = text(
+    """
+    DELETE FROM professor_embeddings pe
+    WHERE NOT EXISTS (
+        SELECT 1 FROM research_products rp
+        WHERE rp.professor_id = pe.professor_id AND rp.embedding IS NOT NULL
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM theses t
+        WHERE (t.advisor1_id = pe.professor_id OR t.advisor2_id = pe.professor_id)
+          AND t.embedding IS NOT NULL
+    )
+"""
+)
+
+
+def ensure_professor_embeddings_table(db: Session) -> None:
+    """Crea la tabla professor_embeddings si aún no existe"""
+    models.ProfessorEmbedding.__table__.create(db.connection(), checkfirst=True)
+    db.commit()
+
+
+def refresh_professor_embeddings(db: Session) -> int:
+    """Recalcula los centroides de todos los profesores y devuelve cuántos hay"""
+    total = db.execute(_REFRESH_QUERY).rowcount
+    db.execute(_PRUNE_QUERY)
+    db.commit()
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Embeddings centroide por profesor")
+    parser.add_argument("command", choices=["refresh"])
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        total = refresh_professor_embeddings(db)
+        print(f"Embeddings de profesores actualizados: {total}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Caché de resultados de análisis (clustering, tendencias) por versión de datos
+
+Las claves incluyen la versión de los embeddings (embedding_versions), así que
+cuando el job de embeddings escribe vectores nuevos las entradas anteriores
+dejan de coincidir y se desalojan por LRU sin invalidación explícita.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "128"))
+
+
+class ResultCache:
+    """Caché LRU acotada para resultados costosos de recalcular"""
+
+    def __init__(self, max_size: int = RESULT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+analysis_cache = ResultCache()
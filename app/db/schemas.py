@@ -1,5 +1,7 @@
+from datetime import datetime
 from enum import Enum
-from pydantic import BaseModel
+from typing import Literal
+from pydantic import BaseModel, Field
 
 
 class Program(str, Enum):
@@ -175,11 +177,32 @@ class StudentWithThesis(BaseModel):
 
 
 # Esquemas para sistema de recomendaciones
+class SearchFilters(BaseModel):
+    # Las entidades sin el dato filtrado se excluyen de los resultados
+    min_year: int | None = None  # Solo productos de investigación (excluye tesis)
+    max_year: int | None = None  # Solo productos de investigación (excluye tesis)
+    laboratory_id: int | None = None  # Laboratorio del autor o de algún director
+    professor_id: int | None = None  # Autor del producto o director de la tesis
+    program: str | None = None  # Programa del estudiante (excluye productos)
+
+
 class RecommendationRequest(BaseModel):
     query: str
     k: int = 10
     include_theses: bool = True
     include_research_products: bool = True
+    # "vector", "hybrid" (vector + full-text con RRF) o "lexical" (sin embedding)
+    search_mode: Literal["vector", "hybrid", "lexical"] = "vector"
+    filters: SearchFilters | None = None
+    # next_cursor de la respuesta anterior, con la misma consulta y parámetros
+    cursor: str | None = None
+    # Parámetros de recall/latencia de los índices ANN (HNSW / IVFFlat)
+    ef_search: int | None = Field(default=None, ge=1)
+    probes: int | None = Field(default=None, ge=1)
+    # Columna recorrida por el índice y reordenamiento exacto (None = configuración)
+    quantization: Literal["none", "half", "binary"] | None = None
+    rerank: bool | None = None
+    candidate_multiplier: int | None = Field(default=None, ge=1)
 
 
 class ThesisRecommendation(BaseModel):
@@ -208,6 +231,34 @@ class RecommendationResponse(BaseModel):
     theses: list[ThesisRecommendation] = []
     research_products: list[ResearchProductRecommendation] = []
     total_results: int
+    # Cursor para pedir la página siguiente (None si no hay más resultados)
+    next_cursor: str | None = None
+
+
+# Ranking de profesores (posibles directores) para un tema
+class AdvisorRecommendationRequest(BaseModel):
+    query: str
+    k: int = 10
+    laboratory_id: int | None = None
+    ef_search: int | None = Field(default=None, ge=1)
+    probes: int | None = Field(default=None, ge=1)
+
+
+class AdvisorRecommendation(BaseModel):
+    id: int
+    name: str
+    email: str | None = None
+    laboratory_id: int
+    laboratory_name: str
+    research_product_count: int
+    thesis_count: int
+    similarity_score: float
+
+
+class AdvisorRecommendationResponse(BaseModel):
+    query: str
+    advisors: list[AdvisorRecommendation] = []
+    total_results: int
 
 
 class SimilaritySearchRequest(BaseModel):
@@ -217,21 +268,140 @@ class SimilaritySearchRequest(BaseModel):
     search_type: str = "both"  # "theses", "research_products", "both"
 
 
+# Versiones batch de /recommend y /similar
+class BatchRecommendationRequest(BaseModel):
+    queries: list[str]
+    k: int = 10
+    include_theses: bool = True
+    include_research_products: bool = True
+    filters: SearchFilters | None = None
+    ef_search: int | None = Field(default=None, ge=1)
+    probes: int | None = Field(default=None, ge=1)
+    quantization: Literal["none", "half", "binary"] | None = None
+    rerank: bool | None = None
+    candidate_multiplier: int | None = Field(default=None, ge=1)
+
+
+class BatchRecommendationResponse(BaseModel):
+    results: list[RecommendationResponse]
+    total_queries: int
+
+
+class BatchSimilaritySearchRequest(BaseModel):
+    thesis_ids: list[int] = []
+    research_product_ids: list[int] = []
+    k: int = 10
+    search_type: str = "both"  # "theses", "research_products", "both"
+
+
 class ClusterAnalysisRequest(BaseModel):
     entity_type: str  # "theses" or "research_products"
     n_clusters: int = 5
     min_year: int | None = None
     max_year: int | None = None
+    # Formato de los centros: lista de floats, float16 en base64 o sin centros
+    center_format: Literal["full", "float16", "none"] = "full"
+    # Solo los ids de los elementos de cada cluster, sin sus metadatos
+    ids_only: bool = False
+    # Respuesta NDJSON enviada a medida que se asigna: encabezado, centros, una
+    # línea por elemento y el tamaño de cada cluster
+    stream: bool = False
+    # Límite de elementos para el ajuste (y memoria de su matriz de embeddings);
+    # con más elementos se ajusta sobre una muestra y se asignan todos por lotes
+    max_items: int | None = Field(default=None, ge=1)
+    memory_budget_mb: float | None = Field(default=None, gt=0)
 
 
 class ClusterResult(BaseModel):
     cluster_id: int
-    items: list[dict]  # Contains either theses or research products
-    cluster_center: list[float]
+    items: list[dict] | list[int]  # Theses or research products, or only their ids
+    cluster_center: list[float] | None = None
+    cluster_center_float16: str | None = None  # base64, float16 little-endian
     cluster_size: int
 
 
+class ClusterSampling(BaseModel):
+    mode: str  # "full" o "sample"
+    algorithm: str  # "kmeans" o "minibatch_kmeans"
+    method: str | None = None  # "tablesample_bernoulli" en modo "sample"
+    sample_size: int
+    sample_fraction: float
+    max_items: int
+
+
 class ClusterAnalysisResponse(BaseModel):
     entity_type: str
     clusters: list[ClusterResult]
     total_items: int
+    sampling: ClusterSampling | None = None
+
+
+# Modelo de temas persistido (ids de cluster estables entre llamadas)
+class TopicSize(BaseModel):
+    cluster_id: int
+    size: int
+
+
+class TopicModelResponse(BaseModel):
+    entity_type: str
+    version: int
+    n_clusters: int
+    algorithm: str
+    sample_size: int
+    total_items: int
+    created_at: datetime | None = None
+    clusters: list[TopicSize]
+
+
+class TopicItemsResponse(BaseModel):
+    entity_type: str
+    cluster_id: int
+    version: int
+    total: int
+    items: list[dict]
+
+
+# Proyección 2-D para el mapa de temas
+class ProjectionPoints(BaseModel):
+    ids: list[int]
+    # coordinate_format "list": x e y en listas paralelas a ids
+    x: list[float] | None = None
+    y: list[float] | None = None
+    # coordinate_format "float32": pares (x, y) float32 little-endian en base64
+    xy: str | None = None
+
+
+class ProjectionResponse(BaseModel):
+    versions: dict[str, int]
+    explained_variance_ratio: list[float]
+    theses: ProjectionPoints | None = None
+    research_products: ProjectionPoints | None = None
+
+
+# Trabajos en segundo plano (ver app/db/jobs.py)
+class JobSubmitRequest(BaseModel):
+    kind: Literal["cluster_analysis", "trends", "professor_similarity_matrix"]
+    # Parámetros del análisis: los de ClusterAnalysisRequest, TrendsJobParams
+    # o ProfessorMatrixJobParams según kind
+    params: dict = {}
+
+
+class TrendsJobParams(BaseModel):
+    years: list[int] | None = None
+    top_k: int = 10
+
+
+class ProfessorMatrixJobParams(BaseModel):
+    laboratory_id: int | None = None
+
+
+class JobInfo(BaseModel):
+    job_id: str
+    kind: str
+    params: dict
+    status: str  # "queued", "running", "done", "failed" o "cancelled"
+    submitted_at: datetime
+    finished_at: datetime | None = None
+    error: str | None = None
+    # True si se devolvió un trabajo existente con el mismo análisis
+    reused: bool = False
@@ -0,0 +1,70 @@
+"""
+Cursores opacos para paginar los resultados de /recommend
+
+El cursor guarda, por tipo de entidad, el score y el id de la última fila
+entregada, y un hash de la consulta. La página siguiente reutiliza el vector
+de la consulta desde la caché de embeddings y continúa el ranking con una
+condición keyset (score < último, o mismo score e id mayor), sin repetir ni
+volver a devolver las páginas anteriores.
+"""
+
+import base64
+import hashlib
+import json
+
+from .embedding_cache import normalize_query_text
+
+CURSOR_VERSION = 1
+
+ENTITY_TYPES = ("theses", "research_products")
+
+
+def _query_hash(query: str) -> str:
+    return hashlib.sha1(normalize_query_text(query).encode("utf-8")).hexdigest()[:16]
+
+
+def encode_search_cursor(
+    query: str, k: int, results: dict, included: dict[str, bool]
+) -> str | None:
+    """
+    Cursor de la página siguiente (None si ya no quedan resultados)
+
+    Un tipo se da por agotado si no se pidió o si devolvió menos de k filas.
+    Las filas tienen el id al inicio y el score al final.
+    """
+    after = {}
+    for entity_type in ENTITY_TYPES:
+        rows = results.get(entity_type, [])
+        if included.get(entity_type) and rows and len(rows) >= k:
+            after[entity_type] = [float(rows[-1][-1]), int(rows[-1][0])]
+
+    if not after:
+        return None
+
+    payload = {"v": CURSOR_VERSION, "q": _query_hash(query), "after": after}
+    data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_search_cursor(cursor: str, query: str) -> dict[str, tuple[float, int]]:
+    """
+    Posición (score, id) de la última fila entregada de cada tipo no agotado
+
+    Lanza ValueError si el cursor está mal formado o es de otra consulta.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if payload["v"] != CURSOR_VERSION:
+            raise ValueError("versión de cursor no soportada")
+        after = {
+            entity_type: (float(position[0]), int(position[1]))
+            for entity_type, position in payload["after"].items()
+            if entity_type in ENTITY_TYPES
+        }
+    except (ValueError, KeyError, TypeError, IndexError) as e:
+        raise ValueError(f"Cursor inválido: {e}") from e
+
+    if payload["q"] != _query_hash(query):
+        raise ValueError("El cursor no corresponde a esta consulta")
+    return after
@@ -0,0 +1,110 @@
+"""
+Búsqueda léxica (full-text search de PostgreSQL) sobre los títulos
+
+Complementa la búsqueda vectorial en consultas con siglas, nombres propios o
+términos exactos ("YOLO", "BERT"), y permite responder sin llamar a Dashscope.
+Cada título se indexa con las configuraciones spanish e english, porque el
+corpus mezcla ambos idiomas.
+
+Uso desde línea de comandos:
+    python -m app.db.text_search create
+    python -m app.db.text_search drop
+"""
+
+import argparse
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+
+TEXT_SEARCH_TABLES = ("theses", "research_products")
+
+# Constante de la fusión por rango recíproco: score = sum(1 / (RRF_K + rango))
+RRF_K = 60
+
+
+def tsvector_sql(title_sql: str = "title") -> str:
+    """Documento de búsqueda del título (misma expresión que el índice GIN)"""
+    return (
+        f"(to_tsvector('spanish', {title_sql}) || "
+        f"to_tsvector('english', {title_sql}))"
+    )
+
+
+def tsquery_sql(query_sql: str) -> str:
+    """Consulta en sintaxis web ("frase exacta", OR, -excluir) en ambos idiomas"""
+    return (
+        f"(websearch_to_tsquery('spanish', {query_sql}) || "
+        f"websearch_to_tsquery('english', {query_sql}))"
+    )
+
+
+def text_index_name(table: str) -> str:
+    return f"{table}_title_fts_idx"
+
+
+def _check_table(table: str) -> None:
+    if table not in TEXT_SEARCH_TABLES:
+        raise ValueError(f"Tabla no soportada: {table}. Opciones: {TEXT_SEARCH_TABLES}")
+
+
+def create_text_index(db: Session, table: str) -> str:
+    """Crea el índice GIN de expresión sobre el título de la tabla"""
+    _check_table(table)
+    name = text_index_name(table)
+    db.execute(
+        text(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+            f"USING gin ({tsvector_sql()})"
+        )
+    )
+    db.commit()
+    return name
+
+
+def drop_text_index(db: Session, table: str) -> str:
+    _check_table(table)
+    name = text_index_name(table)
+    db.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    db.commit()
+    return name
+
+
+def reciprocal_rank_fusion(rankings: list[list], k: int, rrf_k: int = RRF_K) -> list:
+    """
+    Fusiona rankings de filas (id primero, score al final) por rango recíproco
+
+    Devuelve las k filas con mayor score fusionado, conservando los campos de
+    la primera aparición de cada id y sustituyendo su score por el fusionado.
+    """
+    scores = {}
+    rows = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row[0]] = scores.get(row[0], 0.0) + 1.0 / (rrf_k + rank)
+            rows.setdefault(row[0], row)
+
+    best = sorted(scores, key=lambda item_id: scores[item_id], reverse=True)[:k]
+    return [tuple(rows[item_id][:-1]) + (scores[item_id],) for item_id in best]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Índices de búsqueda léxica")
+    parser.add_argument("command", choices=["create", "drop"])
+    parser.add_argument("--table", choices=TEXT_SEARCH_TABLES, action="append")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        for table in args.table or TEXT_SEARCH_TABLES:
+            if args.command == "create":
+                print(f"Índice creado: {create_text_index(db, table)}")
+            else:
+                print(f"Índice eliminado: {drop_text_index(db, table)}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Modelo de temas persistido por tipo de entidad (topic_models + cluster_id)
+
+Cada ajuste guarda la matriz de centroides versionada en topic_models y
+escribe en theses.cluster_id / research_products.cluster_id el tema de cada
+fila, así que los ids de cluster son estables entre llamadas y listar un tema
+es una consulta por índice.
+
+Los elementos embebidos después del ajuste se asignan al centroide más
+cercano (predict) sin reajustar; el modelo se reajusta completo cuando es
+más viejo que TOPIC_MODEL_REFIT_DAYS o el corpus creció más de
+TOPIC_MODEL_REFIT_GROWTH desde el ajuste.
+
+Uso desde línea de comandos:
+    python -m app.db.topic_model fit [--entity-type theses] [--n-clusters 20]
+    python -m app.db.topic_model refit-stale
+"""
+
+import argparse
+import os
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import models
+from .clustering import (
+    assign_clusters,
+    cluster_embeddings,
+    cluster_sample_limit,
+    fit_minibatch_centers,
+    sample_percent,
+    trim_sample,
+)
+from .columnar import count_rows, iter_columnar, load_columnar
+from .database import SessionLocal
+from .embedding_versions import ENTITY_TYPES, get_embedding_version
+
+# Número de temas por defecto de cada modelo
+TOPIC_MODEL_CLUSTERS = int(os.getenv("TOPIC_MODEL_CLUSTERS", "20"))
+
+# Reajuste completo: antigüedad máxima del modelo en días y crecimiento
+# relativo del corpus desde el ajuste
+TOPIC_MODEL_REFIT_DAYS = float(os.getenv("TOPIC_MODEL_REFIT_DAYS", "7"))
+TOPIC_MODEL_REFIT_GROWTH = float(os.getenv("TOPIC_MODEL_REFIT_GROWTH", "0.25"))
+
+EMBEDDING_DIMENSION = 1024
+
+_UPDATE_BATCH_SIZE = 5000
+
+
+def _check_entity_type(entity_type: str) -> None:
+    if entity_type not in ENTITY_TYPES:
+        raise ValueError("entity_type debe ser 'theses' o 'research_products'")
+
+
+def ensure_topic_columns(db: Session) -> None:
+    """Crea las columnas cluster_id y sus índices si aún no existen"""
+    for table in ENTITY_TYPES:
+        db.execute(
+            text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS cluster_id integer")
+        )
+        db.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_cluster_id "
+                f"ON {table} (cluster_id)"
+            )
+        )
+
+
+def ensure_topic_model_tables(db: Session) -> None:
+    """Crea topic_models y las columnas cluster_id si aún no existen"""
+    models.TopicModel.__table__.create(db.connection(), checkfirst=True)
+    ensure_topic_columns(db)
+    db.commit()
+
+
+def _write_assignments(
+    db: Session, entity_type: str, ids: np.ndarray, labels: np.ndarray
+) -> None:
+    statement = text(
+        f"""
+        UPDATE {entity_type} AS t
+        SET cluster_id = a.cluster_id
+        FROM unnest(CAST(:ids AS integer[]), CAST(:cluster_ids AS integer[]))
+            AS a(id, cluster_id)
+        WHERE t.id = a.id
+    """
+    )
+    for start in range(0, len(ids), _UPDATE_BATCH_SIZE):
+        db.execute(
+            statement,
+            {
+                "ids": ids[start : start + _UPDATE_BATCH_SIZE].tolist(),
+                "cluster_ids": labels[start : start + _UPDATE_BATCH_SIZE].tolist(),
+            },
+        )
+
+
+def _embedded_from(entity_type: str, sample: str = "") -> str:
+    return f"FROM {entity_type} {sample} WHERE embedding IS NOT NULL"
+
+
+def fit_topic_model(
+    db: Session,
+    entity_type: str,
+    n_clusters: int = TOPIC_MODEL_CLUSTERS,
+    max_items: int | None = None,
+) -> models.TopicModel:
+    """
+    Ajusta y guarda un modelo nuevo y reasigna cluster_id a todas las filas
+
+    Igual que /cluster-analysis: KMeans sobre todo el corpus si cabe en el
+    límite de elementos y, si no, MiniBatchKMeans sobre una muestra
+    TABLESAMPLE. Todo ocurre en una transacción, así que los lectores ven el
+    modelo anterior con sus asignaciones hasta el commit.
+    """
+    _check_entity_type(entity_type)
+    ensure_topic_columns(db)
+
+    from_sql = _embedded_from(entity_type)
+    total = count_rows(db, from_sql)
+    if total < n_clusters:
+        raise ValueError(
+            f"No hay suficientes elementos ({total}) para crear {n_clusters} clusters"
+        )
+
+    limit = cluster_sample_limit(max_items, None, EMBEDDING_DIMENSION)
+    if total <= limit:
+        columns, matrix = load_columnar(db, ["id"], from_sql, "id")
+        labels, centers = cluster_embeddings(matrix, n_clusters)
+        ids = columns[0]
+        algorithm = "kmeans"
+        sample_size = len(ids)
+    else:
+        # Muestra completa sin LIMIT y recorte al azar (ver _cluster_sampled)
+        _, sample = load_columnar(
+            db,
+            ["id"],
+            _embedded_from(
+                entity_type, "TABLESAMPLE BERNOULLI (:sample_percent) REPEATABLE (42)"
+            ),
+            "id",
+            {"sample_percent": sample_percent(limit, total)},
+        )
+        sample = trim_sample(sample, limit)
+        centers = fit_minibatch_centers(sample, n_clusters)
+        algorithm = "minibatch_kmeans"
+        sample_size = len(sample)
+        del sample
+
+        id_batches = []
+        label_batches = []
+        for columns, vectors in iter_columnar(db, ["id"], from_sql, "id"):
+            id_batches.append(columns[0])
+            label_batches.append(assign_clusters(vectors, centers))
+        ids = np.concatenate(id_batches)
+        labels = np.concatenate(label_batches)
+
+    _write_assignments(db, entity_type, ids, labels)
+    db.execute(
+        text(
+            f"UPDATE {entity_type} SET cluster_id = NULL "
+            "WHERE embedding IS NULL AND cluster_id IS NOT NULL"
+        )
+    )
+
+    version = db.execute(
+        text(
+            "SELECT COALESCE(MAX(version), 0) + 1 FROM topic_models "
+            "WHERE entity_type = :entity_type"
+        ),
+        {"entity_type": entity_type},
+    ).scalar()
+    topic_model = models.TopicModel(
+        entity_type=entity_type,
+        version=version,
+        n_clusters=n_clusters,
+        dimension=centers.shape[1],
+        centers=np.asarray(centers, dtype="<f4").tobytes(),
+        algorithm=algorithm,
+        sample_size=sample_size,
+        total_items=len(ids),
+        embedding_version=get_embedding_version(db, entity_type),
+    )
+    db.add(topic_model)
+    db.commit()
+    return topic_model
+
+
+def get_topic_model(db: Session, entity_type: str) -> models.TopicModel | None:
+    """Modelo activo (versión más alta) de la entidad, o None si no hay"""
+    _check_entity_type(entity_type)
+    return (
+        db.query(models.TopicModel)
+        .filter(models.TopicModel.entity_type == entity_type)
+        .order_by(models.TopicModel.version.desc())
+        .first()
+    )
+
+
+def topic_centers(topic_model: models.TopicModel) -> np.ndarray:
+    """Matriz de centroides (n_clusters, dimension) de un modelo guardado"""
+    return np.frombuffer(topic_model.centers, dtype="<f4").reshape(
+        topic_model.n_clusters, topic_model.dimension
+    )
+
+
+def assign_topics(db: Session, entity_type: str, ids: list[int]) -> int:
+    """Asigna a los elementos dados el tema más cercano del modelo activo"""
+    topic_model = get_topic_model(db, entity_type)
+    if topic_model is None or not ids:
+        return 0
+
+    columns, matrix = load_columnar(
+        db,
+        ["id"],
+        f"{_embedded_from(entity_type)} AND id = ANY(:ids)",
+        "id",
+        {"ids": list(ids)},
+    )
+    labels = assign_clusters(matrix, topic_centers(topic_model))
+    _write_assignments(db, entity_type, columns[0], labels)
+    db.commit()
+    return len(labels)
+
+
+def topic_model_is_stale(db: Session, topic_model: models.TopicModel) -> bool:
+    """El modelo superó la antigüedad o el crecimiento del corpus permitidos"""
+    expired = db.execute(
+        text("SELECT :created_at < localtimestamp - :days * interval '1 day'"),
+        {"created_at": topic_model.created_at, "days": TOPIC_MODEL_REFIT_DAYS},
+    ).scalar()
+    if expired:
+        return True
+
+    total = count_rows(db, _embedded_from(topic_model.entity_type))
+    return total > topic_model.total_items * (1 + TOPIC_MODEL_REFIT_GROWTH)
+
+
+def update_topic_models(db: Session, new_ids: dict[str, list[int]]) -> dict[str, str]:
+    """
+    Mantiene los modelos tras embeber elementos nuevos
+
+    Reajusta si no hay modelo o está vencido; si no, solo asigna los nuevos.
+    Devuelve la acción realizada por entidad ("fit", "assign" o "skip" si no
+    hay elementos suficientes para ajustar el modelo).
+    """
+    actions = {}
+    for entity_type, ids in new_ids.items():
+        if not ids:
+            continue
+        topic_model = get_topic_model(db, entity_type)
+        if topic_model is None or topic_model_is_stale(db, topic_model):
+            n_clusters = topic_model.n_clusters if topic_model else TOPIC_MODEL_CLUSTERS
+            try:
+                fit_topic_model(db, entity_type, n_clusters)
+                actions[entity_type] = "fit"
+            except ValueError as e:
+                db.rollback()
+                print(f"No se pudo ajustar el modelo de {entity_type}: {e}")
+                actions[entity_type] = "skip"
+        else:
+            assign_topics(db, entity_type, ids)
+            actions[entity_type] = "assign"
+    return actions
+
+
+def refit_stale_topic_models(db: Session) -> list[str]:
+    """Reajusta los modelos inexistentes o vencidos (para ejecución periódica)"""
+    refitted = []
+    for entity_type in ENTITY_TYPES:
+        topic_model = get_topic_model(db, entity_type)
+        if topic_model is not None and not topic_model_is_stale(db, topic_model):
+            continue
+        n_clusters = topic_model.n_clusters if topic_model else TOPIC_MODEL_CLUSTERS
+        try:
+            fit_topic_model(db, entity_type, n_clusters)
+            refitted.append(entity_type)
+        except ValueError as e:
+            db.rollback()
+            print(f"No se pudo ajustar el modelo de {entity_type}: {e}")
+    return refitted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Modelo de temas persistido")
+    parser.add_argument("command", choices=["fit", "refit-stale"])
+    parser.add_argument(
+        "--entity-type", choices=list(ENTITY_TYPES), action="append", default=None
+    )
+    parser.add_argument("--n-clusters", type=int, default=TOPIC_MODEL_CLUSTERS)
+    parser.add_argument("--max-items", type=int, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.command == "refit-stale":
+            refitted = refit_stale_topic_models(db)
+            print(f"Modelos reajustados: {', '.join(refitted) or 'ninguno'}")
+            return
+
+        for entity_type in args.entity_type or ENTITY_TYPES:
+            topic_model = fit_topic_model(
+                db, entity_type, args.n_clusters, args.max_items
+            )
+            print(
+                f"{entity_type}: versión {topic_model.version}, "
+                f"{topic_model.n_clusters} temas, {topic_model.total_items} elementos "
+                f"({topic_model.algorithm}, muestra de {topic_model.sample_size})"
+            )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
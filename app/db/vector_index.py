@@ -0,0 +1,459 @@
+"""
+Gestión de índices vectoriales (HNSW / IVFFlat) sobre los embeddings
+
+Uso desde línea de comandos:
+    python -m app.db.vector_index create --table theses --method hnsw
+    python -m app.db.vector_index rebuild --table research_products --method hnsw
+    python -m app.db.vector_index drop --table theses
+    python -m app.db.vector_index list
+    python -m app.db.vector_index filter-indexes
+
+    # Columna halfvec (float16) generada a partir de embedding y su índice
+    python -m app.db.vector_index add-column --quantization half
+    python -m app.db.vector_index create --method hnsw --quantization half
+
+    # Códigos binarios (binary_quantize) con índice de Hamming
+    python -m app.db.vector_index add-column --quantization binary
+    python -m app.db.vector_index create --method hnsw --quantization binary
+"""
+
+import argparse
+import math
+import os
+
+import numpy as np
+from pgvector import Vector
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .database import DB_DRIVER, SessionLocal
+from .embedding_versions import ENTITY_TYPES, bump_embedding_version
+
+# Métrica usada por las búsquedas:
+#   "cosine" -> operador <=> (distancia coseno)
+#   "ip"     -> operador <#> (producto interno negativo), requiere vectores normalizados
+VECTOR_METRIC = os.getenv("VECTOR_METRIC", "cosine")
+
+VECTOR_TABLES = ("theses", "research_products", "professor_embeddings")
+INDEX_METHODS = ("hnsw", "ivfflat")
+METRICS = ("cosine", "ip")
+
+# Precisión de la columna sobre la que se ordena la búsqueda ANN:
+#   "none"   -> embedding (vector, float32)
+#   "half"   -> embedding_half (halfvec, float16; mitad de tamaño en índice y caché)
+#   "binary" -> embedding_bits (bit, signo de cada dimensión; 128 bytes por
+#               vector, distancia de Hamming y siempre con rerank)
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+QUANTIZATION_MODES = ("none", "half", "binary")
+
+# Reordenar con los vectores float32 los candidatos obtenidos con la columna
+# cuantizada, y cuántos candidatos pedir por resultado en cada modo
+VECTOR_RERANK = os.getenv("VECTOR_RERANK", "true").lower() == "true"
+VECTOR_RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+VECTOR_BINARY_RERANK_FACTOR = int(os.getenv("VECTOR_BINARY_RERANK_FACTOR", "20"))
+
+# Máximo de candidatos por búsqueda (hnsw.ef_search admite hasta 1000)
+MAX_RERANK_CANDIDATES = 1000
+
+# Búsquedas filtradas: con iterative scan (pgvector >= 0.8) el índice sigue
+# recorriendo el grafo/listas hasta reunir k filas que cumplan el WHERE
+VECTOR_ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN", "true").lower() == "true"
+
+# Tablas con columnas cuantizadas (professor_embeddings solo tiene float32)
+QUANTIZED_TABLES = ("theses", "research_products")
+
+_OPERATORS = {"cosine": "<=>", "ip": "<#>"}
+_OPCLASSES = {
+    "none": {"cosine": "vector_cosine_ops", "ip": "vector_ip_ops"},
+    "half": {"cosine": "halfvec_cosine_ops", "ip": "halfvec_ip_ops"},
+    "binary": {"cosine": "bit_hamming_ops", "ip": "bit_hamming_ops"},
+}
+_COLUMNS = {"none": "embedding", "half": "embedding_half", "binary": "embedding_bits"}
+_COLUMN_TYPES = {"none": "vector(1024)", "half": "halfvec(1024)", "binary": "bit(1024)"}
+# Conversión de un vector float32 al tipo de cada columna cuantizada
+_QUANTIZE_SQL = {
+    "half": "CAST({vector} AS halfvec(1024))",
+    "binary": "CAST(binary_quantize({vector}) AS bit(1024))",
+}
+
+
+def _check_table(table: str) -> None:
+    if table not in VECTOR_TABLES:
+        raise ValueError(f"Tabla no soportada: {table}. Opciones: {VECTOR_TABLES}")
+
+
+def _check_method(method: str) -> None:
+    if method not in INDEX_METHODS:
+        raise ValueError(f"Método no soportado: {method}. Opciones: {INDEX_METHODS}")
+
+
+def _check_metric(metric: str) -> None:
+    if metric not in METRICS:
+        raise ValueError(f"Métrica no soportada: {metric}. Opciones: {METRICS}")
+
+
+def _check_quantization(quantization: str) -> None:
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(
+            f"Cuantización no soportada: {quantization}. Opciones: {QUANTIZATION_MODES}"
+        )
+
+
+def distance_operator(metric: str = VECTOR_METRIC) -> str:
+    """Operador de pgvector para la métrica configurada"""
+    _check_metric(metric)
+    return _OPERATORS[metric]
+
+
+def similarity_sql(distance_sql: str, metric: str = VECTOR_METRIC) -> str:
+    """Convierte una expresión de distancia en un score de similitud (mayor es mejor)"""
+    _check_metric(metric)
+    if metric == "ip":
+        # <#> devuelve el producto interno negado
+        return f"(({distance_sql}) * -1)"
+    return f"(1 - ({distance_sql}))"
+
+
+def quantized_distance_sql(
+    alias: str,
+    vector_sql: str,
+    quantization: str = "none",
+    metric: str = VECTOR_METRIC,
+) -> str:
+    """
+    Expresión de distancia entre la columna de la tabla (alias) y el vector
+
+    Con cuantización se compara la columna reducida con el vector convertido al
+    mismo tipo, que es la forma que puede resolver su índice ANN.
+    """
+    _check_quantization(quantization)
+    operator = distance_operator(metric)
+    if quantization == "none":
+        return f"{alias}.embedding {operator} {vector_sql}"
+    if quantization == "binary":
+        # Distancia de Hamming entre códigos de signo
+        operator = "<~>"
+    return (
+        f"{alias}.{_COLUMNS[quantization]} {operator} "
+        f"{_QUANTIZE_SQL[quantization].format(vector=vector_sql)}"
+    )
+
+
+def rerank_candidates(
+    k: int, quantization: str, candidate_multiplier: int | None = None
+) -> int:
+    """Candidatos que la etapa cuantizada entrega al reordenamiento exacto"""
+    if candidate_multiplier is None:
+        candidate_multiplier = (
+            VECTOR_BINARY_RERANK_FACTOR
+            if quantization == "binary"
+            else VECTOR_RERANK_FACTOR
+        )
+    return min(max(k * candidate_multiplier, k), MAX_RERANK_CANDIDATES)
+
+
+def normalize_vector(embedding) -> list[float]:
+    """Normaliza un vector a norma 1 (necesario para la métrica "ip")"""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector = vector / norm
+    return vector.tolist()
+
+
+def prepare_query_vector(embedding, metric: str = VECTOR_METRIC):
+    """Ajusta el vector de consulta a la métrica (normaliza en modo "ip")"""
+    if metric == "ip":
+        return normalize_vector(embedding)
+    return embedding
+
+
+def vector_param(embedding):
+    """
+    Valor para enlazar un vector como parámetro (CAST(:param AS vector))
+
+    Con psycopg 3 se pasa un arreglo float32 que pgvector serializa en binario;
+    con psycopg2 se pasa el texto '[...]', ya que el driver no soporta binario.
+    """
+    if DB_DRIVER == "psycopg":
+        return np.asarray(embedding, dtype=np.float32)
+    return Vector._to_db(np.asarray(embedding, dtype=np.float32))
+
+
+def index_name(table: str, method: str, quantization: str = "none") -> str:
+    return f"{table}_{_COLUMNS[quantization]}_{method}_idx"
+
+
+def add_quantized_column(db: Session, table: str, quantization: str = "half") -> str:
+    """
+    Agrega la columna cuantizada como columna generada a partir de embedding
+
+    Al ser GENERATED ... STORED, el ALTER TABLE rellena las filas existentes y
+    PostgreSQL la mantiene sincronizada en cada escritura de embedding.
+    """
+    _check_table(table)
+    _check_quantization(quantization)
+    if quantization == "none" or table not in QUANTIZED_TABLES:
+        raise ValueError(f"La tabla {table} no admite la cuantización {quantization}")
+
+    column = _COLUMNS[quantization]
+    column_type = _COLUMN_TYPES[quantization]
+    expression = _QUANTIZE_SQL[quantization].format(vector="embedding")
+    db.execute(
+        text(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type} "
+            f"GENERATED ALWAYS AS ({expression}) STORED"
+        )
+    )
+    db.commit()
+    return column
+
+
+def normalize_embeddings(db: Session, table: str) -> int:
+    """Normaliza a norma 1 todos los embeddings almacenados en la tabla"""
+    _check_table(table)
+    result = db.execute(
+        text(
+            f"UPDATE {table} SET embedding = l2_normalize(embedding) "
+            "WHERE embedding IS NOT NULL"
+        )
+    )
+    db.commit()
+    if table in ENTITY_TYPES:
+        bump_embedding_version(db, table)
+    return result.rowcount
+
+
+def get_vector_indexes(db: Session) -> list[dict]:
+    """Lista los índices vectoriales existentes sobre las tablas de embeddings"""
+    rows = db.execute(
+        text(
+            """
+            SELECT tablename, indexname, indexdef
+            FROM pg_indexes
+            WHERE tablename = ANY(:tables)
+              AND (indexdef ILIKE '%USING hnsw%' OR indexdef ILIKE '%USING ivfflat%')
+            ORDER BY tablename, indexname
+        """
+        ),
+        {"tables": list(VECTOR_TABLES)},
+    ).fetchall()
+
+    return [{"table": row[0], "index": row[1], "definition": row[2]} for row in rows]
+
+
+def _default_lists(db: Session, table: str) -> int:
+    # Recomendación de pgvector: filas / 1000 hasta 1M filas, sqrt(filas) a partir de ahí
+    rows = db.execute(
+        text(f"SELECT COUNT(*) FROM {table} WHERE embedding IS NOT NULL")
+    ).scalar()
+    rows = rows or 0
+    if rows > 1_000_000:
+        return int(math.sqrt(rows))
+    return max(1, rows // 1000)
+
+
+def create_vector_index(
+    db: Session,
+    table: str,
+    method: str = "hnsw",
+    metric: str = VECTOR_METRIC,
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int | None = None,
+    quantization: str = "none",
+) -> str:
+    """
+    Crea (o reemplaza) el índice ANN sobre la columna embedding de la tabla
+
+    En modo "ip" los embeddings almacenados se normalizan antes de indexar,
+    de modo que el producto interno equivale a la similitud coseno. Con
+    quantization="half" el índice se crea sobre embedding_half.
+    """
+    _check_table(table)
+    _check_method(method)
+    _check_metric(metric)
+    _check_quantization(quantization)
+    if quantization != "none" and table not in QUANTIZED_TABLES:
+        raise ValueError(f"La tabla {table} no admite la cuantización {quantization}")
+
+    if metric == "ip":
+        normalize_embeddings(db, table)
+
+    if method == "hnsw":
+        options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+    else:
+        if lists is None:
+            lists = _default_lists(db, table)
+        options = f"lists = {int(lists)}"
+
+    name = index_name(table, method, quantization)
+    column = _COLUMNS[quantization]
+    opclass = _OPCLASSES[quantization][metric]
+    db.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    db.execute(
+        text(
+            f"CREATE INDEX {name} ON {table} "
+            f"USING {method} ({column} {opclass}) WITH ({options})"
+        )
+    )
+    db.commit()
+    return name
+
+
+def rebuild_vector_index(
+    db: Session, table: str, method: str = "hnsw", quantization: str = "none"
+) -> str:
+    """Reconstruye un índice existente (p. ej. tras cargar muchos embeddings nuevos)"""
+    _check_table(table)
+    _check_method(method)
+    _check_quantization(quantization)
+
+    name = index_name(table, method, quantization)
+    db.execute(text(f"REINDEX INDEX {name}"))
+    db.commit()
+    return name
+
+
+def drop_vector_index(
+    db: Session, table: str, method: str | None = None, quantization: str = "none"
+) -> list[str]:
+    """Elimina el índice del método indicado, o todos los de la tabla si method es None"""
+    _check_table(table)
+    _check_quantization(quantization)
+    methods = INDEX_METHODS if method is None else (method,)
+
+    dropped = []
+    for index_method in methods:
+        _check_method(index_method)
+        name = index_name(table, index_method, quantization)
+        db.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        dropped.append(name)
+    db.commit()
+    return dropped
+
+
+# Índices B-tree de las columnas usadas por los filtros de búsqueda (mismos
+# nombres que genera create_all a partir de index=True en los modelos)
+FILTER_INDEXES = (
+    ("research_products", "year"),
+    ("research_products", "professor_id"),
+    ("theses", "advisor1_id"),
+    ("theses", "advisor2_id"),
+    ("professors", "laboratory_id"),
+    ("academic_programs", "student_id"),
+)
+
+
+def create_filter_indexes(db: Session) -> list[str]:
+    """Crea en bases existentes los índices de filtros que faltan"""
+    created = []
+    for table, column in FILTER_INDEXES:
+        name = f"ix_{table}_{column}"
+        db.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})"))
+        created.append(name)
+    db.commit()
+    return created
+
+
+def apply_search_params(
+    db: Session,
+    ef_search: int | None = None,
+    probes: int | None = None,
+    iterative_scan: bool = False,
+) -> None:
+    """
+    Ajusta recall/latencia de los índices ANN para la transacción actual
+
+    ef_search aplica a HNSW y probes a IVFFlat. SET LOCAL no admite parámetros
+    enlazados, por eso los valores se validan como enteros antes de interpolarlos.
+    iterative_scan se usa en búsquedas filtradas para no devolver menos de k filas.
+    """
+    if iterative_scan and VECTOR_ITERATIVE_SCAN:
+        db.execute(text("SET LOCAL hnsw.iterative_scan = strict_order"))
+        db.execute(text("SET LOCAL ivfflat.iterative_scan = relaxed_order"))
+    if ef_search is not None:
+        if int(ef_search) < 1:
+            raise ValueError("ef_search debe ser mayor que 0")
+        db.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+    if probes is not None:
+        if int(probes) < 1:
+            raise ValueError("probes debe ser mayor que 0")
+        db.execute(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gestión de índices vectoriales")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create = subparsers.add_parser("create")
+    create.add_argument("--table", choices=VECTOR_TABLES, action="append")
+    create.add_argument("--method", choices=INDEX_METHODS, default="hnsw")
+    create.add_argument("--metric", choices=METRICS, default=VECTOR_METRIC)
+    create.add_argument("--m", type=int, default=16)
+    create.add_argument("--ef-construction", type=int, default=64)
+    create.add_argument("--lists", type=int, default=None)
+    create.add_argument("--quantization", choices=QUANTIZATION_MODES, default="none")
+
+    rebuild = subparsers.add_parser("rebuild")
+    rebuild.add_argument("--table", choices=VECTOR_TABLES, action="append")
+    rebuild.add_argument("--method", choices=INDEX_METHODS, default="hnsw")
+    rebuild.add_argument("--quantization", choices=QUANTIZATION_MODES, default="none")
+
+    drop = subparsers.add_parser("drop")
+    drop.add_argument("--table", choices=VECTOR_TABLES, action="append")
+    drop.add_argument("--method", choices=INDEX_METHODS, default=None)
+    drop.add_argument("--quantization", choices=QUANTIZATION_MODES, default="none")
+
+    add_column = subparsers.add_parser("add-column")
+    add_column.add_argument("--table", choices=QUANTIZED_TABLES, action="append")
+    add_column.add_argument(
+        "--quantization", choices=QUANTIZATION_MODES[1:], default="half"
+    )
+
+    subparsers.add_parser("filter-indexes")
+    subparsers.add_parser("list")
+
+    args = parser.parse_args()
+    tables = getattr(args, "table", None) or VECTOR_TABLES
+    if getattr(args, "quantization", "none") != "none" and not args.table:
+        tables = QUANTIZED_TABLES
+
+    db = SessionLocal()
+    try:
+        if args.command == "create":
+            for table in tables:
+                name = create_vector_index(
+                    db,
+                    table,
+                    method=args.method,
+                    metric=args.metric,
+                    m=args.m,
+                    ef_construction=args.ef_construction,
+                    lists=args.lists,
+                    quantization=args.quantization,
+                )
+                print(f"Índice creado: {name}")
+        elif args.command == "rebuild":
+            for table in tables:
+                name = rebuild_vector_index(db, table, args.method, args.quantization)
+                print(f"Índice reconstruido: {name}")
+        elif args.command == "drop":
+            for table in tables:
+                dropped = drop_vector_index(db, table, args.method, args.quantization)
+                print(f"Índices eliminados: {dropped}")
+        elif args.command == "add-column":
+            for table in tables:
+                column = add_quantized_column(db, table, args.quantization)
+                print(f"Columna {column} agregada a {table}")
+        elif args.command == "filter-indexes":
+            print(f"Índices de filtros: {create_filter_indexes(db)}")
+        else:
+            for index in get_vector_indexes(db):
+                print(f"{index['table']}: {index['index']} -> {index['definition']}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
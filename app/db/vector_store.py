@@ -0,0 +1,247 @@
+"""
+Motor de búsqueda exacta en memoria sobre una matriz float32 normalizada
+
+Alternativa a pgvector para corpus pequeños/medianos: los embeddings y los
+metadatos de presentación se cargan una sola vez en arreglos NumPy contiguos y
+cada búsqueda es un producto matriz-vector más un argpartition.
+
+Se activa con VECTOR_SEARCH_BACKEND=memory.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .columnar import load_columnar
+from .embedding_versions import get_embedding_version
+
+# "pgvector" (por defecto) o "memory"
+VECTOR_SEARCH_BACKEND = os.getenv("VECTOR_SEARCH_BACKEND", "pgvector")
+
+# Cada cuántos segundos se consulta la versión de los embeddings para recargar
+VECTOR_STORE_REFRESH_SECONDS = float(os.getenv("VECTOR_STORE_REFRESH_SECONDS", "30"))
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Normaliza cada fila a norma 1 (las filas nulas se dejan en cero)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Índices de los k scores más altos, ordenados de mayor a menor
+
+    Los empates se resuelven por posición (las matrices se cargan ordenadas
+    por id), igual que el ORDER BY distance, id de las consultas SQL: así el
+    corte en k es determinista y la paginación keyset no pierde filas.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    if k < len(scores):
+        # Todas las filas empatadas con el k-ésimo score entran al orden final
+        threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(len(scores))
+    order = np.argsort(-scores[candidates], kind="stable")[:k]
+    return candidates[order]
+
+
+class EmbeddingMatrix:
+    """Embeddings normalizados y metadatos de un tipo de entidad"""
+
+    def __init__(self, columns: list[np.ndarray], matrix: np.ndarray, version: int):
+        # columns[0] son los ids; el resto, los campos de presentación en el
+        # mismo orden que las columnas de las consultas SQL equivalentes
+        self.columns = columns
+        self.ids = columns[0]
+        self.matrix = matrix
+        self.version = version
+        self.positions = {int(item_id): i for i, item_id in enumerate(self.ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows(self, indices: np.ndarray, scores: np.ndarray) -> list[tuple]:
+        """Construye filas con la misma forma que las de pgvector (score al final)"""
+        return [
+            (int(self.ids[i]),)
+            + tuple(column[i] for column in self.columns[1:])
+            + (float(score),)
+            for i, score in zip(indices, scores)
+        ]
+
+
+# Campos de presentación de cada entidad, en el mismo orden que las columnas
+# de las consultas SQL equivalentes (la primera es el id)
+_THESIS_FIELDS = [
+    "t.id",
+    "t.title",
+    "t.student_id",
+    "s.name",
+    "p1.name",
+    "p2.name",
+]
+
+_THESIS_FROM = """
+    FROM theses t
+    JOIN students s ON t.student_id = s.id
+    JOIN professors p1 ON t.advisor1_id = p1.id
+    LEFT JOIN professors p2 ON t.advisor2_id = p2.id
+    WHERE t.embedding IS NOT NULL
+"""
+
+_RESEARCH_PRODUCT_FIELDS = [
+    "rp.id",
+    "rp.title",
+    "rp.site",
+    "rp.year",
+    "rp.professor_id",
+    "p.name",
+    "l.name",
+]
+
+_RESEARCH_PRODUCT_FROM = """
+    FROM research_products rp
+    JOIN professors p ON rp.professor_id = p.id
+    JOIN laboratories l ON p.laboratory_id = l.id
+    WHERE rp.embedding IS NOT NULL
+"""
+
+_SOURCES = {
+    "theses": (_THESIS_FIELDS, _THESIS_FROM, "t"),
+    "research_products": (_RESEARCH_PRODUCT_FIELDS, _RESEARCH_PRODUCT_FROM, "rp"),
+}
+
+
+def load_embedding_matrix(
+    db: Session, entity_type: str, version: int
+) -> EmbeddingMatrix:
+    """Carga embeddings y metadatos de una entidad en arreglos contiguos"""
+    if entity_type not in _SOURCES:
+        raise ValueError("entity_type debe ser 'theses' o 'research_products'")
+
+    fields, from_sql, alias = _SOURCES[entity_type]
+    columns, matrix = load_columnar(
+        db, fields, from_sql, f"{alias}.id", vector_sql=f"{alias}.embedding"
+    )
+    return EmbeddingMatrix(columns, normalize_rows(matrix), version)
+
+
+class InMemoryVectorStore:
+    """Caché de matrices de embeddings por entidad, recargada al cambiar la versión"""
+
+    def __init__(self, refresh_seconds: float = VECTOR_STORE_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._matrices: dict[str, EmbeddingMatrix] = {}
+        self._checked_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, entity_type: str) -> EmbeddingMatrix:
+        """Devuelve la matriz de la entidad, recargándola si los embeddings cambiaron"""
+        data = self._matrices.get(entity_type)
+        checked_at = self._checked_at.get(entity_type, 0.0)
+        if data is not None and time.monotonic() - checked_at < self.refresh_seconds:
+            return data
+
+        with self._lock:
+            version = get_embedding_version(db, entity_type)
+            data = self._matrices.get(entity_type)
+            if data is None or data.version != version:
+                data = load_embedding_matrix(db, entity_type, version)
+                self._matrices[entity_type] = data
+            self._checked_at[entity_type] = time.monotonic()
+
+        return data
+
+    def invalidate(self, entity_type: str | None = None) -> None:
+        """Fuerza la recarga en el siguiente acceso"""
+        with self._lock:
+            if entity_type is None:
+                self._matrices.clear()
+                self._checked_at.clear()
+            else:
+                self._matrices.pop(entity_type, None)
+                self._checked_at.pop(entity_type, None)
+
+    def reference_vector(
+        self, db: Session, entity_type: str, item_id: int
+    ) -> np.ndarray | None:
+        """Embedding normalizado de un elemento ya cargado (None si no existe)"""
+        data = self.get(db, entity_type)
+        position = data.positions.get(int(item_id))
+        if position is None:
+            return None
+        return data.matrix[position]
+
+    def search(
+        self,
+        db: Session,
+        entity_type: str,
+        embedding: list[float],
+        k: int = 10,
+        exclude_id: int | None = None,
+        after: tuple[float, int] | None = None,
+    ) -> list[tuple]:
+        """
+        Top-k exacto por similitud coseno
+
+        after = (score, id) de la última fila de la página anterior: solo se
+        consideran filas con menor score o con el mismo score y mayor id.
+        """
+        return self.search_batch(
+            db, entity_type, [embedding], k, [exclude_id], [after]
+        )[0]
+
+    def search_batch(
+        self,
+        db: Session,
+        entity_type: str,
+        embeddings: list[list[float]],
+        k: int = 10,
+        exclude_ids: list[int | None] | None = None,
+        after: list[tuple[float, int] | None] | None = None,
+    ) -> list[list[tuple]]:
+        """Top-k exacto para varios vectores con un solo producto matriz-matriz"""
+        data = self.get(db, entity_type)
+        if not len(data):
+            return [[] for _ in embeddings]
+
+        exclude_ids = exclude_ids or [None] * len(embeddings)
+        after = after or [None] * len(embeddings)
+        queries = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        scores = data.matrix @ queries.T
+
+        results = []
+        for column, (exclude_id, position) in enumerate(zip(exclude_ids, after)):
+            column_scores = scores[:, column]
+            available = len(data)
+            excluded = (
+                data.positions.get(exclude_id) if exclude_id is not None else None
+            )
+            if excluded is not None or position is not None:
+                column_scores = column_scores.copy()
+            if excluded is not None:
+                column_scores[excluded] = -np.inf
+                available -= 1
+            if position is not None:
+                # Filas ya entregadas en páginas anteriores
+                last_score, last_id = position
+                seen = (column_scores > last_score) | (
+                    (column_scores == last_score) & (data.ids <= last_id)
+                )
+                column_scores[seen] = -np.inf
+                available = int(np.count_nonzero(column_scores > -np.inf))
+            indices = top_k_indices(column_scores, min(k, available))
+            results.append(data.rows(indices, column_scores[indices]))
+        return results
+
+
+vector_store = InMemoryVectorStore()
@@ -1,16 +1,50 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 import uvicorn
 
 from app.api.routes import professor
 from app.api.routes import student
 from app.api.routes import recommendation
-
-app = FastAPI()
+from app.api.routes import jobs
+from app.db.database import SessionLocal
+from app.db.embedding_versions import ensure_embedding_versions_table
+from app.db.knn_table import ensure_knn_table
+from app.db.professor_embeddings import ensure_professor_embeddings_table
+from app.db.topic_model import ensure_topic_model_tables
+
+# Tablas agregadas después de la creación de las bases existentes (create_all
+# solo corre desde el scraper)
+_SCHEMA_CHECKS = (
+    ("embedding_versions", ensure_embedding_versions_table),
+    ("similar_items", ensure_knn_table),
+    ("professor_embeddings", ensure_professor_embeddings_table),
+    ("topic_models", ensure_topic_model_tables),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db = SessionLocal()
+    try:
+        for name, ensure in _SCHEMA_CHECKS:
+            try:
+                ensure(db)
+            except Exception as e:
+                db.rollback()
+                print(f"No se pudo verificar la tabla {name}: {e}")
+    finally:
+        db.close()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Include routers
 app.include_router(professor.router, prefix="/api/v1")
 app.include_router(student.router, prefix="/api/v1")
 app.include_router(recommendation.router, prefix="/api/v1")
+app.include_router(jobs.router, prefix="/api/v1")
 
 
 @app.get("/")
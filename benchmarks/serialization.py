@@ -0,0 +1,93 @@
+"""
+Costo por fila de serializar resultados: modelos Pydantic vs dicts + orjson
+
+Compara, con filas sintéticas con la forma de las consultas reales, la ruta
+anterior (un modelo Pydantic por fila, validado de nuevo por el response_model
+y serializado por FastAPI) con la ruta rápida (tuplas a dicts y orjson).
+
+Uso:
+    python -m benchmarks.serialization --rows 1000 --repeat 20
+"""
+
+import argparse
+import time
+
+from pydantic import TypeAdapter
+
+from app.api.responses import FastJSONResponse, model_fields, rows_to_dicts
+from app.db import schemas
+
+
+def _thesis_rows(n: int) -> list[tuple]:
+    return [
+        (
+            i,
+            f"Detección de anomalías en series de tiempo mediante redes neuronales {i}",
+            10_000 + i,
+            f"Estudiante {i}",
+            "Dra. Asesora Principal",
+            None if i % 3 else "Dr. Asesor Secundario",
+            1.0 - i / (n + 1),
+        )
+        for i in range(n)
+    ]
+
+
+def _professor_rows(n: int) -> list[tuple]:
+    return [
+        (
+            i,
+            f"Profesor {i}",
+            f"profesor{i}@ipn.mx",
+            f"https://www.cic.ipn.mx/profesores/{i}",
+            i % 12,
+            f"Laboratorio {i % 12}",
+        )
+        for i in range(n)
+    ]
+
+
+def _models_path(model: type, rows: list[tuple]) -> bytes:
+    """Ruta anterior: modelo por fila + validación y serialización del response_model"""
+    fields = model_fields(model)
+    objects = [model(**dict(zip(fields, row))) for row in rows]
+    adapter = TypeAdapter(list[model])
+    return adapter.dump_json(adapter.validate_python(objects))
+
+
+def _fast_path(model: type, rows: list[tuple]) -> bytes:
+    """Ruta rápida: tuplas a dicts y orjson, sin validación"""
+    return FastJSONResponse(rows_to_dicts(rows, model_fields(model))).body
+
+
+def _per_row_us(function, model: type, rows: list[tuple], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(model, rows)
+        best = min(best, time.perf_counter() - start)
+    return best / len(rows) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de serialización")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    cases = [
+        ("ThesisRecommendation", schemas.ThesisRecommendation, _thesis_rows),
+        ("ProfessorWithLaboratory", schemas.ProfessorWithLaboratory, _professor_rows),
+    ]
+
+    print(f"{args.rows} filas, mejor de {args.repeat} repeticiones (µs por fila)")
+    print(f"{'esquema':<26}{'pydantic':>10}{'dict+orjson':>14}{'mejora':>9}")
+    for name, model, make_rows in cases:
+        rows = make_rows(args.rows)
+        before = _per_row_us(_models_path, model, rows, args.repeat)
+        after = _per_row_us(_fast_path, model, rows, args.repeat)
+        print(f"{name:<26}{before:>10.2f}{after:>14.2f}{before / after:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,8 @@
 CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Versión de los embeddings por entidad (invalida las cachés de análisis)
+CREATE TABLE IF NOT EXISTS embedding_versions (
+    entity_type varchar PRIMARY KEY,
+    version integer NOT NULL DEFAULT 0,
+    updated_at timestamp DEFAULT now()
+);
@@ -7,6 +7,11 @@ from dotenv import load_dotenv
 
 from app.db.database import SessionLocal
 from app.db import models
+from app.db.embedding_versions import bump_embedding_version
+from app.db.knn_table import update_knn_table
+from app.db.professor_embeddings import refresh_professor_embeddings
+from app.db.topic_model import update_topic_models
+from app.db.vector_index import VECTOR_METRIC, normalize_vector
 
 
 load_dotenv()
@@ -19,6 +24,13 @@ dashscope.base_http_api_url = "https://dashscope-intl.aliyuncs.com/api/v1"
 BATCH_SIZE = 10
 
 
+def prepare_document_embedding(embedding: list[float]) -> list[float]:
+    # En modo "ip" los índices asumen vectores normalizados
+    if VECTOR_METRIC == "ip":
+        return normalize_vector(embedding)
+    return embedding
+
+
 def clean_text(text: str) -> str:
     # Normalize unicode
     text = text.encode("utf-8", "ignore").decode("utf-8", "ignore")
@@ -38,6 +50,9 @@ def clean_text(text: str) -> str:
 def populate_embeddings():
     db = SessionLocal()
 
+    # Ids embebidos en esta ejecución (para actualizar la tabla de vecinos)
+    embedded_ids = {"theses": [], "research_products": []}
+
     try:
         research_product_to_embed = (
             db.query(models.ResearchProduct)
@@ -76,7 +91,10 @@ def populate_embeddings():
                     for product, embedding_data in zip(
                         batch_objects, resp.output["embeddings"]
                     ):
-                        product.embedding = embedding_data["embedding"]
+                        product.embedding = prepare_document_embedding(
+                            embedding_data["embedding"]
+                        )
+                        embedded_ids["research_products"].append(product.id)
                 else:
                     print(
                         f"Error generating embeddings for research products batch starting at index {i}: {resp.text}"
@@ -115,7 +133,10 @@ def populate_embeddings():
                     for thesis, embedding_data in zip(
                         batch_objects, resp.output["embeddings"]
                     ):
-                        thesis.embedding = embedding_data["embedding"]
+                        thesis.embedding = prepare_document_embedding(
+                            embedding_data["embedding"]
+                        )
+                        embedded_ids["theses"].append(thesis.id)
                 else:
                     print(
                         f"Error generating embeddings for theses batch starting at index {i}: {resp.text}"
@@ -131,6 +152,24 @@ def populate_embeddings():
         print("\nSaving embeddings to the database...")
         db.commit()
         print("Embeddings saved successfully.")
+
+        # Invalida las cachés en memoria (vector_store) de la API
+        if embedded_ids["research_products"]:
+            bump_embedding_version(db, "research_products")
+        if embedded_ids["theses"]:
+            bump_embedding_version(db, "theses")
+
+        print("Updating precomputed nearest neighbours...")
+        update_knn_table(db, embedded_ids)
+
+        if any(embedded_ids.values()):
+            print("Refreshing professor centroid embeddings...")
+            refresh_professor_embeddings(db)
+
+            print("Assigning topics to new items...")
+            actions = update_topic_models(db, embedded_ids)
+            for entity_type, action in actions.items():
+                print(f"  {entity_type}: {action}")
     except Exception as e:
         db.rollback()
         print(f"Exception during database commit: {e}")
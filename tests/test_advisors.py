@@ -0,0 +1,30 @@
+from app.db import crud_recommendations
+
+
+class _RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+        return self
+
+    def fetchall(self):
+        return []
+
+
+def _iterative(db: _RecordingSession) -> bool:
+    return any("iterative_scan" in statement for statement in db.statements)
+
+
+def test_laboratory_filter_enables_iterative_scan(monkeypatch):
+    monkeypatch.setattr("app.db.vector_index.VECTOR_ITERATIVE_SCAN", True)
+    embedding = [0.1] * 1024
+
+    db = _RecordingSession()
+    crud_recommendations.search_advisors_by_embedding(db, embedding, laboratory_id=3)
+    assert _iterative(db)
+
+    db = _RecordingSession()
+    crud_recommendations.search_advisors_by_embedding(db, embedding)
+    assert not _iterative(db)
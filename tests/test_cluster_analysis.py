@@ -0,0 +1,102 @@
+import numpy as np
+import orjson
+
+from app.api.routes.recommendation import stream_cluster_lines
+from app.db import crud_recommendations as crud
+
+# Dos grupos separados en las dos primeras dimensiones
+_CENTERS = np.zeros((2, crud.EMBEDDING_DIMENSION), dtype=np.float32)
+_CENTERS[1, :2] = 10.0
+
+
+def _vectors(labels: list[int]) -> np.ndarray:
+    return _CENTERS[labels] + 0.01
+
+
+def _patch_sampled(monkeypatch, batches: list[tuple[list[int], list[int]]]):
+    """Tabla falsa de 6 filas leída en lotes, con límite de 4 (modo muestra)"""
+    read = []
+
+    def iter_columnar(db, fields, *args, **kwargs):
+        for ids, labels in batches:
+            read.append(ids)
+            columns = [np.array(ids)] + [
+                np.array([f"{field}-{i}" for i in ids], dtype=object)
+                for field in fields[1:]
+            ]
+            yield columns, _vectors(labels)
+
+    monkeypatch.setattr(crud, "count_rows", lambda db, from_sql, params: 6)
+    monkeypatch.setattr(
+        crud,
+        "load_columnar",
+        lambda *args, **kwargs: ([np.arange(4)], _vectors([0, 0, 1, 1])),
+    )
+    monkeypatch.setattr(crud, "iter_columnar", iter_columnar)
+    monkeypatch.setattr(crud, "get_embedding_version", lambda db, entity_type: -1)
+    return read
+
+
+def test_iter_cluster_analysis_yields_batches_lazily(monkeypatch):
+    read = _patch_sampled(monkeypatch, [([1, 2, 3], [0, 1, 0]), ([4, 5, 6], [1, 1, 0])])
+
+    parts = crud.iter_cluster_analysis(None, "theses", 2, max_items=4)
+    header = next(parts)
+    assert header["total_items"] == 6
+    assert header["sampling"]["mode"] == "sample"
+    assert read == []
+
+    items, labels = next(parts)
+    assert [item["id"] for item in items] == [1, 2, 3]
+    assert read == [[1, 2, 3]]
+    # Mismo patrón de grupos, sea cual sea la numeración de los clusters
+    assert labels[0] == labels[2] != labels[1]
+
+
+def test_perform_cluster_analysis_groups_all_batches(monkeypatch):
+    _patch_sampled(monkeypatch, [([1, 2, 3], [0, 1, 0]), ([4, 5, 6], [1, 1, 0])])
+
+    result = crud.perform_cluster_analysis(None, "theses", 2, max_items=4)
+
+    groups = sorted(
+        sorted(item["id"] for item in cluster["items"])
+        for cluster in result["clusters"]
+    )
+    assert groups == [[1, 3, 6], [2, 4, 5]]
+    assert result["total_items"] == 6
+    assert result["sampling"]["sample_fraction"] == 4 / 6
+
+
+class _Session:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_stream_cluster_lines_ndjson():
+    header = {
+        "entity_type": "theses",
+        "total_items": 3,
+        "centers": _CENTERS,
+        "sampling": {"mode": "full"},
+    }
+    db = _Session()
+
+    def batches():
+        yield [{"id": 1}, {"id": 2}], np.array([0, 1])
+        yield [{"id": 3}], np.array([1])
+
+    body = b"".join(stream_cluster_lines(header, batches(), db, "float16", True))
+    lines = [orjson.loads(line) for line in body.splitlines()]
+
+    assert lines[0]["n_clusters"] == 2
+    assert [line["cluster_id"] for line in lines[1:3]] == [0, 1]
+    assert "cluster_center_float16" in lines[1]
+    assert lines[3:6] == [
+        {"cluster_id": 0, "id": 1},
+        {"cluster_id": 1, "id": 2},
+        {"cluster_id": 1, "id": 3},
+    ]
+    assert lines[6] == {"cluster_sizes": [1, 2]}
+    assert db.closed
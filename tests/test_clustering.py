@@ -0,0 +1,55 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytest
+
+from app.db import clustering
+from app.db.clustering import assign_clusters, sample_percent, trim_sample
+
+
+def test_trim_sample_is_uniform_and_in_place():
+    sample = np.arange(10_000, dtype=np.float32).reshape(-1, 1)
+    trimmed = trim_sample(sample, 1_000)
+
+    assert trimmed.shape == (1_000, 1)
+    assert np.shares_memory(trimmed, sample)
+    values = trimmed[:, 0]
+    # Filas distintas, en orden, y repartidas por toda la tabla
+    assert np.all(np.diff(values) > 0)
+    assert values.min() < 500 and values.max() > 9_500
+    assert abs(values.mean() - 5_000) < 500
+
+
+def test_trim_sample_keeps_small_samples():
+    sample = np.ones((5, 3), dtype=np.float32)
+    assert trim_sample(sample, 10) is sample
+
+
+def test_sample_percent_is_capped():
+    assert sample_percent(100, 1_000) == 10.0
+    assert sample_percent(5_000, 1_000) == 100.0
+
+
+def test_assign_clusters_nearest_center():
+    centers = np.array([[0.0, 0.0], [10.0, 10.0]], dtype=np.float32)
+    points = np.array([[1.0, -1.0], [9.0, 11.0], [6.0, 6.0]], dtype=np.float32)
+    assert assign_clusters(points, centers).tolist() == [0, 1, 1]
+
+
+def test_broken_analysis_pool_is_replaced():
+    clustering.set_analysis_executor(None)
+    try:
+        # Un proceso que muere rompe el pool
+        with pytest.raises(BrokenProcessPool):
+            clustering.submit_analysis(os._exit, 1).result(timeout=60)
+        broken = clustering._executor
+        assert broken is None or broken._broken
+
+        assert clustering.submit_analysis(sum, [1, 2]).result(timeout=60) == 3
+        assert clustering._executor is not broken
+    finally:
+        executor = clustering._executor
+        clustering.set_analysis_executor(None)
+        if executor is not None:
+            executor.shutdown()
@@ -0,0 +1,26 @@
+import struct
+
+import numpy as np
+
+from app.db.columnar import _decode_vectors, _vector_dimension
+
+
+def _vector_send(values: list[float]) -> bytes:
+    """Mismo formato que vector_send: dimensión, reservado y float4 big-endian"""
+    return struct.pack(f">hh{len(values)}f", len(values), 0, *values)
+
+
+def test_decode_vectors_native_float32():
+    rows = [[0.5, -1.0, 2.25], [3.0, 0.0, -0.125]]
+    buffers = [_vector_send(row) for row in rows]
+
+    matrix = _decode_vectors(buffers, 3)
+
+    assert matrix.dtype == np.float32
+    assert matrix.dtype.isnative
+    assert matrix.flags.c_contiguous
+    np.testing.assert_array_equal(matrix, np.array(rows, dtype=np.float32))
+
+
+def test_vector_dimension():
+    assert _vector_dimension(_vector_send([1.0] * 1024)) == 1024
@@ -0,0 +1,33 @@
+from app.db.embedding_versions import (
+    ensure_embedding_versions_table,
+    get_embedding_versions,
+)
+
+
+class _FakeSession:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.statements = []
+        self.committed = False
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+    def commit(self):
+        self.committed = True
+
+
+def test_ensure_table_is_idempotent_ddl():
+    db = _FakeSession()
+    ensure_embedding_versions_table(db)
+    assert "CREATE TABLE IF NOT EXISTS embedding_versions" in db.statements[0]
+    assert db.committed
+
+
+def test_missing_entity_types_default_to_zero():
+    db = _FakeSession([("theses", 3)])
+    assert get_embedding_versions(db) == {"theses": 3, "research_products": 0}
@@ -0,0 +1,40 @@
+from app.db import crud_recommendations as crud
+from app.db.schemas import SearchFilters
+
+
+def test_year_filter_excludes_theses():
+    filters = SearchFilters(min_year=2020)
+    assert crud.filtered_entities(filters, True, True) == (False, True)
+
+
+def test_program_filter_excludes_products():
+    filters = SearchFilters(program="MCC")
+    assert crud.filtered_entities(filters, True, True) == (True, False)
+
+
+def test_shared_filters_keep_both_types():
+    filters = SearchFilters(laboratory_id=3, professor_id=7)
+    assert crud.filtered_entities(filters, True, True) == (True, True)
+    assert crud.filtered_entities(None, True, False) == (True, False)
+
+
+class _RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+        return self
+
+    def fetchall(self):
+        return []
+
+
+def test_lexical_search_with_year_filter_skips_theses():
+    db = _RecordingSession()
+    crud.search_similar_items_by_text(
+        db, "redes neuronales", filters=SearchFilters(max_year=2022)
+    )
+    (sql,) = db.statements
+    assert "FROM research_products rp" in sql
+    assert "FROM theses t" not in sql
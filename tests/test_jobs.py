@@ -0,0 +1,48 @@
+from concurrent.futures import Future
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routes import jobs as jobs_routes
+from app.db.jobs import Job, JobQueue
+
+
+def _client(monkeypatch) -> tuple[TestClient, JobQueue]:
+    queue = JobQueue()
+    monkeypatch.setattr(jobs_routes, "job_queue", queue)
+    app = FastAPI()
+    app.include_router(jobs_routes.router)
+    return TestClient(app), queue
+
+
+def _add_job(queue: JobQueue, future: Future) -> Job:
+    job = Job("trends", {"years": None, "top_k": 10}, ("trends",), future)
+    queue._jobs[job.id] = job
+    return job
+
+
+def test_unknown_job_is_404(monkeypatch):
+    client, _ = _client(monkeypatch)
+    response = client.get("/jobs/no-existe")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Trabajo no encontrado"
+
+
+def test_cancel_queued_job(monkeypatch):
+    client, queue = _client(monkeypatch)
+    job = _add_job(queue, Future())
+
+    response = client.delete(f"/jobs/{job.id}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+
+
+def test_cancel_running_job_is_409(monkeypatch):
+    client, queue = _client(monkeypatch)
+    future = Future()
+    future.set_running_or_notify_cancel()
+    job = _add_job(queue, future)
+
+    response = client.delete(f"/jobs/{job.id}")
+    assert response.status_code == 409
+    assert job.status == "running"
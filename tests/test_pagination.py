@@ -0,0 +1,89 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.db.crud_recommendations import _combined_search_query
+from app.db.search_cursor import decode_search_cursor, encode_search_cursor
+from app.db.vector_index import quantized_distance_sql, similarity_sql
+from app.db.vector_store import EmbeddingMatrix, InMemoryVectorStore, top_k_indices
+
+
+def _store(matrix: np.ndarray, ids: list[int]) -> InMemoryVectorStore:
+    """Almacén con la matriz de tesis ya cargada (sin base de datos)"""
+    store = InMemoryVectorStore(refresh_seconds=math.inf)
+    columns = [np.array(ids, dtype=np.int64), np.array([f"t{i}" for i in ids])]
+    store._matrices["theses"] = EmbeddingMatrix(columns, matrix, version=1)
+    store._checked_at["theses"] = 0.0
+    return store
+
+
+def _page_all(store: InMemoryVectorStore, query: list[float], k: int) -> list[int]:
+    seen = []
+    after = None
+    while True:
+        rows = store.search(None, "theses", query, k, after=after)
+        seen.extend(row[0] for row in rows)
+        if len(rows) < k:
+            return seen
+        after = (rows[-1][-1], rows[-1][0])
+
+
+def test_top_k_breaks_ties_by_position():
+    scores = np.array([0.5, 0.9, 0.5, 0.5, 0.1, 0.5], dtype=np.float32)
+    assert top_k_indices(scores, 3).tolist() == [1, 0, 2]
+    assert top_k_indices(scores, 6).tolist() == [1, 0, 2, 3, 5, 4]
+
+
+def test_memory_pagination_with_tied_scores():
+    # Tres grupos de vectores idénticos: muchos scores empatados
+    rng = np.random.default_rng(0)
+    groups = np.eye(4, dtype=np.float32)[:3]
+    matrix = groups[rng.integers(0, 3, size=47)]
+    ids = list(range(100, 147))
+    store = _store(matrix, ids)
+
+    for k in (1, 2, 5, 10, 47):
+        paged = _page_all(store, [1.0, 0.5, 0.0, 0.0], k)
+        assert sorted(paged) == ids
+        assert len(paged) == len(set(paged))
+
+
+def test_memory_search_excludes_reference():
+    matrix = np.eye(3, dtype=np.float32)
+    store = _store(matrix, [1, 2, 3])
+    rows = store.search(None, "theses", [1.0, 0.0, 0.0], 3, exclude_id=1)
+    assert [row[0] for row in rows] == [2, 3]
+
+
+def test_keyset_uses_returned_distance():
+    vector_sql = "(SELECT v FROM q)"
+    quantized = similarity_sql(quantized_distance_sql("t", vector_sql, "half"))
+    exact = similarity_sql(quantized_distance_sql("t", vector_sql))
+
+    sql = _combined_search_query(True, False, "half", False, paginate=True).text
+    assert f"{quantized} < :theses_after_score" in sql
+    assert "ORDER BY distance, t.id" in sql
+
+    sql = _combined_search_query(True, False, "half", True, paginate=True).text
+    assert f"{exact} < :theses_after_score" in sql
+    assert "ORDER BY distance, id LIMIT :k" in sql
+
+
+def test_cursor_round_trip():
+    results = {
+        "theses": [(1, "a", 0.9), (7, "b", 0.8)],
+        "research_products": [(3, "c", 0.7)],
+    }
+    included = {"theses": True, "research_products": True}
+
+    cursor = encode_search_cursor("Redes neuronales", 2, results, included)
+    assert cursor is not None
+    # Solo continúan los tipos que llenaron la página
+    assert decode_search_cursor(cursor, "redes  neuronales") == {"theses": (0.8, 7)}
+
+    with pytest.raises(ValueError):
+        decode_search_cursor(cursor, "otra consulta")
+    with pytest.raises(ValueError):
+        decode_search_cursor("no-es-un-cursor", "Redes neuronales")
+    assert encode_search_cursor("x", 5, results, included) is None
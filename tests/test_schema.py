@@ -0,0 +1,23 @@
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import Session
+
+from app.db.knn_table import ensure_knn_table
+from app.db.professor_embeddings import ensure_professor_embeddings_table
+
+
+def _session() -> Session:
+    return Session(create_engine("sqlite://"))
+
+
+def test_ensure_knn_table_creates_once():
+    db = _session()
+    ensure_knn_table(db)
+    ensure_knn_table(db)
+    assert "similar_items" in inspect(db.get_bind()).get_table_names()
+
+
+def test_ensure_professor_embeddings_table_creates_once():
+    db = _session()
+    ensure_professor_embeddings_table(db)
+    ensure_professor_embeddings_table(db)
+    assert "professor_embeddings" in inspect(db.get_bind()).get_table_names()
@@ -0,0 +1,21 @@
+import pytest
+
+from app.db.text_search import reciprocal_rank_fusion
+
+
+def test_rrf_rewards_items_in_both_rankings():
+    vector = [(1, "a", 0.9), (2, "b", 0.8), (3, "c", 0.7)]
+    lexical = [(3, "c*", 0.5), (4, "d", 0.4)]
+
+    fused = reciprocal_rank_fusion([vector, lexical], k=3, rrf_k=60)
+
+    assert [row[0] for row in fused] == [3, 1, 2]
+    # Campos de la primera aparición y score fusionado al final
+    assert fused[0][:-1] == (3, "c")
+    assert fused[0][-1] == pytest.approx(1 / 63 + 1 / 61)
+
+
+def test_rrf_empty_and_limit():
+    assert reciprocal_rank_fusion([[], []], k=5) == []
+    fused = reciprocal_rank_fusion([[(i, i / 10) for i in range(10)]], k=4)
+    assert [row[0] for row in fused] == [0, 1, 2, 3]
@@ -0,0 +1,26 @@
+from app.db import topic_model
+
+
+class _FakeSession:
+    def __init__(self):
+        self.rolled_back = False
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+def test_update_skips_entities_too_small_to_fit(monkeypatch):
+    def fit(db, entity_type, n_clusters):
+        if entity_type == "theses":
+            raise ValueError("No hay suficientes elementos (3) para crear 20 clusters")
+
+    monkeypatch.setattr(topic_model, "get_topic_model", lambda db, entity_type: None)
+    monkeypatch.setattr(topic_model, "fit_topic_model", fit)
+
+    db = _FakeSession()
+    actions = topic_model.update_topic_models(
+        db, {"theses": [1, 2, 3], "research_products": [4]}
+    )
+
+    assert actions == {"theses": "skip", "research_products": "fit"}
+    assert db.rolled_back